@@ -0,0 +1,202 @@
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, insert, select, update, delete
+from fastapi import HTTPException, status
+from ..models import archives as model
+from ..models import orders as order_model
+from ..models import order_details as order_detail_model
+from ..models import reviews as review_model
+from ..models import payments as payment_model
+from ..dependencies.config import conf
+from ..dependencies.response_cache import invalidate_on_commit
+from . import review_search
+from . import review_ratings
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+
+
+def _copy_rows(db: Session, source, target, where):
+    """INSERT INTO target SELECT ... FROM source WHERE ..., column names must match"""
+    columns = [c.name for c in target.__table__.columns]
+    query = select(*[source.__table__.c[name] for name in columns]).where(where)
+    return db.execute(insert(target).from_select(columns, query)).rowcount
+
+
+def _roll_up(db: Session, order_ids):
+    """Add the order details and reviews of a batch to the per-sandwich rollup"""
+    detail = order_detail_model.OrderDetail
+    review = review_model.Review
+
+    details = db.query(
+        detail.sandwich_id,
+        func.count(detail.id),
+        func.sum(detail.amount)
+    ).filter(detail.order_id.in_(order_ids)).group_by(detail.sandwich_id).all()
+
+    ratings = db.query(
+        review.sandwich_id,
+        func.count(review.id),
+        func.sum(review.rating),
+        func.min(review.rating),
+        func.max(review.rating)
+    ).filter(review.order_id.in_(order_ids)).group_by(review.sandwich_id).all()
+
+    sandwich_ids = {row[0] for row in details} | {row[0] for row in ratings}
+    sandwich_ids.discard(None)
+    if not sandwich_ids:
+        return
+
+    stats = {
+        stat.sandwich_id: stat
+        for stat in db.query(model.ArchivedSandwichStat).filter(
+            model.ArchivedSandwichStat.sandwich_id.in_(sandwich_ids)
+        )
+    }
+    for sandwich_id in sandwich_ids:
+        if sandwich_id not in stats:
+            stats[sandwich_id] = model.ArchivedSandwichStat(
+                sandwich_id=sandwich_id, order_count=0, total_quantity=0, review_count=0, rating_sum=0
+            )
+            db.add(stats[sandwich_id])
+
+    for sandwich_id, order_count, quantity in details:
+        if sandwich_id is None:
+            continue
+        stats[sandwich_id].order_count += order_count
+        stats[sandwich_id].total_quantity += int(quantity or 0)
+
+    for sandwich_id, review_count, rating_sum, min_rating, max_rating in ratings:
+        stat = stats[sandwich_id]
+        stat.review_count += review_count
+        stat.rating_sum += int(rating_sum or 0)
+        stat.min_rating = min_rating if stat.min_rating is None else min(stat.min_rating, min_rating)
+        stat.max_rating = max_rating if stat.max_rating is None else max(stat.max_rating, max_rating)
+
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int):
+    """Move one batch of completed orders placed before cutoff into the archive.
+
+    Each batch is its own transaction, so an interrupted run loses nothing and
+    simply picks up the remaining orders the next time it is started.
+    """
+    order = order_model.Order
+    detail = order_detail_model.OrderDetail
+    review = review_model.Review
+    payment = payment_model.Payment
+
+    order_ids = [
+        row[0] for row in db.query(order.id).filter(
+            order.order_status == order_model.OrderStatus.COMPLETED,
+            order.order_date < cutoff
+        ).order_by(order.id).limit(batch_size).all()
+    ]
+    counts = {"orders": 0, "order_details": 0, "reviews": 0, "payments": 0}
+    if not order_ids:
+        return counts
+
+    try:
+        counts["orders"] = _copy_rows(db, order, model.ArchivedOrder, order.id.in_(order_ids))
+        counts["order_details"] = _copy_rows(db, detail, model.ArchivedOrderDetail, detail.order_id.in_(order_ids))
+        counts["reviews"] = _copy_rows(db, review, model.ArchivedReview, review.order_id.in_(order_ids))
+        counts["payments"] = _copy_rows(db, payment, model.ArchivedPayment, payment.order_id.in_(order_ids))
+        _roll_up(db, order_ids)
+        db.flush()
+
+        # orders.payment_id and payments.order_id point at each other, so break
+        # that link before deleting either side
+        db.execute(update(order).where(order.id.in_(order_ids)).values(payment_id=None))
+        db.execute(delete(payment).where(payment.order_id.in_(order_ids)))
+        # Archived reviews leave the search index with the rest of the order
+        review_search.remove(db, [row[0] for row in db.query(review.id).filter(review.order_id.in_(order_ids))])
+        review_ratings.apply(db, {
+            (sandwich_id, rating): -review_count for sandwich_id, rating, review_count in db.query(
+                review.sandwich_id, review.rating, func.count(review.id)
+            ).filter(review.order_id.in_(order_ids)).group_by(review.sandwich_id, review.rating)
+        })
+        db.execute(delete(review).where(review.order_id.in_(order_ids)))
+        db.execute(delete(detail).where(detail.order_id.in_(order_ids)))
+        db.execute(delete(order).where(order.id.in_(order_ids)))
+        invalidate_on_commit(db, "orders")
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__.get('orig', e))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return counts
+
+
+def archive_orders(db: Session, older_than_days: int = None, batch_size: int = None, max_batches: int = None):
+    """Archive completed orders older than older_than_days, batch by batch"""
+    older_than_days = conf.archive_after_days if older_than_days is None else older_than_days
+    batch_size = batch_size or conf.archive_batch_size
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+
+    totals = {"orders": 0, "order_details": 0, "reviews": 0, "payments": 0}
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        counts = archive_batch(db, cutoff, batch_size)
+        if not counts["orders"]:
+            break
+        batches += 1
+        for key, value in counts.items():
+            totals[key] += value
+
+    remaining = db.query(func.count(order_model.Order.id)).filter(
+        order_model.Order.order_status == order_model.OrderStatus.COMPLETED,
+        order_model.Order.order_date < cutoff
+    ).scalar()
+
+    return {
+        "cutoff": cutoff,
+        "batches": batches,
+        "orders_archived": totals["orders"],
+        "order_details_archived": totals["order_details"],
+        "reviews_archived": totals["reviews"],
+        "payments_archived": totals["payments"],
+        "remaining": remaining,
+    }
+
+
+def archive_horizon(db: Session):
+    """Newest order_date in the archive, or None when nothing is archived"""
+    return db.query(func.max(model.ArchivedOrder.order_date)).scalar()
+
+
+def range_needs_archive(db: Session, start_date: datetime = None):
+    """True if orders placed on or after start_date may live in the archive"""
+    horizon = archive_horizon(db)
+    if horizon is None:
+        return False
+    return start_date is None or start_date <= horizon
+
+
+def read_by_tracking(db: Session, tracking_number: str):
+    return db.query(model.ArchivedOrder).filter(
+        model.ArchivedOrder.tracking_number == tracking_number
+    ).first()
+
+
+def read_all(db: Session, start_date: datetime = None, end_date: datetime = None):
+    query = db.query(model.ArchivedOrder).options(selectinload(model.ArchivedOrder.order_details))
+    if start_date:
+        query = query.filter(model.ArchivedOrder.order_date >= start_date)
+    if end_date:
+        query = query.filter(model.ArchivedOrder.order_date <= end_date)
+    return query.order_by(model.ArchivedOrder.order_date.desc()).all()
+
+
+def revenue(db: Session, start_date: datetime = None, end_date: datetime = None):
+    query = db.query(func.sum(model.ArchivedOrder.total_price))
+    if start_date:
+        query = query.filter(model.ArchivedOrder.order_date >= start_date)
+    if end_date:
+        query = query.filter(model.ArchivedOrder.order_date <= end_date)
+    return query.scalar()
+
+
+def sandwich_stats(db: Session):
+    """Archived totals keyed by sandwich_id"""
+    return {stat.sandwich_id: stat for stat in db.query(model.ArchivedSandwichStat).all()}
+
+
+def sandwich_stat(db: Session, sandwich_id: int):
+    return db.get(model.ArchivedSandwichStat, sandwich_id)
@@ -0,0 +1,94 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from fastapi import HTTPException, status
+from ..models import sandwiches as sandwich_model
+from ..models import recipes as recipe_model
+from . import inventory
+from . import cache_versions
+from ..dependencies.response_cache import invalidate_on_commit
+from .menu_search import VERSION_NAME as MENU_VERSION
+from sqlalchemy.exc import SQLAlchemyError
+
+
+def sandwiches_using(db: Session, resource_ids):
+    """Ids of the sandwiches whose recipes use any of resource_ids"""
+    if not resource_ids:
+        return set()
+    return {row[0] for row in db.query(recipe_model.Recipe.sandwich_id).filter(
+        recipe_model.Recipe.resource_id.in_(resource_ids)
+    ).distinct()}
+
+
+def _sellable(db: Session, sandwich_ids):
+    """sandwich_id -> how many can be made from current stock, for sandwiches that have a recipe"""
+    recipe = recipe_model.Recipe
+    stock = inventory.level_query().subquery()
+    # A recipe line whose resource is gone counts as zero stock
+    portions = func.coalesce(stock.c.level, 0) // recipe.amount
+    query = db.query(recipe.sandwich_id, func.min(portions)).outerjoin(
+        stock, stock.c.id == recipe.resource_id
+    ).filter(recipe.amount > 0)
+    if sandwich_ids is not None:
+        query = query.filter(recipe.sandwich_id.in_(sandwich_ids))
+    return {sandwich_id: max(int(quantity), 0) for sandwich_id, quantity in query.group_by(recipe.sandwich_id)}
+
+
+def refresh(db: Session, sandwich_ids=None, resource_ids=None, flips_only: bool = False):
+    """Recompute sellable_quantity and is_available for the given sandwiches, or every sandwich.
+
+    Runs inside the caller's transaction: three queries, and one UPDATE per
+    column whatever the number of sandwiches. Only rows whose values change
+    are written. With flips_only, a sandwich is only written when it becomes
+    available or unavailable; orders use this so they don't all update the
+    same sandwich rows, and the inventory compactor catches up the
+    quantities. Returns the ids that changed.
+    """
+    if sandwich_ids is None and resource_ids is None:
+        targets = None
+    else:
+        targets = set(sandwich_ids or ()) | sandwiches_using(db, resource_ids)
+        if not targets:
+            return []
+
+    sandwich = sandwich_model.Sandwich
+    sellable = _sellable(db, targets)
+    query = db.query(sandwich.id, sandwich.sellable_quantity, sandwich.is_available, sandwich.is_listed)
+    if targets is not None:
+        query = query.filter(sandwich.id.in_(targets))
+
+    quantities = {}
+    availability = {}
+    for sandwich_id, current_quantity, current_available, is_listed in query:
+        # No recipe means nothing limits it
+        quantity = sellable.get(sandwich_id)
+        available = bool(is_listed) and (quantity is None or quantity > 0)
+        flipped = available != bool(current_available)
+        if flipped:
+            availability[sandwich_id] = available
+        if quantity != current_quantity and (flipped or not flips_only):
+            quantities[sandwich_id] = quantity
+
+    if quantities:
+        db.query(sandwich).filter(sandwich.id.in_(quantities)).update(
+            {sandwich.sellable_quantity: case(quantities, value=sandwich.id)}, synchronize_session=False
+        )
+        invalidate_on_commit(db, MENU_VERSION)
+    if availability:
+        db.query(sandwich).filter(sandwich.id.in_(availability)).update(
+            {sandwich.is_available: case(availability, value=sandwich.id)}, synchronize_session=False
+        )
+        # Workers rebuild their menu search index when a sandwich goes in or out of stock
+        cache_versions.bump(db, MENU_VERSION)
+    return sorted(set(quantities) | set(availability))
+
+
+def refresh_all(db: Session):
+    """Recompute every sandwich, e.g. after stock was changed directly in the database"""
+    try:
+        changed = refresh(db)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {"changed": len(changed)}
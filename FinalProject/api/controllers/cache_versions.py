@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from ..models import cache_versions as model
+from ..dependencies.response_cache import invalidate_on_commit
+
+
+def bump(db: Session, name: str):
+    """Increment a version inside the caller's transaction and return the new value.
+
+    Cached responses tagged with name are dropped once the transaction commits.
+    """
+    invalidate_on_commit(db, name)
+    result = db.execute(
+        update(model.CacheVersion).where(model.CacheVersion.name == name).values(version=model.CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(model.CacheVersion(name=name, version=1))
+        db.flush()
+        return 1
+    return db.query(model.CacheVersion.version).filter(model.CacheVersion.name == name).scalar()
+
+
+def current(db: Session, name: str):
+    return db.query(model.CacheVersion.version).filter(model.CacheVersion.name == name).scalar() or 0
+
+
+def current_many(db: Session, names):
+    """Versions of several datasets with one query, 0 for names never bumped"""
+    versions = dict(db.query(model.CacheVersion.name, model.CacheVersion.version).filter(
+        model.CacheVersion.name.in_(names)
+    ))
+    return {name: versions.get(name, 0) for name in names}
@@ -0,0 +1,184 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from ..models import inventory as inventory_model
+from ..dependencies.config import conf
+from . import inventory
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+import numpy as np
+import threading
+import time
+
+
+class DepletionForecaster:
+    """Projects when each resource runs out from its recent consumption.
+
+    Consumption is kept as a resources x time-buckets matrix built from the
+    ORDER movements of the inventory ledger. Each refresh only reads the
+    movements added since the last one and slides the window forward; the
+    forecast itself is a handful of NumPy operations over the whole matrix:
+
+    - rate: mean units per bucket over the observed part of the window
+    - seasonality: for every bucket of the week, its mean divided by the
+      overall mean, so busy lunch hours burn stock faster than nights
+    - projection: rate x seasonality for every future bucket, accumulated,
+      and the first bucket where it reaches the current level
+
+    Results are cached for ttl_seconds.
+    """
+
+    def __init__(self, bucket_hours: int = None, history_days: int = None, horizon_days: int = None,
+                 ttl_seconds: float = None):
+        self.bucket_seconds = (bucket_hours or conf.forecast_bucket_hours) * 3600
+        self.buckets = (history_days or conf.forecast_history_days) * 86400 // self.bucket_seconds
+        self.horizon = (horizon_days or conf.forecast_horizon_days) * 86400 // self.bucket_seconds
+        self.period = 7 * 86400 // self.bucket_seconds
+        self.ttl_seconds = conf.forecast_ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._lock = threading.Lock()
+        self._rows = {}                                 # resource_id -> matrix row
+        self._history = np.zeros((0, self.buckets))
+        self._first_bucket = None                       # absolute bucket number of column 0
+        self._observed_from = None                      # first bucket the ledger has data for
+        self._last_movement_id = 0
+        self._result = None
+        self._computed_at = None
+
+    def _bucket(self, moment: datetime):
+        return int(moment.timestamp()) // self.bucket_seconds
+
+    def _slide(self, current_bucket: int):
+        """Move the window so its last column is current_bucket"""
+        first = current_bucket - self.buckets + 1
+        if self._first_bucket is None:
+            self._first_bucket = first
+            return
+        shift = first - self._first_bucket
+        if shift <= 0:
+            return
+        if shift >= self.buckets:
+            self._history[:] = 0
+        else:
+            self._history[:, :-shift] = self._history[:, shift:]
+            self._history[:, -shift:] = 0
+        self._first_bucket = first
+
+    def refresh(self, db: Session, now: datetime = None):
+        """Add the order movements recorded since the last refresh"""
+        now = now or datetime.now()
+        self._slide(self._bucket(now))
+        since = datetime.fromtimestamp(self._first_bucket * self.bucket_seconds)
+        movement = inventory_model.InventoryMovement
+        rows = db.query(movement.id, movement.resource_id, movement.created_at, movement.delta).filter(
+            movement.id > self._last_movement_id,
+            movement.reason == inventory_model.MovementReason.ORDER,
+            movement.created_at >= since
+        ).order_by(movement.id).all()
+        if not rows:
+            return 0
+
+        ids, resource_ids, created, deltas = zip(*rows)
+        for resource_id in resource_ids:
+            if resource_id not in self._rows:
+                self._rows[resource_id] = len(self._rows)
+        if len(self._rows) > self._history.shape[0]:
+            grown = np.zeros((len(self._rows), self.buckets))
+            grown[:self._history.shape[0]] = self._history
+            self._history = grown
+
+        matrix_rows = np.fromiter((self._rows[r] for r in resource_ids), dtype=np.int64, count=len(rows))
+        columns = np.fromiter((self._bucket(c) for c in created), dtype=np.int64, count=len(rows)) - self._first_bucket
+        units = -np.asarray(deltas, dtype=float)
+        inside = (columns >= 0) & (columns < self.buckets)
+        np.add.at(self._history, (matrix_rows[inside], columns[inside]), units[inside])
+
+        oldest = self._first_bucket + int(columns[inside].min()) if inside.any() else None
+        if oldest is not None and (self._observed_from is None or oldest < self._observed_from):
+            self._observed_from = oldest
+        self._last_movement_id = max(ids)
+        return len(rows)
+
+    def project(self, levels: dict, now: datetime = None):
+        """resource_id -> (units per day, stock-out time or None) for the resources in levels"""
+        now = now or datetime.now()
+        resource_ids = [r for r in levels if r in self._rows]
+        result = {r: (0.0, None) for r in levels if r not in self._rows}
+        if not resource_ids or self._observed_from is None:
+            result.update({r: (0.0, None) for r in resource_ids})
+            return result
+
+        history = self._history[[self._rows[r] for r in resource_ids]]
+        # Columns before the ledger had any data would pull the rate down
+        start = max(self._observed_from - self._first_bucket, 0)
+        observed = history[:, start:]
+        rate = observed.mean(axis=1)
+
+        # Mean per bucket of the week through a one-hot matrix, relative to the overall mean
+        slots = (self._first_bucket + start + np.arange(observed.shape[1])) % self.period
+        one_hot = np.zeros((observed.shape[1], self.period))
+        one_hot[np.arange(observed.shape[1]), slots] = 1
+        counts = one_hot.sum(axis=0)
+        slot_means = (observed @ one_hot) / np.maximum(counts, 1)
+        seasonal = np.ones_like(slot_means)
+        known = (counts > 0)[None, :] & (rate > 0)[:, None]
+        np.divide(slot_means, rate[:, None], out=seasonal, where=known)
+
+        current_bucket = self._bucket(now)
+        future_slots = (current_bucket + 1 + np.arange(self.horizon)) % self.period
+        expected = rate[:, None] * seasonal[:, future_slots]
+        used = np.cumsum(expected, axis=1)
+        stock = np.array([levels[r] for r in resource_ids], dtype=float)
+        reached = used >= stock[:, None]
+        runs_out = reached.any(axis=1)
+        first = reached.argmax(axis=1)
+
+        next_bucket_start = datetime.fromtimestamp((current_bucket + 1) * self.bucket_seconds)
+        per_day = rate * (86400 / self.bucket_seconds)
+        for i, resource_id in enumerate(resource_ids):
+            if stock[i] <= 0:
+                stockout = now
+            elif runs_out[i] and rate[i] > 0:
+                stockout = next_bucket_start + timedelta(seconds=int(first[i] + 1) * self.bucket_seconds)
+            else:
+                stockout = None
+            result[resource_id] = (float(per_day[i]), stockout)
+        return result
+
+    def forecast(self, db: Session, force: bool = False):
+        with self._lock:
+            if not force and self._result is not None and time.monotonic() - self._computed_at < self.ttl_seconds:
+                return self._result
+            now = datetime.now()
+            self.refresh(db, now)
+            stock = {row.id: (row.item, int(row.level)) for row in db.execute(inventory.level_query())}
+            projected = self.project({resource_id: level for resource_id, (_, level) in stock.items()}, now)
+            forecasts = []
+            for resource_id, (item, level) in stock.items():
+                per_day, stockout = projected[resource_id]
+                forecasts.append({
+                    "resource_id": resource_id,
+                    "item": item,
+                    "level": level,
+                    "daily_consumption": round(per_day, 2),
+                    "stockout_at": stockout,
+                    "days_left": round((stockout - now).total_seconds() / 86400, 2) if stockout else None,
+                })
+            # Soonest stock-outs first, resources that never run out last
+            forecasts.sort(key=lambda f: (f["stockout_at"] is None, f["stockout_at"] or now, f["resource_id"]))
+            self._result = {
+                "generated_at": now,
+                "horizon_days": self.horizon * self.bucket_seconds // 86400,
+                "resources": forecasts,
+            }
+            self._computed_at = time.monotonic()
+            return self._result
+
+
+forecaster = DepletionForecaster()
+
+
+def read_forecast(db: Session, refresh: bool = False):
+    try:
+        return forecaster.forecast(db, force=refresh)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
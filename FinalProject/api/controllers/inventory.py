@@ -0,0 +1,236 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, and_, case, exists, insert, select
+from fastapi import HTTPException, status
+from ..models import inventory as model
+from ..models import resources as resource_model
+from ..dependencies.config import conf
+from ..dependencies.jobs import PeriodicJob
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, timedelta
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def level_query(resource_ids=None):
+    """SELECT resource id, item and current level: snapshot plus the movements after it"""
+    resource = resource_model.Resource
+    movement = model.InventoryMovement
+    level = (resource.amount + func.coalesce(func.sum(movement.delta), 0)).label("level")
+    query = select(resource.id, resource.item, level).outerjoin(
+        movement, and_(movement.resource_id == resource.id, movement.id > resource.snapshot_movement_id)
+    ).group_by(resource.id, resource.item, resource.amount)
+    if resource_ids is not None:
+        query = query.where(resource.id.in_(resource_ids))
+    return query
+
+
+def levels(db: Session, resource_ids, lock: bool = False):
+    """resource_id -> current level.
+
+    lock=True makes it a locking read: it waits for other transactions
+    writing movements of these resources and sees their committed rows,
+    then holds the rows until this transaction ends.
+    """
+    if not resource_ids:
+        return {}
+    query = level_query(resource_ids).order_by(resource_model.Resource.id)
+    if lock:
+        query = query.with_for_update()
+    return {resource_id: int(level) for resource_id, _, level in db.execute(query)}
+
+
+def record(db: Session, movements, reason: model.MovementReason, order_id: int = None, note: str = None):
+    """Append movements, an iterable of (resource_id, delta), with a single INSERT"""
+    now = datetime.now()
+    rows = [
+        {"resource_id": resource_id, "delta": delta, "reason": reason, "order_id": order_id,
+         "note": note, "created_at": now}
+        for resource_id, delta in movements if delta
+    ]
+    if rows:
+        db.execute(insert(model.InventoryMovement), rows)
+    return len(rows)
+
+
+def _short(current, required):
+    return {resource_id: (units, current.get(resource_id, 0) + units) for resource_id, units in required.items()
+            if current.get(resource_id, 0) < 0}
+
+
+def hold(db: Session, required):
+    """Reserve stock for an order about to be placed, required is resource_id -> units.
+
+    Returns (token, shortfalls). The hold is appended as HOLD movements and
+    committed right away, then the levels are read again: if one went below
+    zero, other orders got there first, so the hold is released and the
+    shortfalls (units needed, units that were left) come back instead of a
+    token. Nothing locks the resources rows, concurrent orders only insert;
+    two orders racing for the last units may both be turned away, but stock
+    is never oversold. A token must be confirmed with the order or released.
+    """
+    if not required:
+        return None, {}
+    token = uuid.uuid4().hex
+    record(db, [(resource_id, -units) for resource_id, units in required.items()],
+           model.MovementReason.HOLD, note=token)
+    db.commit()
+    short = _short(levels(db, list(required)), required)
+    if short:
+        release(db, token, required)
+        return None, short
+    return token, {}
+
+
+def confirm(db: Session, token: str, required, order_id: int):
+    """Turn a hold into the order's movements, inside the order's transaction.
+
+    The hold is released and the same units are taken as ORDER movements of
+    the order, so the level does not change and, if the order rolls back,
+    the hold is still in place for release() or the stale hold sweep.
+    """
+    if token is None:
+        return
+    record(db, [(resource_id, units) for resource_id, units in required.items()],
+           model.MovementReason.RELEASE, note=token)
+    record(db, [(resource_id, -units) for resource_id, units in required.items()],
+           model.MovementReason.ORDER, order_id=order_id)
+
+
+def release(db: Session, token: str, required):
+    """Give back a hold whose order was not placed, in a transaction of its own"""
+    if token is None:
+        return
+    record(db, [(resource_id, units) for resource_id, units in required.items()],
+           model.MovementReason.RELEASE, note=token)
+    db.commit()
+
+
+def release_stale_holds(db: Session, older_than_seconds: float = None):
+    """Release holds a crashed request left behind, return how many.
+
+    Only holds from the day before the cutoff are looked at; the sweep runs
+    every compaction interval, so older ones were dealt with already.
+    """
+    older_than_seconds = conf.inventory_hold_seconds if older_than_seconds is None else older_than_seconds
+    movement = model.InventoryMovement
+    released = aliased(movement)
+    cutoff = datetime.now() - timedelta(seconds=older_than_seconds)
+    stale = db.query(movement.note, movement.resource_id, movement.delta).filter(
+        movement.reason == model.MovementReason.HOLD,
+        movement.created_at < cutoff,
+        movement.created_at >= cutoff - timedelta(days=1),
+        ~exists().where(and_(released.reason == model.MovementReason.RELEASE, released.note == movement.note))
+    ).all()
+    holds = {}
+    for token, resource_id, delta in stale:
+        holds.setdefault(token, {})[resource_id] = -delta
+    for token, required in holds.items():
+        record(db, [(resource_id, units) for resource_id, units in required.items()],
+               model.MovementReason.RELEASE, note=token)
+    db.commit()
+    return len(holds)
+
+
+def compact(db: Session, batch_size: int = None, grace_seconds: float = None):
+    """Fold movements into resources.amount and record a snapshot for every resource that had any.
+
+    Works through the resources batch_size at a time, one short transaction
+    each. Movements younger than grace_seconds are left alone, and the sum is
+    a locking read, so a movement from a transaction still in flight is
+    never skipped.
+    """
+    from . import availability
+    batch_size = batch_size or conf.inventory_compact_batch_size
+    grace_seconds = conf.inventory_compact_grace_seconds if grace_seconds is None else grace_seconds
+    resource = resource_model.Resource
+    movement = model.InventoryMovement
+    cutoff = datetime.now() - timedelta(seconds=grace_seconds)
+    # Fix the upper bound once so movements arriving during the run wait for the next one
+    high = db.query(func.max(movement.id)).filter(movement.created_at <= cutoff).scalar()
+    db.commit()
+    if high is None:
+        return {"resources": 0, "movements": 0}
+
+    compacted = 0
+    folded = 0
+    after_id = 0
+    while True:
+        rows = db.query(
+            resource.id, resource.amount, resource.snapshot_movement_id,
+            func.sum(movement.delta), func.max(movement.id), func.count(movement.id)
+        ).join(
+            movement, and_(movement.resource_id == resource.id, movement.id > resource.snapshot_movement_id)
+        ).filter(
+            resource.id > after_id,
+            movement.id <= high
+        ).group_by(
+            resource.id, resource.amount, resource.snapshot_movement_id
+        ).order_by(resource.id).limit(batch_size).with_for_update().all()
+        if not rows:
+            db.commit()
+            break
+
+        amounts = {resource_id: amount + int(delta) for resource_id, amount, _, delta, _, _ in rows}
+        positions = {resource_id: last_id for resource_id, _, _, _, last_id, _ in rows}
+        db.query(resource).filter(resource.id.in_(amounts)).update({
+            resource.amount: case(amounts, value=resource.id),
+            resource.snapshot_movement_id: case(positions, value=resource.id),
+        }, synchronize_session=False)
+        now = datetime.now()
+        db.execute(insert(model.InventorySnapshot), [
+            {"resource_id": resource_id, "amount": amounts[resource_id],
+             "last_movement_id": positions[resource_id], "taken_at": now}
+            for resource_id in amounts
+        ])
+        # Orders only flip availability, the exact sellable quantities are brought up to date here
+        availability.refresh(db, resource_ids=list(amounts))
+        db.commit()
+        compacted += len(rows)
+        folded += sum(count for *_, count in rows)
+        after_id = rows[-1][0]
+    return {"resources": compacted, "movements": folded}
+
+
+class InventoryCompactor(PeriodicJob):
+    """Releases stale holds and runs compact() every interval_seconds in a daemon thread"""
+
+    name = "inventory-compactor"
+
+    def __init__(self, interval_seconds: float = None):
+        super().__init__(conf.inventory_compact_interval_seconds if interval_seconds is None else interval_seconds)
+
+    def work(self, db: Session):
+        released = release_stale_holds(db)
+        if released:
+            logger.warning(f"Released {released} stale inventory holds")
+        result = compact(db)
+        if result["resources"]:
+            logger.info(f"Compacted {result['movements']} inventory movements of {result['resources']} resources")
+        return dict(result, stale_holds_released=released)
+
+
+compactor = InventoryCompactor()
+
+
+def run_compaction(db: Session):
+    try:
+        compactor.run_once(db)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return compactor.metrics()
+
+
+def read_movements(db: Session, resource_id: int, after_id: int = 0, limit: int = 100):
+    """Movements of a resource in id order, page with after_id = last id seen"""
+    try:
+        result = db.query(model.InventoryMovement).filter(
+            model.InventoryMovement.resource_id == resource_id,
+            model.InventoryMovement.id > after_id
+        ).order_by(model.InventoryMovement.id).limit(limit).all()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return result
@@ -0,0 +1,161 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from ..models import orders as order_model
+from ..models import order_details as order_detail_model
+from ..models import sandwiches as sandwich_model
+from ..dependencies.config import conf
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import bisect
+import threading
+import time
+
+
+def order_priority(order_type, order_date, order_id):
+    """Sort key for a pending order: deliveries first, then oldest first"""
+    is_delivery = getattr(order_type, "value", order_type) == order_model.OrderType.DELIVERY.value
+    return (0 if is_delivery else 1, order_date or datetime.max, order_id)
+
+
+class KitchenScheduler:
+    """Keeps the prep plan for pending orders up to date one order at a time.
+
+    Every sandwich has a list of (priority, order_id, amount) kept sorted with
+    bisect, so adding or removing an order only touches the sandwiches in that
+    order. Building the plan just reads the head of each list. The state is
+    reloaded from the database every conf.kitchen_resync_seconds, which also
+    picks up orders changed by other workers.
+    """
+
+    def __init__(self, resync_seconds: int = None):
+        self.resync_seconds = conf.kitchen_resync_seconds if resync_seconds is None else resync_seconds
+        self._lock = threading.Lock()
+        self._orders = {}      # order_id -> (priority, {sandwich_id: amount})
+        self._queues = {}      # sandwich_id -> sorted [(priority, order_id, amount)]
+        self._loaded_at = None
+        self._version = 0
+        self._plan = None
+        self._plan_version = -1
+
+    def _add(self, order_id, priority, items):
+        self._remove(order_id)
+        merged = {}
+        for sandwich_id, amount in items:
+            merged[sandwich_id] = merged.get(sandwich_id, 0) + amount
+        self._orders[order_id] = (priority, merged)
+        for sandwich_id, amount in merged.items():
+            bisect.insort(self._queues.setdefault(sandwich_id, []), (priority, order_id, amount))
+        self._version += 1
+
+    def _remove(self, order_id):
+        entry = self._orders.pop(order_id, None)
+        if entry is None:
+            return
+        priority, items = entry
+        for sandwich_id, amount in items.items():
+            queue = self._queues[sandwich_id]
+            del queue[bisect.bisect_left(queue, (priority, order_id, amount))]
+            if not queue:
+                del self._queues[sandwich_id]
+        self._version += 1
+
+    def add_order(self, order, items):
+        """Register a pending order, items is an iterable of (sandwich_id, amount)"""
+        priority = order_priority(order.order_type, order.order_date, order.id)
+        with self._lock:
+            self._add(order.id, priority, items)
+
+    def remove_order(self, order_id):
+        with self._lock:
+            self._remove(order_id)
+
+    def order_changed(self, order):
+        """Follow a status change: pending orders stay in the plan, all others leave it"""
+        if getattr(order.order_status, "value", order.order_status) == order_model.OrderStatus.PENDING.value:
+            self.add_order(order, [(d.sandwich_id, d.amount) for d in order.order_details])
+        else:
+            self.remove_order(order.id)
+
+    def load(self, db: Session):
+        """Rebuild the state from all pending orders in one query"""
+        rows = db.query(
+            order_model.Order.id,
+            order_model.Order.order_type,
+            order_model.Order.order_date,
+            order_detail_model.OrderDetail.sandwich_id,
+            order_detail_model.OrderDetail.amount
+        ).join(
+            order_detail_model.OrderDetail,
+            order_detail_model.OrderDetail.order_id == order_model.Order.id
+        ).filter(
+            order_model.Order.order_status == order_model.OrderStatus.PENDING
+        ).all()
+
+        pending = {}
+        for order_id, order_type, order_date, sandwich_id, amount in rows:
+            if order_id not in pending:
+                pending[order_id] = (order_priority(order_type, order_date, order_id), [])
+            pending[order_id][1].append((sandwich_id, amount))
+
+        with self._lock:
+            self._orders = {}
+            self._queues = {}
+            for order_id, (priority, items) in pending.items():
+                self._add(order_id, priority, items)
+            # An empty result adds nothing, so the version has to move here too
+            self._version += 1
+            self._loaded_at = time.monotonic()
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.resync_seconds
+
+    def plan(self, db: Session):
+        """Prep batches, most urgent first. One batch per sandwich across all pending orders."""
+        try:
+            if self._stale():
+                self.load(db)
+        except SQLAlchemyError as e:
+            error = str(e.__dict__['orig'])
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+        with self._lock:
+            if self._plan_version == self._version:
+                return self._plan
+            batches = []
+            for sandwich_id, queue in self._queues.items():
+                # A batch is as urgent as its most urgent order
+                head_priority = queue[0][0]
+                batches.append((head_priority, {
+                    "sandwich_id": sandwich_id,
+                    "quantity": sum(amount for _, _, amount in queue),
+                    "order_ids": [order_id for _, order_id, _ in queue],
+                    "has_delivery": head_priority[0] == 0,
+                    "oldest_order_date": min(priority[1] for priority, _, _ in queue),
+                }))
+            batches.sort(key=lambda pair: pair[0])
+            self._plan = {"pending_orders": len(self._orders), "batches": [batch for _, batch in batches]}
+            self._plan_version = self._version
+            return self._plan
+
+
+scheduler = KitchenScheduler()
+
+
+def read_plan(db: Session):
+    plan = scheduler.plan(db)
+    sandwich_ids = [batch["sandwich_id"] for batch in plan["batches"]]
+    try:
+        names = dict(db.query(sandwich_model.Sandwich.id, sandwich_model.Sandwich.sandwich_name).filter(
+            sandwich_model.Sandwich.id.in_(sandwich_ids)
+        ).all()) if sandwich_ids else {}
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {
+        "generated_at": datetime.now(),
+        "pending_orders": plan["pending_orders"],
+        "batches": [
+            dict(batch, sandwich_name=names.get(batch["sandwich_id"]), sequence=position)
+            for position, batch in enumerate(plan["batches"], start=1)
+        ],
+    }
@@ -0,0 +1,159 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, func
+from fastapi import HTTPException, status
+from ..models import menu as model
+from ..models import sandwiches as sandwich_model
+from ..models import recipes as recipe_model
+from ..models import resources as resource_model
+from ..models import reviews as review_model
+from ..models import archives as archive_model
+from ..dependencies.config import conf
+from ..dependencies.single_flight import single_flight
+from . import cache_versions
+from .menu_search import VERSION_NAME as SANDWICHES_VERSION
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from datetime import datetime
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Writers bump these in the same transaction as their change. Stock levels only
+# reach the menu through availability flips, which bump SANDWICHES_VERSION.
+RECIPES_VERSION = "recipes"
+RESOURCES_VERSION = "resources"
+VERSION_NAMES = (SANDWICHES_VERSION, RECIPES_VERSION, RESOURCES_VERSION)
+# Reviews change far more often than the rest, so a counter row would be updated by
+# every review write. The ratings are versioned by review_rating_counts.updated_at
+# instead; the name is still the response cache tag of rating reports.
+RATINGS_VERSION = "review_ratings"
+
+
+def ratings_version(db: Session):
+    """The latest change to the rating counts, "0" before the first review.
+
+    A review write that commits just after a later-stamped one is seen with
+    the next rating change, not before; ratings may lag, prices never do.
+    """
+    stamp = db.query(func.max(review_model.ReviewRatingCount.updated_at)).scalar()
+    return stamp.isoformat() if stamp else "0"
+
+
+def version_key(versions: dict, ratings: str):
+    return ".".join([*(str(versions[name]) for name in VERSION_NAMES), ratings])
+
+
+def build(db: Session):
+    """The whole menu as one JSON-ready dict: four queries whatever the number of sandwiches"""
+    sandwich = sandwich_model.Sandwich
+    recipe = recipe_model.Recipe
+    resource = resource_model.Resource
+    counts = review_model.ReviewRatingCount
+    archived = archive_model.ArchivedSandwichStat
+
+    ingredients = {}
+    for sandwich_id, resource_id, item, amount in db.query(
+        recipe.sandwich_id, recipe.resource_id, resource.item, recipe.amount
+    ).outerjoin(resource, resource.id == recipe.resource_id).order_by(recipe.sandwich_id, recipe.id):
+        ingredients.setdefault(sandwich_id, []).append({"resource_id": resource_id, "item": item, "amount": amount})
+
+    # Live rating counts plus the totals of archived reviews, like /analytics/dish-ratings
+    ratings = {
+        sandwich_id: [int(review_count or 0), int(rating_sum or 0)]
+        for sandwich_id, review_count, rating_sum in db.query(
+            counts.sandwich_id, func.sum(counts.review_count), func.sum(counts.rating * counts.review_count)
+        ).group_by(counts.sandwich_id)
+    }
+    for sandwich_id, review_count, rating_sum in db.query(archived.sandwich_id, archived.review_count, archived.rating_sum):
+        totals = ratings.setdefault(sandwich_id, [0, 0])
+        totals[0] += review_count or 0
+        totals[1] += rating_sum or 0
+
+    items = []
+    for row in db.query(
+        sandwich.id, sandwich.sandwich_name, sandwich.price, sandwich.category,
+        sandwich.description, sandwich.is_available
+    ).order_by(sandwich.id):
+        review_count, rating_sum = ratings.get(row.id, (0, 0))
+        items.append({
+            "id": row.id,
+            "sandwich_name": row.sandwich_name,
+            "price": float(row.price),
+            "category": row.category,
+            "description": row.description,
+            "is_available": bool(row.is_available),
+            "average_rating": round(rating_sum / review_count, 2) if review_count else None,
+            "review_count": review_count,
+            "ingredients": ingredients.get(row.id, []),
+        })
+    return {"generated_at": datetime.now().isoformat(timespec="seconds"), "sandwiches": items}
+
+
+class MenuCache:
+    """The serialized GET /menu document of this worker and its ETag.
+
+    Every refresh_seconds the cache reads the menu versions (two queries); while
+    they are unchanged requests are answered from memory. A new combination
+    is loaded from menu_documents, or built and stored there by whichever
+    worker gets to it first.
+    """
+
+    def __init__(self, refresh_seconds: float = None):
+        self.refresh_seconds = conf.menu_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._document = None  # (version, etag, body)
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, db: Session, version: str):
+        stored = db.get(model.MenuDocument, version)
+        if stored is not None:
+            return version, stored.etag, stored.body.encode()
+
+        document = build(db)
+        document["version"] = version
+        body = json.dumps(document, separators=(",", ":")).encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        try:
+            with db.begin_nested():
+                db.add(model.MenuDocument(version=version, etag=etag, body=body.decode(), built_at=datetime.now()))
+        except IntegrityError:
+            # Another worker stored this version first, theirs is just as good
+            stored = db.get(model.MenuDocument, version)
+            return version, stored.etag, stored.body.encode()
+        db.execute(delete(model.MenuDocument).where(model.MenuDocument.version != version))
+        db.commit()
+        logger.info(f"Menu document built for version {version}: {len(document['sandwiches'])} sandwiches")
+        return version, etag, body
+
+    def get(self, db: Session):
+        """(etag, body) of the current menu"""
+        document = self._document
+        if document is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return document[1], document[2]
+        version = version_key(cache_versions.current_many(db, VERSION_NAMES), ratings_version(db))
+        if document is None or document[0] != version:
+            # Requests arriving together after a change wait for one load instead of each building it
+            document, _ = single_flight.do(("menu", version), self._load, db, version, name="menu document")
+        with self._lock:
+            self._document = document
+            self._checked_at = time.monotonic()
+        return document[1], document[2]
+
+    def invalidate(self):
+        """Make the next request check the versions, after this worker committed a menu change"""
+        self._checked_at = 0.0
+
+
+menu_cache = MenuCache()
+
+
+def read_menu(db: Session):
+    try:
+        return menu_cache.get(db)
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -0,0 +1,215 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from ..models import sandwiches as model
+from ..dependencies.config import conf
+from . import cache_versions
+from sqlalchemy.exc import SQLAlchemyError
+import bisect
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Bumped by every write that changes what the menu index holds
+VERSION_NAME = "sandwiches"
+# A word in the name counts more than the same word in the category or description
+FIELD_WEIGHTS = (("sandwich_name", 3.0), ("category", 2.0), ("description", 1.0))
+EXACT = 1.0
+PREFIX = 0.7
+FUZZY = 0.4
+MAX_PREFIX_TERMS = 50  # expansions of one short prefix, so "s" can't touch every word
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def words(text: str):
+    """Lowercase, accent-free words of text"""
+    if not text:
+        return []
+    decomposed = unicodedata.normalize("NFKD", text)
+    return _WORD.findall("".join(c for c in decomposed if not unicodedata.combining(c)).casefold())
+
+
+def trigrams(term: str):
+    padded = f"^{term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_typos(term: str):
+    """Edits a query word may be away from an indexed word: none below 4 letters, 2 from 8"""
+    return 0 if len(term) < 4 else 1 if len(term) < 8 else 2
+
+
+def within_distance(a: str, b: str, limit: int):
+    """Whether a and b are at most limit edits apart (insert, delete, substitute, swap neighbours)"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+    return current[-1] <= limit
+
+
+class MenuIndex:
+    """Immutable search index over one snapshot of the menu.
+
+    Words are kept in a sorted list, so every word starting with a prefix is
+    one bisect away, and in a trigram table that narrows typo matching down
+    to words sharing most of their trigrams before any edit distance is
+    computed.
+    """
+
+    def __init__(self, sandwiches):
+        self.docs = {sandwich["id"]: sandwich for sandwich in sandwiches}
+        self.postings = {}
+        for sandwich in sandwiches:
+            for field, weight in FIELD_WEIGHTS:
+                for term in words(sandwich[field]):
+                    entry = self.postings.setdefault(term, {})
+                    entry[sandwich["id"]] = max(entry.get(sandwich["id"], 0.0), weight)
+        self.terms = sorted(self.postings)
+        self.grams = {}
+        for term in self.terms:
+            for gram in trigrams(term):
+                self.grams.setdefault(gram, []).append(term)
+
+    def expand(self, token: str):
+        """Indexed words a query word matches, with how well it matches each"""
+        matches = {}
+        start = bisect.bisect_left(self.terms, token)
+        for term in self.terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            matches[term] = EXACT if term == token else PREFIX
+        limit = max_typos(token)
+        if limit:
+            grams = trigrams(token)
+            shared = {}
+            for gram in grams:
+                for term in self.grams.get(gram, ()):
+                    shared[term] = shared.get(term, 0) + 1
+            # One edit changes at most three trigrams
+            needed = max(1, len(grams) - 3 * limit)
+            for term, count in shared.items():
+                if count >= needed and term not in matches and within_distance(token, term, limit):
+                    matches[term] = FUZZY
+        return matches
+
+    def search(self, q: str, category: str = None, available_only: bool = False, limit: int = 20):
+        tokens = list(dict.fromkeys(words(q)))
+        scores = None
+        for token in tokens:
+            token_scores = {}
+            for term, quality in self.expand(token).items():
+                for doc_id, weight in self.postings[term].items():
+                    token_scores[doc_id] = max(token_scores.get(doc_id, 0.0), quality * weight)
+            # Every query word has to match something
+            scores = token_scores if scores is None else {
+                doc_id: score + token_scores[doc_id] for doc_id, score in scores.items() if doc_id in token_scores
+            }
+            if not scores:
+                break
+        scores = scores or {}
+        if available_only:
+            scores = {doc_id: score for doc_id, score in scores.items() if self.docs[doc_id]["is_available"]}
+
+        # Facet counts ignore the category filter so the other categories stay selectable
+        facets = {}
+        for doc_id in scores:
+            name = self.docs[doc_id]["category"]
+            if name:
+                facets[name] = facets.get(name, 0) + 1
+        if category:
+            wanted = category.casefold()
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if (self.docs[doc_id]["category"] or "").casefold() == wanted
+            }
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: (-item[1], not self.docs[item[0]]["is_available"], self.docs[item[0]]["sandwich_name"])
+        )
+        return {
+            "query": q,
+            "total": len(scores),
+            "results": [dict(self.docs[doc_id], score=round(score, 3)) for doc_id, score in ranked[:limit]],
+            "facets": {"category": dict(sorted(facets.items(), key=lambda item: (-item[1], item[0])))},
+        }
+
+
+class MenuSearch:
+    """The menu index of this worker, rebuilt whenever the menu version moves.
+
+    Sandwich writes on this worker make the next search rebuild it; other
+    workers notice the new cache_versions value within refresh_seconds.
+    """
+
+    def __init__(self, refresh_seconds: float = None):
+        self.refresh_seconds = conf.menu_search_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._index = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def rebuild(self, db: Session, version: int = None):
+        version = cache_versions.current(db, VERSION_NAME) if version is None else version
+        sandwich = model.Sandwich
+        index = MenuIndex([
+            {
+                "id": row.id, "sandwich_name": row.sandwich_name, "price": float(row.price),
+                "category": row.category, "description": row.description, "is_available": bool(row.is_available),
+            }
+            for row in db.query(
+                sandwich.id, sandwich.sandwich_name, sandwich.price, sandwich.category,
+                sandwich.description, sandwich.is_available
+            )
+        ])
+        with self._lock:
+            self._index = index
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info(f"Menu search index rebuilt: {len(index.docs)} sandwiches, {len(index.terms)} words, version {version}")
+
+    def _refresh(self, db: Session):
+        if self._index is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        try:
+            version = cache_versions.current(db, VERSION_NAME)
+            if version != self._version:
+                self.rebuild(db, version)
+            else:
+                self._checked_at = time.monotonic()
+        except SQLAlchemyError as e:
+            if self._index is None:
+                raise
+            logger.warning(f"Menu search refresh failed, serving the last index: {e}")
+
+    def invalidate(self):
+        """Make the next search check the version, after this worker committed a menu change"""
+        self._checked_at = 0.0
+
+    def search(self, db: Session, q: str, category: str = None, available_only: bool = False, limit: int = 20):
+        self._refresh(db)
+        return self._index.search(q, category=category, available_only=available_only, limit=limit)
+
+
+menu_search = MenuSearch()
+
+
+def search(db: Session, q: str, category: str = None, available_only: bool = False, limit: int = 20):
+    if not words(q):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Query has no searchable words")
+    try:
+        return menu_search.search(db, q, category=category, available_only=available_only, limit=limit)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
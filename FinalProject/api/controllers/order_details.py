@@ -1,6 +1,7 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status, Response, Depends
 from ..models import order_details as model
+from ..dependencies.response_cache import invalidate_on_commit
 from sqlalchemy.exc import SQLAlchemyError
 
 
@@ -13,6 +14,7 @@ def create(db: Session, request):
 
     try:
         db.add(new_item)
+        invalidate_on_commit(db, "orders")
         db.commit()
         db.refresh(new_item)
     except SQLAlchemyError as e:
@@ -24,7 +26,7 @@ def create(db: Session, request):
 
 def read_all(db: Session):
     try:
-        result = db.query(model.OrderDetail).all()
+        result = db.query(model.OrderDetail).options(selectinload(model.OrderDetail.sandwich)).all()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -49,6 +51,7 @@ def update(db: Session, item_id, request):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         update_data = request.dict(exclude_unset=True)
         item.update(update_data, synchronize_session=False)
+        invalidate_on_commit(db, "orders")
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
@@ -62,6 +65,7 @@ def delete(db: Session, item_id):
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         item.delete(synchronize_session=False)
+        invalidate_on_commit(db, "orders")
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
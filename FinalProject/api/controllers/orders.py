@@ -1,4 +1,4 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status, Response, Depends
 from ..models import orders as model
 from ..models import order_details as order_detail_model
@@ -6,7 +6,16 @@ from ..models import sandwiches as sandwich_model
 from ..models import recipes as recipe_model
 from ..models import resources as resource_model
 from ..models import promotional_codes as promo_model
+from . import archives as archive_controller
+from .kitchen import scheduler as kitchen_scheduler
+from .promo_filter import promo_filter
+from . import promo_redemptions
+from . import availability
+from . import inventory
+from ..dependencies.events import publish_order_status, publish_order_statuses, order_event
+from ..dependencies.response_cache import invalidate_on_commit
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy import insert, or_
 from datetime import datetime
 import uuid
 from decimal import Decimal
@@ -17,8 +26,12 @@ def generate_tracking_number():
     return f"TRK-{uuid.uuid4().hex[:8].upper()}"
 
 
-def check_ingredient_availability(db: Session, sandwich_id: int, quantity: int):
-    """Check if there are enough ingredients for a sandwich order"""
+def check_ingredient_availability(db: Session, sandwich_id: int, quantity: int, levels: dict = None):
+    """Check if there are enough ingredients for a sandwich order.
+
+    levels maps resource ids to their current level from the inventory
+    ledger; without it the resources' snapshot amounts are used.
+    """
     # Get all recipes for this sandwich
     recipes = db.query(recipe_model.Recipe).filter(
         recipe_model.Recipe.sandwich_id == sandwich_id
@@ -35,22 +48,45 @@ def check_ingredient_availability(db: Session, sandwich_id: int, quantity: int):
             continue
             
         required_amount = recipe.amount * quantity
-        if resource.amount < required_amount:
+        have = levels.get(resource.id, resource.amount) if levels is not None else resource.amount
+        if have < required_amount:
             insufficient_resources.append(
-                f"Insufficient {resource.item}: need {required_amount}, have {resource.amount}"
+                f"Insufficient {resource.item}: need {required_amount}, have {have}"
             )
     
     return insufficient_resources
 
 
+def _shortfall_detail(db: Session, short):
+    """Error message for short, resource_id -> (units needed, units left)"""
+    names = dict(db.query(resource_model.Resource.id, resource_model.Resource.item).filter(
+        resource_model.Resource.id.in_(short)
+    ))
+    return "Insufficient ingredients: " + "; ".join(
+        f"Insufficient {names.get(resource_id, resource_id)}: need {need}, have {have}"
+        for resource_id, (need, have) in short.items()
+    )
+
+
+def _release(db: Session, hold, required):
+    """Give back the stock held for an order that was not placed; if this fails too, the compactor does it"""
+    try:
+        inventory.release(db, hold, required)
+    except SQLAlchemyError:
+        db.rollback()
+
+
 def create(db: Session, request):
     # Validate promo code if provided
     promo_code_id = None
+    redeemed_promo = None
     discount_percent = Decimal('0.00')
     if request.promo_code:
-        promo = db.query(promo_model.PromotionalCode).filter(
-            promo_model.PromotionalCode.code == request.promo_code
-        ).first()
+        promo = None
+        if promo_filter.might_exist(db, request.promo_code):
+            promo = db.query(promo_model.PromotionalCode).filter(
+                promo_model.PromotionalCode.code == request.promo_code
+            ).first()
         if not promo:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -68,18 +104,34 @@ def create(db: Session, request):
             )
         promo_code_id = promo.id
         discount_percent = promo.discount_percent
+        redeemed_promo = promo
     
-    # Check ingredient availability for all sandwiches in order
     total_price = Decimal('0.00')
-    all_insufficient = []
+    
+    # Units of every resource the whole order needs, and their current levels
+    amounts = {}
+    for order_detail in request.order_details:
+        sandwich_id = order_detail.sandwich_id if hasattr(order_detail, 'sandwich_id') else order_detail['sandwich_id']
+        amount = order_detail.amount if hasattr(order_detail, 'amount') else order_detail['amount']
+        amounts[sandwich_id] = amounts.get(sandwich_id, 0) + amount
+    required = {}
+    recipes = db.query(
+        recipe_model.Recipe.sandwich_id, recipe_model.Recipe.resource_id, recipe_model.Recipe.amount
+    ).filter(recipe_model.Recipe.sandwich_id.in_(amounts)).all() if amounts else []
+    for sandwich_id, resource_id, recipe_amount in recipes:
+        required[resource_id] = required.get(resource_id, 0) + recipe_amount * amounts[sandwich_id]
+    levels = inventory.levels(db, list(required))
+    sandwiches = {
+        sandwich.id: sandwich for sandwich in db.query(sandwich_model.Sandwich).filter(
+            sandwich_model.Sandwich.id.in_(amounts)
+        )
+    } if amounts else {}
     
     for order_detail in request.order_details:
         sandwich_id = order_detail.sandwich_id if hasattr(order_detail, 'sandwich_id') else order_detail['sandwich_id']
         amount = order_detail.amount if hasattr(order_detail, 'amount') else order_detail['amount']
         
-        sandwich = db.query(sandwich_model.Sandwich).filter(
-            sandwich_model.Sandwich.id == sandwich_id
-        ).first()
+        sandwich = sandwiches.get(sandwich_id)
         
         if not sandwich:
             raise HTTPException(
@@ -93,23 +145,22 @@ def create(db: Session, request):
                 detail=f"Sandwich '{sandwich.sandwich_name}' is not available"
             )
         
-        # Check ingredients
-        insufficient = check_ingredient_availability(
-            db, sandwich_id, amount
-        )
-        if insufficient:
-            all_insufficient.extend(insufficient)
-        
         # Calculate price
         item_total = Decimal(str(sandwich.price)) * Decimal(str(amount))
         total_price += item_total
     
-    # If insufficient ingredients, raise error
-    if all_insufficient:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient ingredients: " + "; ".join(all_insufficient)
-        )
+    # Check ingredients against the levels read above, then hold them; hold() checks again
+    short = {resource_id: (units, levels.get(resource_id, 0)) for resource_id, units in required.items()
+             if levels.get(resource_id, 0) < units}
+    if not short:
+        try:
+            hold, short = inventory.hold(db, required)
+        except SQLAlchemyError as e:
+            db.rollback()
+            error = str(e.__dict__['orig'])
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    if short:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=_shortfall_detail(db, short))
     
     # Apply discount
     if discount_percent > 0:
@@ -123,6 +174,7 @@ def create(db: Session, request):
         customer_name=request.customer_name,
         description=request.description,
         order_type=order_type_enum,
+        order_status=model.OrderStatus.PENDING,
         tracking_number=tracking_number,
         total_price=total_price,
         promo_code_id=promo_code_id
@@ -132,48 +184,63 @@ def create(db: Session, request):
         db.add(new_item)
         db.flush()  # Get the order ID
         
-        # Create order details and deduct resources
+        # Count the promo use in this transaction so a failed order gives it back
+        if redeemed_promo is not None:
+            promo_redemptions.redeem(db, redeemed_promo, new_item.id, request.customer_name)
+        
+        # Create order details with one INSERT and take the ingredients from the inventory ledger
+        items = []
         for order_detail in request.order_details:
             sandwich_id = order_detail.sandwich_id if hasattr(order_detail, 'sandwich_id') else order_detail['sandwich_id']
             amount = order_detail.amount if hasattr(order_detail, 'amount') else order_detail['amount']
-            
-            # Create order detail
-            od = order_detail_model.OrderDetail(
-                order_id=new_item.id,
-                sandwich_id=sandwich_id,
-                amount=amount
-            )
-            db.add(od)
-            
-            # Deduct resources
-            recipes = db.query(recipe_model.Recipe).filter(
-                recipe_model.Recipe.sandwich_id == sandwich_id
-            ).all()
-            
-            for recipe in recipes:
-                resource = db.query(resource_model.Resource).filter(
-                    resource_model.Resource.id == recipe.resource_id
-                ).first()
-                resource.amount -= recipe.amount * amount
+            items.append((sandwich_id, amount))
+        db.execute(insert(order_detail_model.OrderDetail), [
+            {"order_id": new_item.id, "sandwich_id": sandwich_id, "amount": amount} for sandwich_id, amount in items
+        ])
         
+        # Appends movement rows instead of updating the resources rows every order shares
+        inventory.confirm(db, hold, required, new_item.id)
+        availability.refresh(db, resource_ids=list(required), flips_only=True)
+        invalidate_on_commit(db, "orders")
         db.commit()
         db.refresh(new_item)
+        # Load the details and their sandwiches for the response in two queries, not one per line
+        db.query(model.Order).options(*_with_details()).filter(model.Order.id == new_item.id).all()
+    except HTTPException:
+        db.rollback()
+        _release(db, hold, required)
+        raise
     except SQLAlchemyError as e:
         db.rollback()
+        _release(db, hold, required)
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
+    kitchen_scheduler.add_order(new_item, items)
+    publish_order_status(new_item)
     return new_item
 
 
+def _with_details():
+    """Load what the Order schema shows for all rows at once instead of one query per order"""
+    return (
+        selectinload(model.Order.order_details).selectinload(order_detail_model.OrderDetail.sandwich),
+        selectinload(model.Order.promo_code),
+    )
+
+
 def read_all(db: Session, start_date: datetime = None, end_date: datetime = None):
     try:
-        query = db.query(model.Order)
+        query = db.query(model.Order).options(*_with_details())
         if start_date:
             query = query.filter(model.Order.order_date >= start_date)
         if end_date:
             query = query.filter(model.Order.order_date <= end_date)
         result = query.order_by(model.Order.order_date.desc()).all()
+        # Old completed orders live in the archive; only read it if the range reaches back that far
+        if archive_controller.range_needs_archive(db, start_date):
+            result.extend(archive_controller.read_all(db, start_date=start_date, end_date=end_date))
+            result.sort(key=lambda order: order.order_date, reverse=True)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -186,6 +253,8 @@ def read_by_tracking(db: Session, tracking_number: str):
         item = db.query(model.Order).filter(
             model.Order.tracking_number == tracking_number
         ).first()
+        if not item:
+            item = archive_controller.read_by_tracking(db, tracking_number)
         if not item:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tracking number not found!")
     except SQLAlchemyError as e:
@@ -194,6 +263,18 @@ def read_by_tracking(db: Session, tracking_number: str):
     return item
 
 
+def read_active(db: Session):
+    """Orders the kitchen still has to work on"""
+    try:
+        result = db.query(model.Order).filter(
+            model.Order.order_status != model.OrderStatus.COMPLETED
+        ).order_by(model.Order.order_date).all()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return result
+
+
 def read_one(db: Session, item_id):
     try:
         item = db.query(model.Order).filter(model.Order.id == item_id).first()
@@ -217,13 +298,90 @@ def update(db: Session, item_id, request):
         if 'order_status' in update_data:
             update_data['order_status'] = model.OrderStatus(update_data['order_status'])
         item.update(update_data, synchronize_session=False)
+        invalidate_on_commit(db, "orders")
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
     except ValueError as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid enum value: {str(e)}")
-    return item.first()
+    updated = item.first()
+    if 'order_status' in update_data:
+        kitchen_scheduler.order_changed(updated)
+        publish_order_status(updated)
+    return updated
+
+
+def update_status(db: Session, request):
+    """Apply one target status to many orders with a single UPDATE.
+
+    The matching rows are read and locked first so every requested id or
+    tracking number gets an outcome, then one UPDATE moves all orders whose
+    current status may legally advance to the target.
+    """
+    try:
+        target = model.OrderStatus(request.order_status)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid enum value: {str(e)}")
+    sources = [current for current, allowed in model.STATUS_TRANSITIONS.items() if target in allowed]
+
+    order_ids = list(dict.fromkeys(request.order_ids))
+    tracking_numbers = list(dict.fromkeys(request.tracking_numbers))
+    if not order_ids and not tracking_numbers:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No order ids or tracking numbers given")
+
+    try:
+        rows = db.query(
+            model.Order.id, model.Order.tracking_number, model.Order.order_type, model.Order.order_status
+        ).filter(
+            or_(model.Order.id.in_(order_ids), model.Order.tracking_number.in_(tracking_numbers))
+        ).with_for_update().all()
+
+        movable = [row for row in rows if row.order_status in sources]
+        if movable:
+            db.query(model.Order).filter(
+                model.Order.id.in_([row.id for row in movable]),
+                model.Order.order_status.in_(sources)
+            ).update({model.Order.order_status: target}, synchronize_session=False)
+            invalidate_on_commit(db, "orders")
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+    by_id = {row.id: row for row in rows}
+    by_tracking = {row.tracking_number: row for row in rows if row.tracking_number}
+    movable_ids = {row.id for row in movable}
+    requested = [("order_id", i, by_id.get(i)) for i in order_ids]
+    requested += [("tracking_number", t, by_tracking.get(t)) for t in tracking_numbers]
+    results = []
+    reported = set()
+    for field, value, row in requested:
+        if row is None:
+            results.append({field: value, "outcome": "not_found"})
+            continue
+        if row.id in reported:
+            continue
+        reported.add(row.id)
+        if row.id in movable_ids:
+            outcome = "updated"
+        elif row.order_status == target:
+            outcome = "unchanged"
+        else:
+            outcome = "illegal_transition"
+        results.append({
+            "order_id": row.id,
+            "tracking_number": row.tracking_number,
+            "outcome": outcome,
+            "previous_status": row.order_status.value,
+        })
+
+    events = [dict(order_event(row), order_status=target.value) for row in movable]
+    for row in movable:
+        kitchen_scheduler.remove_order(row.id)
+    publish_order_statuses(events)
+    return {"order_status": target.value, "updated": len(movable), "results": results}
 
 
 def delete(db: Session, item_id):
@@ -232,8 +390,10 @@ def delete(db: Session, item_id):
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         item.delete(synchronize_session=False)
+        invalidate_on_commit(db, "orders")
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    kitchen_scheduler.remove_order(item_id)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
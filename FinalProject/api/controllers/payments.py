@@ -1,15 +1,45 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status, Response
 from ..models import payments as model
+from ..dependencies.config import conf
+from ..dependencies.database import SessionLocal
+from ..dependencies.payment_gateway import (
+    get_dispatcher, GatewayError, CircuitOpenError, PaymentDeclined, PaymentNotCharged
+)
 from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+from decimal import Decimal
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Methods that go through the payment gateway; cash is settled at the counter
+GATEWAY_METHODS = {model.PaymentMethod.CREDIT_CARD, model.PaymentMethod.DEBIT_CARD, model.PaymentMethod.ONLINE}
+
+# Payments this process has handed to the gateway and not yet heard back about
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def uses_gateway(payment_method):
+    return conf.payment_gateway is not None and payment_method in GATEWAY_METHODS
 
 
 def create(db: Session, request):
+    payment_method = model.PaymentMethod(request.payment_method)
+    if uses_gateway(payment_method):
+        # The gateway decides the outcome, whatever status the client sent
+        payment_status = model.PaymentStatus.PENDING
+    else:
+        payment_status = model.PaymentStatus(request.payment_status) if request.payment_status else model.PaymentStatus.PENDING
     new_item = model.Payment(
         order_id=request.order_id,
         amount=request.amount,
-        payment_method=model.PaymentMethod(request.payment_method),
-        payment_status=model.PaymentStatus(request.payment_status) if request.payment_status else model.PaymentStatus.PENDING
+        payment_method=payment_method,
+        payment_status=payment_status,
+        payment_date=datetime.now()
     )
 
     try:
@@ -20,9 +50,110 @@ def create(db: Session, request):
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
+    if uses_gateway(payment_method):
+        dispatch(new_item)
     return new_item
 
 
+def in_flight(payment_id: int):
+    with _in_flight_lock:
+        return payment_id in _in_flight
+
+
+def dispatch(payment):
+    """Charge a pending payment in the background, the HTTP request does not wait for it.
+
+    Returns None without dispatching if this process is already charging it.
+    """
+    with _in_flight_lock:
+        if payment.id in _in_flight:
+            return None
+        _in_flight.add(payment.id)
+    method = payment.payment_method.value
+    try:
+        return get_dispatcher().submit(_charge(payment.id, Decimal(str(payment.amount)), method))
+    except BaseException:
+        _done(payment.id)
+        raise
+
+
+def _done(payment_id: int):
+    with _in_flight_lock:
+        _in_flight.discard(payment_id)
+
+
+async def _charge(payment_id: int, amount: Decimal, method: str):
+    try:
+        try:
+            await get_dispatcher().client.charge(f"payment-{payment_id}", amount, method)
+            new_status = model.PaymentStatus.COMPLETED
+        except CircuitOpenError:
+            # Leave it pending, POST /payments/{id}/process retries it once the gateway recovers
+            logger.warning(f"Payment {payment_id} left pending, gateway circuit is open")
+            return None
+        except PaymentNotCharged as e:
+            logger.info(f"Payment {payment_id} left pending: {e}")
+            return None
+        except (PaymentDeclined, GatewayError) as e:
+            logger.info(f"Payment {payment_id} failed: {e}")
+            new_status = model.PaymentStatus.FAILED
+        await asyncio.to_thread(_record_outcome, payment_id, new_status)
+        return new_status
+    finally:
+        _done(payment_id)
+
+
+def _record_outcome(payment_id: int, new_status):
+    """Store the gateway result unless someone changed the payment in the meantime"""
+    db = SessionLocal()
+    try:
+        db.query(model.Payment).filter(
+            model.Payment.id == payment_id,
+            model.Payment.payment_status == model.PaymentStatus.PENDING
+        ).update({model.Payment.payment_status: new_status}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def process(db: Session, item_id):
+    """Send a pending or failed gateway payment to the gateway again.
+
+    A failed payment is claimed with a guarded UPDATE (failed -> pending), so
+    of two concurrent retries only one dispatches it. A pending payment is
+    only re-sent if this process is not charging it already; a charge still
+    running in another worker is harmless because gateway calls are
+    idempotent per payment.
+    """
+    busy = HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Payment is already being processed")
+    try:
+        item = db.query(model.Payment).filter(model.Payment.id == item_id).first()
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        if not uses_gateway(item.payment_method):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Payment method is not processed by the gateway")
+        if item.payment_status == model.PaymentStatus.FAILED:
+            claimed = db.query(model.Payment).filter(
+                model.Payment.id == item_id,
+                model.Payment.payment_status == model.PaymentStatus.FAILED
+            ).update({model.Payment.payment_status: model.PaymentStatus.PENDING}, synchronize_session=False)
+            db.commit()
+            if not claimed:
+                raise busy
+        elif item.payment_status == model.PaymentStatus.PENDING:
+            if in_flight(item.id):
+                raise busy
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Payment is already {item.payment_status.value}")
+        db.refresh(item)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    if dispatch(item) is None:
+        raise busy
+    return item
+
+
 def read_all(db: Session, payment_status: str = None):
     try:
         query = db.query(model.Payment)
@@ -0,0 +1,115 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from fastapi import HTTPException, status
+from ..models import promotional_codes as model
+from ..models import promo_redemptions as redemption_model
+from ..dependencies.config import conf
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from datetime import datetime
+from . import cache_versions
+from .promo_redemptions import shard_rows
+from .promo_filter import promo_filter, normalize, VERSION_NAME
+import csv
+import io
+import secrets
+
+PLACEHOLDER = "#"
+# No 0/O or 1/I, so codes survive being read aloud or retyped from print
+ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+# Give up after this many chunks in a row without a single new code
+MAX_EMPTY_CHUNKS = 5
+
+
+def expand(pattern: str):
+    """Replace every # in pattern with a random character from ALPHABET"""
+    return "".join(secrets.choice(ALPHABET) if c == PLACEHOLDER else c for c in pattern)
+
+
+def validate(request):
+    """Raise 400 before any streaming starts if the pattern can't produce count codes"""
+    slots = request.pattern.count(PLACEHOLDER)
+    if len(request.pattern) > model.PromotionalCode.code.type.length:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pattern is longer than a promo code")
+    # Keep the code space at least twice the batch so collisions stay rare
+    if len(ALPHABET) ** slots < 2 * request.count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Pattern needs more {PLACEHOLDER} placeholders to generate {request.count} unique codes"
+        )
+
+
+def _insert_chunk(db: Session, request, candidates):
+    """Insert the candidates that don't exist yet, return them. Two queries plus the INSERTs."""
+    existing = {normalize(code) for (code,) in db.query(model.PromotionalCode.code).filter(
+        model.PromotionalCode.code.in_(candidates)
+    )}
+    fresh = [code for code in candidates if normalize(code) not in existing]
+    if not fresh:
+        return fresh
+
+    now = datetime.now()
+    with db.begin_nested():
+        db.execute(insert(model.PromotionalCode), [{
+            "code": code,
+            "discount_percent": request.discount_percent,
+            "expiration_date": request.expiration_date,
+            "is_active": request.is_active,
+            "max_uses": request.max_uses,
+            "max_uses_per_customer": request.max_uses_per_customer,
+            "created_at": now,
+        } for code in fresh])
+    if request.max_uses is not None:
+        ids = db.query(model.PromotionalCode.id).filter(model.PromotionalCode.code.in_(fresh)).all()
+        db.execute(insert(redemption_model.PromoCodeShard),
+                   [row for (promo_code_id,) in ids for row in shard_rows(promo_code_id, request.max_uses)])
+    return fresh
+
+
+def generate(db: Session, request, chunk_size: int = None):
+    """Create request.count codes from request.pattern, yielding each committed chunk of codes.
+
+    Duplicates, both within the batch and against codes already stored, are
+    dropped with one lookup per chunk. If another writer inserts one of the
+    codes between that lookup and the INSERT, the chunk is redrawn.
+    """
+    chunk_size = chunk_size or conf.promo_batch_chunk_size
+    seen = set()
+    remaining = request.count
+    empty_chunks = 0
+    while remaining > 0 and empty_chunks < MAX_EMPTY_CHUNKS:
+        candidates = {}
+        attempts = 0
+        while len(candidates) < min(chunk_size, remaining) and attempts < 10 * chunk_size:
+            code = expand(request.pattern)
+            key = normalize(code)
+            if key not in seen and key not in candidates:
+                candidates[key] = code
+            attempts += 1
+        try:
+            fresh = _insert_chunk(db, request, list(candidates.values()))
+            version = cache_versions.bump(db, VERSION_NAME) if fresh else None
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            empty_chunks += 1
+            continue
+        except SQLAlchemyError as e:
+            db.rollback()
+            error = str(e.__dict__['orig'])
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+        seen.update(candidates)
+        empty_chunks = 0 if fresh else empty_chunks + 1
+        if fresh:
+            promo_filter.added(fresh, version)
+            remaining -= len(fresh)
+            yield fresh
+
+
+def generate_csv(db: Session, request, chunk_size: int = None):
+    """generate() as CSV text, one piece per committed chunk"""
+    yield "code\n"
+    for codes in generate(db, request, chunk_size):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows([code] for code in codes)
+        yield buffer.getvalue()
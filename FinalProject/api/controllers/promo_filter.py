@@ -0,0 +1,92 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+from ..models import promotional_codes as promo_model
+from ..dependencies.bloom import BloomFilter
+from ..dependencies.config import conf
+from . import cache_versions
+import logging
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+VERSION_NAME = "promotional_codes"
+
+
+def normalize(code: str):
+    """Fold a code the way MySQL's default collation compares it.
+
+    Case, accents and trailing spaces are ignored by utf8mb4 *_ci collations,
+    so the filter must ignore them too or it would reject codes the
+    database would have matched.
+    """
+    decomposed = unicodedata.normalize("NFKD", code)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold().rstrip(" ")
+
+
+class PromoCodeFilter:
+    """Bloom filter over every promotional code, shared by all requests of a worker.
+
+    Writes from this worker are added straight away. Every refresh_seconds
+    the filter compares its version with the cache_versions row and rebuilds
+    if another worker changed the codes, so all workers converge within that
+    window. Until the first successful build every code is let through to
+    the database.
+    """
+
+    def __init__(self, size_bits: int = None, hash_count: int = None, refresh_seconds: float = None):
+        self.size_bits = size_bits or conf.promo_filter_bits
+        self.hash_count = hash_count or conf.promo_filter_hashes
+        self.refresh_seconds = conf.promo_filter_refresh_seconds if refresh_seconds is None else refresh_seconds
+        self._filter = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def rebuild(self, db: Session, version: int = None):
+        version = cache_versions.current(db, VERSION_NAME) if version is None else version
+        new_filter = BloomFilter(self.size_bits, self.hash_count)
+        for (code,) in db.query(promo_model.PromotionalCode.code).yield_per(10000):
+            new_filter.add(normalize(code))
+        with self._lock:
+            self._filter = new_filter
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info(f"Promo code filter rebuilt: {new_filter.count} codes, version {version}")
+
+    def _refresh(self, db: Session):
+        if self._filter is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        try:
+            version = cache_versions.current(db, VERSION_NAME)
+            if version != self._version:
+                self.rebuild(db, version)
+            else:
+                self._checked_at = time.monotonic()
+        except SQLAlchemyError as e:
+            logger.warning(f"Promo code filter refresh failed: {e}")
+
+    def might_exist(self, db: Session, code: str):
+        """False means the code certainly does not exist, True means ask the database"""
+        self._refresh(db)
+        current = self._filter
+        if current is None:
+            return True
+        return normalize(code) in current
+
+    def added(self, codes, version: int):
+        """Record codes this worker just committed along with the version its write produced"""
+        with self._lock:
+            if self._filter is None:
+                return
+            for code in codes:
+                self._filter.add(normalize(code))
+            # If nobody else wrote in between we are still complete, otherwise rebuild on next check
+            if self._version is not None and version == self._version + 1:
+                self._version = version
+            else:
+                self._checked_at = 0.0
+
+
+promo_filter = PromoCodeFilter()
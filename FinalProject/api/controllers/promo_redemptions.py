@@ -0,0 +1,138 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import delete, func, update
+from fastapi import HTTPException, status
+from ..models import promo_redemptions as model
+from ..dependencies.config import conf
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from datetime import datetime
+import random
+
+
+def _split(total: int, parts: int):
+    """Split total into parts capacities that differ by at most one"""
+    base, extra = divmod(total, parts)
+    return [base + (1 if i < extra else 0) for i in range(parts)]
+
+
+def shard_rows(promo_code_id: int, max_uses: int):
+    """New shards for a code, never more shards than uses so single-use codes get one row"""
+    parts = max(1, min(conf.promo_counter_shards, max_uses))
+    return [
+        {"promo_code_id": promo_code_id, "shard": number, "capacity": capacity, "used": 0}
+        for number, capacity in enumerate(_split(max_uses, parts))
+    ]
+
+
+def set_limit(db: Session, promo_code_id: int, max_uses):
+    """Create or resize a code's shards so their capacities add up to max_uses.
+
+    Uses already claimed stay where they are; only the free capacity is
+    spread again. Lowering the limit below what was used leaves the code
+    exhausted. Runs inside the caller's transaction.
+    """
+    if max_uses is None:
+        # A bulk DELETE runs now; ORM deletes would wait for a flush the caller may never do
+        db.execute(delete(model.PromoCodeShard).where(model.PromoCodeShard.promo_code_id == promo_code_id))
+        return
+    shards = db.query(model.PromoCodeShard).filter(
+        model.PromoCodeShard.promo_code_id == promo_code_id
+    ).with_for_update().all()
+
+    if not shards:
+        for row in shard_rows(promo_code_id, max_uses):
+            db.add(model.PromoCodeShard(**row))
+        return
+
+    used = sum(shard.used for shard in shards)
+    free = _split(max(max_uses - used, 0), len(shards))
+    for shard, extra in zip(shards, free):
+        shard.capacity = shard.used + extra
+
+
+def _claim_use(db: Session, promo_code_id: int):
+    """Take one use from a random shard with free capacity, False if all are full"""
+    shard_numbers = [row[0] for row in db.query(model.PromoCodeShard.shard).filter(
+        model.PromoCodeShard.promo_code_id == promo_code_id
+    ).all()]
+    random.shuffle(shard_numbers)
+    for number in shard_numbers:
+        claimed = db.execute(
+            update(model.PromoCodeShard).where(
+                model.PromoCodeShard.promo_code_id == promo_code_id,
+                model.PromoCodeShard.shard == number,
+                model.PromoCodeShard.used < model.PromoCodeShard.capacity
+            ).values(used=model.PromoCodeShard.used + 1)
+        ).rowcount
+        if claimed:
+            return True
+    return False
+
+
+def customer_key(customer_name: str):
+    return (customer_name or "").strip().lower()[:100]
+
+
+def _claim_customer_slot(db: Session, promo, order_id: int, customer_name: str):
+    """Insert a redemption into the first free slot, False if the customer used them all.
+
+    Two concurrent orders from the same customer may pick the same slot; the
+    unique key makes one of them fail and try the next slot instead.
+    """
+    key = customer_key(customer_name)
+    limit = promo.max_uses_per_customer
+    if limit is None:
+        db.add(model.PromoRedemption(
+            promo_code_id=promo.id, order_id=order_id, customer_key=key, slot=None, redeemed_at=datetime.now()
+        ))
+        return True
+
+    taken = db.query(func.count(model.PromoRedemption.id)).filter(
+        model.PromoRedemption.promo_code_id == promo.id,
+        model.PromoRedemption.customer_key == key
+    ).scalar()
+    for slot in range(taken + 1, limit + 1):
+        try:
+            with db.begin_nested():
+                db.add(model.PromoRedemption(
+                    promo_code_id=promo.id, order_id=order_id, customer_key=key, slot=slot, redeemed_at=datetime.now()
+                ))
+            return True
+        except IntegrityError:
+            continue
+    return False
+
+
+def redeem(db: Session, promo, order_id: int, customer_name: str):
+    """Count one use of promo for an order, inside the order's transaction.
+
+    Raises HTTPException if a limit is reached; the caller rolls back, which
+    also gives back any use claimed here.
+    """
+    if promo.max_uses is not None and not _claim_use(db, promo.id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Promotional code usage limit reached")
+    if not _claim_customer_slot(db, promo, order_id, customer_name):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Promotional code already used the maximum number of times by this customer"
+        )
+
+
+def usage(db: Session, promo):
+    try:
+        if promo.max_uses is not None:
+            used = db.query(func.coalesce(func.sum(model.PromoCodeShard.used), 0)).filter(
+                model.PromoCodeShard.promo_code_id == promo.id
+            ).scalar()
+        else:
+            used = db.query(func.count(model.PromoRedemption.id)).filter(
+                model.PromoRedemption.promo_code_id == promo.id
+            ).scalar()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {
+        "promo_code_id": promo.id,
+        "max_uses": promo.max_uses,
+        "used": int(used),
+        "remaining": max(promo.max_uses - int(used), 0) if promo.max_uses is not None else None,
+    }
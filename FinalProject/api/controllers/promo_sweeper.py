@@ -0,0 +1,99 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import update
+from fastapi import HTTPException, status
+from ..models import promotional_codes as model
+from ..dependencies.config import conf
+from ..dependencies.jobs import PeriodicJob
+from ..dependencies.response_cache import invalidate_on_commit
+from .promo_filter import VERSION_NAME
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _expired(now: datetime):
+    return (
+        model.PromotionalCode.is_active == True,  # noqa: E712
+        model.PromotionalCode.expiration_date < now,
+    )
+
+
+def sweep_batch(db: Session, now: datetime, batch_size: int):
+    """Deactivate up to batch_size expired codes in one short transaction.
+
+    Returns (selected, deactivated); fewer are deactivated than selected when
+    a code was changed by someone else in between.
+    """
+    ids = [row[0] for row in db.query(model.PromotionalCode.id).filter(
+        *_expired(now)
+    ).order_by(model.PromotionalCode.expiration_date).limit(batch_size)]
+    if not ids:
+        db.commit()
+        return 0, 0
+    # Repeat the condition so a code reactivated or extended since the SELECT is left alone
+    changed = db.execute(
+        update(model.PromotionalCode).where(model.PromotionalCode.id.in_(ids), *_expired(now)).values(is_active=False)
+    ).rowcount
+    if changed:
+        invalidate_on_commit(db, VERSION_NAME)
+    db.commit()
+    return len(ids), changed
+
+
+def sweep(db: Session, batch_size: int = None, pause_seconds: float = None):
+    """Deactivate every code that has expired by now, one bounded batch at a time.
+
+    Each batch locks at most batch_size rows and commits before the next one,
+    so orders and admin writes are never stuck behind a long table scan.
+    """
+    batch_size = batch_size or conf.promo_sweep_batch_size
+    pause_seconds = conf.promo_sweep_pause_seconds if pause_seconds is None else pause_seconds
+    now = datetime.now()
+    total = 0
+    batches = 0
+    while True:
+        # Only an empty batch means nothing is left: rows changed concurrently
+        # can make a full batch deactivate fewer than batch_size codes
+        selected, changed = sweep_batch(db, now, batch_size)
+        if not selected:
+            return {"deactivated": total, "batches": batches}
+        total += changed
+        batches += 1
+        if selected == batch_size:
+            time.sleep(pause_seconds)
+
+
+class ExpirySweeper(PeriodicJob):
+    """Runs sweep() every interval_seconds in a daemon thread"""
+
+    name = "promo-expiry-sweeper"
+
+    def __init__(self, interval_seconds: float = None):
+        super().__init__(conf.promo_sweep_interval_seconds if interval_seconds is None else interval_seconds)
+
+    def work(self, db: Session):
+        result = sweep(db)
+        if result["deactivated"]:
+            logger.info(f"Deactivated {result['deactivated']} expired promo codes in {result['batches']} batches")
+        return result
+
+    def metrics(self):
+        metrics = super().metrics()
+        metrics["deactivated_total"] = metrics["totals"].get("deactivated", 0)
+        metrics["last_deactivated"] = (metrics["last_result"] or {}).get("deactivated", 0)
+        return metrics
+
+
+sweeper = ExpirySweeper()
+
+
+def run_now(db: Session):
+    try:
+        sweeper.run_once(db)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return sweeper.metrics()
@@ -3,6 +3,10 @@ from fastapi import HTTPException, status, Response
 from ..models import promotional_codes as model
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
+from . import cache_versions
+from . import promo_redemptions
+from .promo_filter import promo_filter, VERSION_NAME
+from ..dependencies.response_cache import invalidate_on_commit
 
 
 def create(db: Session, request):
@@ -10,17 +14,24 @@ def create(db: Session, request):
         code=request.code,
         discount_percent=request.discount_percent,
         expiration_date=request.expiration_date,
-        is_active=request.is_active if request.is_active is not None else True
+        is_active=request.is_active if request.is_active is not None else True,
+        max_uses=request.max_uses,
+        max_uses_per_customer=request.max_uses_per_customer
     )
 
     try:
         db.add(new_item)
+        if new_item.max_uses is not None:
+            db.flush()
+            promo_redemptions.set_limit(db, new_item.id, new_item.max_uses)
+        version = cache_versions.bump(db, VERSION_NAME)
         db.commit()
         db.refresh(new_item)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
+    promo_filter.added([new_item.code], version)
     return new_item
 
 
@@ -49,6 +60,8 @@ def read_one(db: Session, item_id):
 
 def read_by_code(db: Session, code: str):
     """Get promotional code by code string"""
+    if not promo_filter.might_exist(db, code):
+        return None
     try:
         item = db.query(model.PromotionalCode).filter(model.PromotionalCode.code == code).first()
         if not item:
@@ -71,10 +84,16 @@ def update(db: Session, item_id, request):
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         update_data = request.dict(exclude_unset=True)
         item.update(update_data, synchronize_session=False)
+        if 'max_uses' in update_data:
+            promo_redemptions.set_limit(db, item_id, update_data['max_uses'])
+        version = cache_versions.bump(db, VERSION_NAME) if 'code' in update_data else None
+        invalidate_on_commit(db, VERSION_NAME)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    if version is not None:
+        promo_filter.added([update_data['code']], version)
     return item.first()
 
 
@@ -83,9 +102,18 @@ def delete(db: Session, item_id):
         item = db.query(model.PromotionalCode).filter(model.PromotionalCode.id == item_id)
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        promo_redemptions.set_limit(db, item_id, None)
         item.delete(synchronize_session=False)
+        # A Bloom filter can't forget a code; bumping makes other workers rebuild without it
+        version = cache_versions.bump(db, VERSION_NAME)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    promo_filter.added([], version)
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def read_usage(db: Session, item_id):
+    item = read_one(db, item_id)
+    return promo_redemptions.usage(db, item)
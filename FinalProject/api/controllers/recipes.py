@@ -1,6 +1,9 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status, Response
 from ..models import recipes as model
+from . import availability
+from . import cache_versions
+from .menu import menu_cache, RECIPES_VERSION
 from sqlalchemy.exc import SQLAlchemyError
 
 
@@ -13,18 +16,22 @@ def create(db: Session, request):
 
     try:
         db.add(new_item)
+        db.flush()
+        availability.refresh(db, sandwich_ids=[new_item.sandwich_id])
+        cache_versions.bump(db, RECIPES_VERSION)
         db.commit()
         db.refresh(new_item)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
+    menu_cache.invalidate()
     return new_item
 
 
 def read_all(db: Session, sandwich_id: int = None, resource_id: int = None):
     try:
-        query = db.query(model.Recipe)
+        query = db.query(model.Recipe).options(selectinload(model.Recipe.sandwich), selectinload(model.Recipe.resource))
         if sandwich_id:
             query = query.filter(model.Recipe.sandwich_id == sandwich_id)
         if resource_id:
@@ -50,25 +57,35 @@ def read_one(db: Session, item_id):
 def update(db: Session, item_id, request):
     try:
         item = db.query(model.Recipe).filter(model.Recipe.id == item_id)
-        if not item.first():
+        current = item.first()
+        if not current:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        old_sandwich_id = current.sandwich_id
         update_data = request.dict(exclude_unset=True)
         item.update(update_data, synchronize_session=False)
+        availability.refresh(db, sandwich_ids=[old_sandwich_id, update_data.get('sandwich_id', old_sandwich_id)])
+        cache_versions.bump(db, RECIPES_VERSION)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    menu_cache.invalidate()
     return item.first()
 
 
 def delete(db: Session, item_id):
     try:
         item = db.query(model.Recipe).filter(model.Recipe.id == item_id)
-        if not item.first():
+        current = item.first()
+        if not current:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        sandwich_id = current.sandwich_id
         item.delete(synchronize_session=False)
+        availability.refresh(db, sandwich_ids=[sandwich_id])
+        cache_versions.bump(db, RECIPES_VERSION)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    menu_cache.invalidate()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
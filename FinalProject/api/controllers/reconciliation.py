@@ -0,0 +1,136 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import and_, insert
+from fastapi import HTTPException, status
+from ..models import reconciliation as model
+from ..models import orders as order_model
+from ..models import payments as payment_model
+from ..dependencies.config import conf
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+
+
+def _check_chunk(db: Session, low: int, high: int):
+    """Find every issue for orders with low < id <= high, two join queries in total.
+
+    payments.order_id is unique, so an order can never have two payments
+    and there is no duplicate check to run.
+    """
+    order = order_model.Order
+    payment = payment_model.Payment
+    in_range = and_(order.id > low, order.id <= high)
+
+    mismatches = db.query(order.id, payment.id, order.total_price, payment.amount).join(
+        payment, payment.order_id == order.id
+    ).filter(
+        in_range,
+        payment.amount != order.total_price
+    ).all()
+
+    completed = aliased(payment)
+    missing = db.query(order.id, order.total_price).outerjoin(
+        completed,
+        and_(completed.order_id == order.id, completed.payment_status == payment_model.PaymentStatus.COMPLETED)
+    ).filter(
+        in_range,
+        order.order_status == order_model.OrderStatus.COMPLETED,
+        completed.id.is_(None)
+    ).all()
+
+    issues = [
+        {"issue": "amount_mismatch", "order_id": order_id, "payment_id": payment_id,
+         "order_total": total, "payment_amount": amount}
+        for order_id, payment_id, total, amount in mismatches
+    ]
+    issues += [
+        {"issue": "missing_payment", "order_id": order_id, "order_total": total}
+        for order_id, total in missing
+    ]
+    return issues
+
+
+def run(db: Session, run_id: int = None, chunk_size: int = None, max_chunks: int = None):
+    """Check orders against payments in keyset chunks of chunk_size orders.
+
+    Progress is committed after every chunk, so passing the id of an
+    unfinished run continues right after its last checked order.
+    """
+    chunk_size = chunk_size or conf.reconciliation_chunk_size
+    try:
+        if run_id is not None:
+            item = db.query(model.ReconciliationRun).filter(model.ReconciliationRun.id == run_id).first()
+            if not item:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+            if item.finished_at is not None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Run already finished")
+        else:
+            item = model.ReconciliationRun(
+                started_at=datetime.now(), last_order_id=0, orders_checked=0,
+                amount_mismatches=0, missing_payments=0
+            )
+            db.add(item)
+            db.commit()
+
+        chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            # Keyset pagination: the chunk ends at the chunk_size-th order id after the checkpoint
+            ids = db.query(order_model.Order.id).filter(
+                order_model.Order.id > item.last_order_id
+            ).order_by(order_model.Order.id).limit(chunk_size).all()
+            if not ids:
+                item.finished_at = datetime.now()
+                db.commit()
+                break
+
+            high = ids[-1][0]
+            issues = _check_chunk(db, item.last_order_id, high)
+            if issues:
+                db.execute(insert(model.ReconciliationIssue), [dict(issue, run_id=item.id) for issue in issues])
+            item.orders_checked += len(ids)
+            item.amount_mismatches += sum(1 for issue in issues if issue["issue"] == "amount_mismatch")
+            item.missing_payments += sum(1 for issue in issues if issue["issue"] == "missing_payment")
+            item.last_order_id = high
+            db.commit()
+            chunks += 1
+        db.refresh(item)
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return item
+
+
+def read_latest_unfinished(db: Session):
+    try:
+        return db.query(model.ReconciliationRun).filter(
+            model.ReconciliationRun.finished_at.is_(None)
+        ).order_by(model.ReconciliationRun.id.desc()).first()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+
+def read_one(db: Session, item_id):
+    try:
+        item = db.query(model.ReconciliationRun).filter(model.ReconciliationRun.id == item_id).first()
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return item
+
+
+def read_issues(db: Session, run_id: int, issue: str = None, after_id: int = 0, limit: int = 100):
+    """Issues of a run in id order, page with after_id = last id seen"""
+    try:
+        query = db.query(model.ReconciliationIssue).filter(
+            model.ReconciliationIssue.run_id == run_id,
+            model.ReconciliationIssue.id > after_id
+        )
+        if issue:
+            query = query.filter(model.ReconciliationIssue.issue == issue)
+        result = query.order_by(model.ReconciliationIssue.id).limit(limit).all()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return result
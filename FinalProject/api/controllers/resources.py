@@ -1,29 +1,49 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import insert
 from fastapi import HTTPException, status, Response
 from ..models import resources as model
+from ..models import inventory as inventory_model
+from . import availability
+from . import inventory
+from . import cache_versions
+from .menu import menu_cache, RESOURCES_VERSION
+from .promo_filter import normalize
 from sqlalchemy.exc import SQLAlchemyError
 
 
+def _with_level(db: Session, item_id):
+    row = db.execute(inventory.level_query([item_id])).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+    return {"id": row.id, "item": row.item, "amount": int(row.level)}
+
+
 def create(db: Session, request):
+    # The starting amount goes through the ledger like every other change
     new_item = model.Resource(
         item=request.item,
-        amount=request.amount
+        amount=0
     )
 
     try:
         db.add(new_item)
+        db.flush()
+        inventory.record(db, [(new_item.id, request.amount)], inventory_model.MovementReason.ADJUSTMENT,
+                         note="initial stock")
         db.commit()
-        db.refresh(new_item)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
-    return new_item
+    return {"id": new_item.id, "item": request.item, "amount": request.amount}
 
 
 def read_all(db: Session):
     try:
-        result = db.query(model.Resource).all()
+        result = [
+            {"id": row.id, "item": row.item, "amount": int(row.level)}
+            for row in db.execute(inventory.level_query().order_by(model.Resource.id))
+        ]
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -32,9 +52,7 @@ def read_all(db: Session):
 
 def read_one(db: Session, item_id):
     try:
-        item = db.query(model.Resource).filter(model.Resource.id == item_id).first()
-        if not item:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        item = _with_level(db, item_id)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -47,12 +65,24 @@ def update(db: Session, item_id, request):
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         update_data = request.dict(exclude_unset=True)
-        item.update(update_data, synchronize_session=False)
+        # Setting an amount records the difference to the current level as an adjustment
+        if update_data.get('amount') is not None:
+            level = inventory.levels(db, [item_id], lock=True)[item_id]
+            inventory.record(db, [(item_id, update_data['amount'] - level)],
+                             inventory_model.MovementReason.ADJUSTMENT, note="set by PUT /resources")
+        update_data.pop('amount', None)
+        if update_data:
+            item.update(update_data, synchronize_session=False)
+            # A renamed ingredient shows up in the menu document
+            cache_versions.bump(db, RESOURCES_VERSION)
+        availability.refresh(db, resource_ids=[item_id])
         db.commit()
+        result = _with_level(db, item_id)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
-    return item.first()
+    menu_cache.invalidate()
+    return result
 
 
 def delete(db: Session, item_id):
@@ -60,9 +90,110 @@ def delete(db: Session, item_id):
         item = db.query(model.Resource).filter(model.Resource.id == item_id)
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        # The ledger is an audit trail, so a resource that ever had stock stays
+        if db.query(inventory_model.InventoryMovement.id).filter(
+            inventory_model.InventoryMovement.resource_id == item_id
+        ).first():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Resource has inventory history and cannot be deleted, set its amount to 0 instead"
+            )
         item.delete(synchronize_session=False)
+        # Recipes still point at the deleted id, so their sandwiches drop to zero
+        availability.refresh(db, resource_ids=[item_id])
+        cache_versions.bump(db, RESOURCES_VERSION)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    menu_cache.invalidate()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def _item_key(item: str):
+    # Names are matched by MySQL's collation, which also ignores accents
+    return normalize(item.strip())
+
+
+def restock(db: Session, request):
+    """Apply a delivery manifest in one transaction.
+
+    Known names are resolved with one IN query, unknown names are inserted
+    together, and every delta is appended to the inventory ledger with a
+    single INSERT. If any delta is negative the levels are read with a
+    locking read, so it can't take a level below zero.
+    """
+    by_id = {}
+    by_name = {}
+    for line in request.items:
+        if line.id is not None:
+            by_id[line.id] = by_id.get(line.id, 0) + line.delta
+        elif line.item and line.item.strip():
+            key = _item_key(line.item)
+            name, delta = by_name.get(key, (line.item.strip(), 0))
+            by_name[key] = (name, delta + line.delta)
+        else:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Every line needs an id or an item")
+
+    try:
+        created = {}
+        if by_name:
+            names = [name for name, _ in by_name.values()]
+            known = db.query(model.Resource.id, model.Resource.item).filter(model.Resource.item.in_(names)).all()
+            for resource_id, item in known:
+                # None when two rows match the same line, its delta already went to the first
+                line = by_name.pop(_item_key(item), None)
+                if line is not None:
+                    by_id[resource_id] = by_id.get(resource_id, 0) + line[1]
+            negative = [name for name, delta in by_name.values() if delta < 0]
+            if negative:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Cannot remove stock of unknown items: {', '.join(negative)}")
+            if by_name:
+                db.execute(insert(model.Resource), [
+                    {"item": name, "amount": 0} for name, _ in by_name.values()
+                ])
+                deltas = {_item_key(name): delta for name, delta in by_name.values()}
+                created = {
+                    resource_id: (item, deltas[_item_key(item)]) for resource_id, item in db.query(
+                        model.Resource.id, model.Resource.item
+                    ).filter(model.Resource.item.in_([name for name, _ in by_name.values()]))
+                }
+
+        current = {}
+        if by_id:
+            query = inventory.level_query(by_id)
+            if any(delta < 0 for delta in by_id.values()):
+                query = query.with_for_update()
+            current = {row.id: (row.item, int(row.level)) for row in db.execute(query)}
+            missing = sorted(set(by_id) - set(current))
+            if missing:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"Resource ids not found: {', '.join(map(str, missing))}")
+            short = [item for resource_id, (item, amount) in current.items() if amount + by_id[resource_id] < 0]
+            if short:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail=f"Not enough stock to remove: {', '.join(short)}")
+        inventory.record(
+            db, list(by_id.items()) + [(resource_id, delta) for resource_id, (_, delta) in created.items()],
+            inventory_model.MovementReason.RESTOCK
+        )
+        availability.refresh(db, resource_ids=list(by_id) + list(created))
+        db.commit()
+    except HTTPException:
+        db.rollback()
+        raise
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+    levels = [
+        {"id": resource_id, "item": item, "amount": amount + by_id[resource_id], "delta": by_id[resource_id]}
+        for resource_id, (item, amount) in current.items()
+    ]
+    levels += [
+        {"id": resource_id, "item": item, "amount": amount, "delta": amount, "created": True}
+        for resource_id, (item, amount) in created.items()
+    ]
+    return sorted(levels, key=lambda level: level["id"])
@@ -0,0 +1,370 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from fastapi import HTTPException, status
+from ..models import reviews as model
+from ..models import orders as order_model
+from ..models import sandwiches as sandwich_model
+from ..dependencies.config import conf
+from ..dependencies.jobs import PeriodicJob
+from . import review_search
+from . import review_ratings
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+def _try_lock(path: str):
+    """Open path and take an exclusive lock on it without waiting; the open file, or None if someone holds it.
+
+    The operating system drops the lock when its process dies, however it dies.
+    """
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+def write_batch(db: Session, entries):
+    """Insert buffered reviews with one multi-row INSERT and commit, return counts.
+
+    Reviews whose ingest_key is already stored (a replayed spool) are skipped,
+    and so are reviews whose order or sandwich was deleted since they were
+    accepted. The search index and the rating counts are updated once for the
+    whole batch.
+    """
+    review = model.Review
+    keys = [entry["ingest_key"] for entry in entries]
+    stored = {row[0] for row in db.query(review.ingest_key).filter(review.ingest_key.in_(keys))}
+    orders = {row[0] for row in db.query(order_model.Order.id).filter(
+        order_model.Order.id.in_({entry["order_id"] for entry in entries})
+    )}
+    sandwiches = {row[0] for row in db.query(sandwich_model.Sandwich.id).filter(
+        sandwich_model.Sandwich.id.in_({entry["sandwich_id"] for entry in entries})
+    )}
+
+    rows = []
+    rejected = 0
+    for entry in entries:
+        if entry["ingest_key"] in stored:
+            continue
+        if entry["order_id"] not in orders or entry["sandwich_id"] not in sandwiches:
+            rejected += 1
+            continue
+        stored.add(entry["ingest_key"])
+        rows.append(dict(entry, created_at=datetime.fromisoformat(entry["created_at"])))
+
+    if rows:
+        db.execute(insert(review), rows)
+        ids = dict(db.query(review.ingest_key, review.id).filter(
+            review.ingest_key.in_([row["ingest_key"] for row in rows])
+        ))
+        review_search.add(db, [
+            (ids[row["ingest_key"]], row["sandwich_id"], row["rating"], row["review_text"]) for row in rows
+        ])
+        deltas = {}
+        for row in rows:
+            review_ratings.count(deltas, row["sandwich_id"], row["rating"])
+        review_ratings.apply(db, deltas)
+    db.commit()
+    if rejected:
+        logger.warning(f"Dropped {rejected} ingested reviews whose order or sandwich no longer exists")
+    return {"inserted": len(rows), "duplicates": len(entries) - len(rows) - rejected, "rejected": rejected}
+
+
+class ReviewIngestor(PeriodicJob):
+    """Write-behind buffer behind POST /reviews/ingest.
+
+    submit() validates a review, makes it as durable as
+    conf.review_ingest_durability asks and returns; the background thread
+    writes the buffer every interval_seconds, or right away once
+    conf.review_ingest_batch_size reviews are waiting. With a spool, each
+    flush renames the spool file aside and deletes it only after its reviews
+    are committed, so a crash at any point leaves them on disk for recover().
+
+    spool_path is a prefix: every worker process spools to <spool_path>.<pid>
+    and holds <spool_path>.<pid>.lock locked while it lives, so workers
+    sharing a prefix never touch each other's files, and recover() only
+    claims the files of workers whose lock is free because they are gone.
+    """
+
+    name = "review-ingest"
+
+    def __init__(self, interval_seconds: float = None, spool_path: str = None):
+        super().__init__(conf.review_ingest_flush_seconds if interval_seconds is None else interval_seconds)
+        self.spool_path = spool_path or conf.review_ingest_spool_path
+        self._buffer = []
+        self._buffer_lock = threading.Lock()  # guards the buffer and the open spool file
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+        self._spool = None
+        self._owner_pid = None
+        self._owner_lock = None
+        self._spooled_files = []  # renamed spools whose reviews are not all committed yet
+        self._recovered = False
+        self.accepted = 0
+
+    def submit(self, db: Session, request):
+        if not db.query(order_model.Order.id).filter(order_model.Order.id == request.order_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        if not db.query(sandwich_model.Sandwich.id).filter(sandwich_model.Sandwich.id == request.sandwich_id).first():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Sandwich not found")
+
+        entry = {
+            "ingest_key": uuid.uuid4().hex,
+            "order_id": request.order_id,
+            "sandwich_id": request.sandwich_id,
+            "rating": request.rating,
+            "review_text": request.review_text,
+            "created_at": datetime.now().isoformat(),
+        }
+        durability = conf.review_ingest_durability
+        with self._buffer_lock:
+            if len(self._buffer) >= conf.review_ingest_max_buffered:
+                raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                    detail="Too many reviews waiting to be written, try again shortly")
+            if durability != "memory":
+                self._append(entry, fsync=durability == "fsync")
+            self._buffer.append(entry)
+            self.accepted += 1
+            buffered = len(self._buffer)
+        if buffered >= conf.review_ingest_batch_size:
+            self._wake.set()
+        return {"ingest_key": entry["ingest_key"], "durability": durability, "buffered": buffered}
+
+    def _own_spool(self):
+        """Path of this process's spool, taking its lock first, caller holds _buffer_lock"""
+        pid = os.getpid()
+        while self._owner_pid != pid:
+            # After a fork the spool and the lock still belong to the parent
+            self._spool = None
+            path = f"{self.spool_path}.{pid}.lock"
+            handle = _try_lock(path)
+            if handle is None:
+                raise RuntimeError(f"Review spool {path} is locked by another process")
+            try:
+                # recover() in another worker may have removed the file between open and lock
+                if os.path.samestat(os.fstat(handle.fileno()), os.stat(path)):
+                    self._owner_pid, self._owner_lock = pid, handle
+                    continue
+            except FileNotFoundError:
+                pass
+            handle.close()
+        return f"{self.spool_path}.{pid}"
+
+    def _append(self, entry, fsync: bool):
+        if self._spool is None:
+            self._spool = open(self._own_spool(), "a", encoding="utf-8")
+        self._spool.write(json.dumps(entry) + "\n")
+        self._spool.flush()
+        if fsync:
+            os.fsync(self._spool.fileno())
+
+    def _rotate(self):
+        """Move the current spool aside so new reviews start a fresh file, caller holds _buffer_lock"""
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+        path = self._own_spool()
+        if not os.path.exists(path):
+            return []
+        flushing = f"{path}.{time.time_ns()}.flushing"
+        os.replace(path, flushing)
+        return [flushing]
+
+    def _claim_orphans(self):
+        """Move the spools of exited workers into this one's name, return the renamed files.
+
+        Files of a worker whose lock file is still locked are left alone;
+        files from before spools were per process have no owner at all.
+        """
+        prefix = glob.escape(self.spool_path)
+        owners = {}
+        for path in glob.glob(f"{prefix}.*.lock"):
+            pid = path[len(self.spool_path) + 1:-len(".lock")]
+            if pid.isdigit() and int(pid) != os.getpid():
+                owners[pid] = path
+        candidates = []
+        for pid, lock_path in owners.items():
+            handle = _try_lock(lock_path)
+            if handle is None:
+                continue  # Still running
+            candidates += glob.glob(f"{prefix}.{pid}") + glob.glob(f"{prefix}.{pid}.*.flushing")
+            handle.close()
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        candidates += glob.glob(prefix) + [
+            path for path in glob.glob(f"{prefix}.*.flushing")
+            if path[len(self.spool_path) + 1:].count(".") == 1  # <spool_path>.<time>.flushing
+        ]
+
+        own = self._own_spool()
+        claimed = []
+        for path in sorted(candidates):
+            target = f"{own}.{time.time_ns()}.flushing"
+            try:
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue  # Another worker claimed it first
+            claimed.append(target)
+        return claimed
+
+    def _put_back(self, entries, files):
+        """Return unwritten reviews and their spool files after a failed flush, caller holds _buffer_lock.
+
+        They go in front of anything that arrived meanwhile; replaying a part
+        that was already committed is harmless.
+        """
+        self._buffer[:0] = entries
+        self._spooled_files = files + self._spooled_files
+
+    def work(self, db: Session):
+        with self._flush_lock:
+            with self._buffer_lock:
+                entries, self._buffer = self._buffer, []
+                files, self._spooled_files = self._spooled_files, []
+                try:
+                    new_files = self._rotate()
+                    if files and new_files:
+                        # Still retrying an earlier flush: fold the new file into its spool
+                        # instead of leaving one more file behind every failed interval
+                        with open(new_files[0], encoding="utf-8") as new, \
+                                open(files[-1], "a", encoding="utf-8") as pending:
+                            pending.write(new.read())
+                        os.remove(new_files[0])
+                        new_files = []
+                except Exception:
+                    self._put_back(entries, files + [path for path in new_files if os.path.exists(path)])
+                    raise
+                files = files + new_files
+
+            totals = {"inserted": 0, "duplicates": 0, "rejected": 0}
+            batch_size = conf.review_ingest_batch_size
+            for start in range(0, len(entries), batch_size):
+                try:
+                    result = write_batch(db, entries[start:start + batch_size])
+                except Exception:
+                    db.rollback()
+                    with self._buffer_lock:
+                        self._put_back(entries[start:], files)
+                    raise
+                for key, value in result.items():
+                    totals[key] += value
+
+            kept = []
+            for path in files:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not remove spool file {path}, will retry: {e}")
+                    kept.append(path)
+            if kept:
+                with self._buffer_lock:
+                    self._spooled_files = kept + self._spooled_files
+            return totals
+
+    def recover(self):
+        """Buffer the reviews of spool files left by exited processes, return how many"""
+        with self._buffer_lock:
+            own = glob.escape(self._own_spool())
+            # This pid's files are from an earlier process that had the same pid
+            files = sorted(glob.glob(f"{own}.*.flushing")) + self._claim_orphans() + self._rotate()
+            files = [path for path in files if path not in self._spooled_files]
+            recovered = []
+            for path in files:
+                with open(path, encoding="utf-8") as spool:
+                    for line in spool:
+                        try:
+                            recovered.append(json.loads(line))
+                        except ValueError:
+                            pass  # Torn last line of a write the crash interrupted, never acknowledged
+            self._buffer[:0] = recovered
+            self._spooled_files = files + self._spooled_files
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} spooled reviews")
+        return len(recovered)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+            if not self._buffer:
+                continue
+            try:
+                self.run_once()
+            except Exception:
+                pass  # Already recorded and logged, the reviews are back in the buffer
+
+    def start(self):
+        if not self._recovered:
+            self._recovered = True
+            self.recover()
+        super().start()
+
+    def stop(self):
+        super().stop()
+        self._wake.set()
+
+    def drain(self):
+        """Stop the background thread and write whatever is still buffered, for shutdown"""
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        if not self._buffer:
+            return
+        try:
+            self.run_once()
+        except Exception:
+            lost = "are still in the spool" if self._spooled_files else "are lost"
+            logger.error(f"Could not write {len(self._buffer)} buffered reviews at shutdown, they {lost}")
+
+    def metrics(self):
+        metrics = super().metrics()
+        with self._buffer_lock:
+            metrics["buffered"] = len(self._buffer)
+        metrics["accepted"] = self.accepted
+        metrics["durability"] = conf.review_ingest_durability
+        return metrics
+
+
+ingestor = ReviewIngestor()
+
+
+def submit(db: Session, request):
+    try:
+        return ingestor.submit(db, request)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+
+def flush_now(db: Session):
+    try:
+        ingestor.run_once(db)
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return ingestor.metrics()
@@ -0,0 +1,104 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, delete, func, insert, tuple_
+from fastapi import HTTPException, status
+from ..models import reviews as model
+from ..dependencies.response_cache import invalidate_on_commit
+from .menu import RATINGS_VERSION
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from datetime import datetime
+
+
+def count(deltas: dict, sandwich_id: int, rating: int, change: int = 1):
+    """Add change to the (sandwich_id, rating) entry of a deltas dict for apply()"""
+    key = (sandwich_id, rating)
+    deltas[key] = deltas.get(key, 0) + change
+    return deltas
+
+
+def apply(db: Session, deltas: dict):
+    """Apply (sandwich_id, rating) -> change to review_rating_counts, inside the caller's transaction.
+
+    One UPDATE ... CASE for the pairs that already have a row and one INSERT
+    for the rest, however many reviews the deltas came from. The rows get a
+    new updated_at, which is how GET /menu notices the new averages; no row
+    shared by every sandwich is written.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    now = datetime.now()
+    stat = model.ReviewRatingCount
+    pair = tuple_(stat.sandwich_id, stat.rating)
+    existing = {tuple(row) for row in db.query(stat.sandwich_id, stat.rating).filter(pair.in_(list(deltas)))}
+    new_pairs = [key for key in deltas if key not in existing]
+    if new_pairs:
+        try:
+            with db.begin_nested():
+                db.execute(insert(stat), [
+                    {"sandwich_id": sandwich_id, "rating": rating, "review_count": deltas[(sandwich_id, rating)],
+                     "updated_at": now}
+                    for sandwich_id, rating in new_pairs
+                ])
+        except IntegrityError:
+            # Another writer added one of them first, fall through to the UPDATE
+            existing.update(new_pairs)
+    if existing:
+        ordered = sorted(existing)  # Same lock order in every transaction
+        db.query(stat).filter(pair.in_(ordered)).update(
+            {stat.review_count: stat.review_count + case(
+                *[(and_(stat.sandwich_id == sandwich_id, stat.rating == rating), deltas[(sandwich_id, rating)])
+                  for sandwich_id, rating in ordered],
+                else_=0
+            ), stat.updated_at: now},
+            synchronize_session=False
+        )
+    invalidate_on_commit(db, RATINGS_VERSION)
+
+
+def summary(db: Session, sandwich_id: int = None):
+    """Review count, average and histogram of every rated sandwich (or just one)"""
+    stat = model.ReviewRatingCount
+    try:
+        query = db.query(stat.sandwich_id, stat.rating, stat.review_count).filter(stat.review_count > 0)
+        if sandwich_id is not None:
+            query = query.filter(stat.sandwich_id == sandwich_id)
+        rows = query.order_by(stat.sandwich_id, stat.rating).all()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+
+    summaries = {}
+    for row_sandwich_id, rating, review_count in rows:
+        entry = summaries.setdefault(row_sandwich_id, {
+            "sandwich_id": row_sandwich_id, "review_count": 0, "average_rating": None,
+            "histogram": {value: 0 for value in range(1, 6)}, "_sum": 0
+        })
+        entry["histogram"][rating] = review_count
+        entry["review_count"] += review_count
+        entry["_sum"] += rating * review_count
+    for entry in summaries.values():
+        entry["average_rating"] = round(entry.pop("_sum") / entry["review_count"], 2)
+    return list(summaries.values())
+
+
+def rebuild(db: Session):
+    """Recount every sandwich's ratings from the reviews table (run once on existing data)"""
+    review = model.Review
+    try:
+        db.execute(delete(model.ReviewRatingCount))
+        rows = db.query(review.sandwich_id, review.rating, func.count(review.id)).group_by(
+            review.sandwich_id, review.rating
+        ).all()
+        if rows:
+            now = datetime.now()
+            db.execute(insert(model.ReviewRatingCount), [
+                {"sandwich_id": sandwich_id, "rating": rating, "review_count": review_count, "updated_at": now}
+                for sandwich_id, rating, review_count in rows
+            ])
+        invalidate_on_commit(db, RATINGS_VERSION)
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {"sandwiches": len({row[0] for row in rows}), "reviews": sum(row[2] for row in rows)}
@@ -0,0 +1,222 @@
+from sqlalchemy.orm import Session, aliased, selectinload
+from sqlalchemy import func, case, insert, delete
+from fastapi import HTTPException, status
+from ..models import review_terms as model
+from ..models import reviews as review_model
+from ..dependencies.config import conf
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+import math
+import re
+import unicodedata
+
+# Stats row holding the number of indexed reviews; real terms never contain '#'
+DOCS_TERM = "#reviews"
+MAX_TERM_LENGTH = 64
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from had has have i in is it its my of on or so that the this "
+    "to too was were with very just me we our you your they them not no".split()
+)
+_WORD = re.compile(r"[a-z0-9]+")
+_SUFFIXES = ("ness", "ing", "ed", "ly", "s")
+# BM25 parameters; reviews are short, so a fixed average length is close enough
+K1 = 1.2
+B = 0.75
+AVERAGE_LENGTH = 20
+
+
+def stem(word: str):
+    """Strip one common English suffix so "soggy", "sogginess" and "soggier" meet"""
+    if word.endswith("ier") and len(word) > 5:
+        return word[:-3] + "y"
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            # "sogginess" -> "soggi" -> "soggy"
+            return word[:-1] + "y" if word.endswith("i") else word
+    return word
+
+
+def tokens(text: str):
+    """Lowercase, accent-free, stemmed words of text without stopwords, in order"""
+    if not text:
+        return []
+    folded = "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+    return [stem(word)[:MAX_TERM_LENGTH] for word in _WORD.findall(folded) if word not in STOPWORDS and len(word) > 1]
+
+
+def _postings(review_id, sandwich_id, rating, text):
+    words = tokens(text)
+    counts = {}
+    for word in words:
+        counts[word] = counts.get(word, 0) + 1
+    norm = K1 * (1 - B + B * len(words) / AVERAGE_LENGTH)
+    return [
+        {"term": term, "review_id": review_id, "sandwich_id": sandwich_id, "rating": rating,
+         "weight": tf * (K1 + 1) / (tf + norm)}
+        for term, tf in counts.items()
+    ]
+
+
+def _add_counts(db: Session, deltas: dict):
+    """Apply term -> change to review_term_stats: one UPDATE ... CASE, one INSERT for new terms"""
+    deltas = {term: delta for term, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    stat = model.ReviewTermStat
+    existing = {row[0] for row in db.query(stat.term).filter(stat.term.in_(deltas))}
+    new_terms = [term for term in deltas if term not in existing]
+    if new_terms:
+        try:
+            with db.begin_nested():
+                db.execute(insert(stat), [{"term": term, "doc_count": deltas[term]} for term in new_terms])
+        except IntegrityError:
+            # Another review added one of them first, fall through to the UPDATE
+            existing.update(new_terms)
+    if existing:
+        ordered = sorted(existing)  # Same lock order in every transaction
+        db.query(stat).filter(stat.term.in_(ordered)).update(
+            {stat.doc_count: stat.doc_count + case({term: deltas[term] for term in ordered}, value=stat.term)},
+            synchronize_session=False
+        )
+
+
+def add(db: Session, reviews):
+    """Index reviews given as (id, sandwich_id, rating, review_text), inside the caller's transaction"""
+    rows = []
+    for review in reviews:
+        rows.extend(_postings(*review))
+    if not rows:
+        return 0
+    deltas = {}
+    for row in rows:
+        deltas[row["term"]] = deltas.get(row["term"], 0) + 1
+    deltas[DOCS_TERM] = len({row["review_id"] for row in rows})
+    db.execute(insert(model.ReviewTerm), rows)
+    _add_counts(db, deltas)
+    return len(rows)
+
+
+def remove(db: Session, review_ids):
+    """Drop reviews from the index, inside the caller's transaction"""
+    if not review_ids:
+        return 0
+    term = model.ReviewTerm
+    counts = dict(db.query(term.term, func.count(term.review_id)).filter(
+        term.review_id.in_(review_ids)
+    ).group_by(term.term))
+    if not counts:
+        return 0
+    indexed = db.query(func.count(func.distinct(term.review_id))).filter(term.review_id.in_(review_ids)).scalar()
+    db.execute(delete(term).where(term.review_id.in_(review_ids)))
+    deltas = {name: -count for name, count in counts.items()}
+    deltas[DOCS_TERM] = -indexed
+    _add_counts(db, deltas)
+    return sum(counts.values())
+
+
+def search(db: Session, q: str, sandwich_id: int = None, min_rating: int = None, max_rating: int = None,
+           limit: int = 20):
+    """Reviews containing every word of q, best BM25 score first.
+
+    The join starts from the rarest word's postings and looks the other
+    words up by primary key, so the cost follows the rarest word, not the
+    number of reviews.
+    """
+    terms = list(dict.fromkeys(tokens(q)))
+    if not terms:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Query has no searchable words")
+    try:
+        stats = dict(db.query(model.ReviewTermStat.term, model.ReviewTermStat.doc_count).filter(
+            model.ReviewTermStat.term.in_(terms + [DOCS_TERM])
+        ))
+        total = stats.get(DOCS_TERM, 0)
+        if any(stats.get(term, 0) <= 0 for term in terms):
+            return {"query": q, "terms": terms, "results": []}
+
+        terms.sort(key=lambda term: stats[term])
+        idf = {term: math.log(1 + (total - stats[term] + 0.5) / (stats[term] + 0.5)) for term in terms}
+        postings = [aliased(model.ReviewTerm) for _ in terms]
+        driver = postings[0]
+        score = sum(posting.weight * idf[term] for posting, term in zip(postings, terms))
+        query = db.query(driver.review_id, score.label("score")).filter(driver.term == terms[0])
+        for posting, term in zip(postings[1:], terms[1:]):
+            query = query.join(posting, (posting.review_id == driver.review_id) & (posting.term == term))
+        if sandwich_id is not None:
+            query = query.filter(driver.sandwich_id == sandwich_id)
+        if min_rating is not None:
+            query = query.filter(driver.rating >= min_rating)
+        if max_rating is not None:
+            query = query.filter(driver.rating <= max_rating)
+        hits = query.order_by(score.desc(), driver.review_id.desc()).limit(limit).all()
+
+        reviews = {
+            review.id: review for review in db.query(review_model.Review).options(
+                selectinload(review_model.Review.sandwich)
+            ).filter(review_model.Review.id.in_([review_id for review_id, _ in hits]))
+        } if hits else {}
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {
+        "query": q,
+        "terms": terms,
+        "results": [
+            {"score": round(score, 4), "review": reviews[review_id]}
+            for review_id, score in hits if review_id in reviews
+        ],
+    }
+
+
+def _add_unindexed(db: Session, reviews):
+    """add() the reviews that have no postings yet, e.g. ones a live write indexed during reindex()"""
+    term = model.ReviewTerm
+    review = review_model.Review
+    conflict = None
+    while True:
+        ids = [row[0] for row in reviews]
+        indexed = {row[0] for row in db.query(term.review_id).filter(term.review_id.in_(ids)).distinct()}
+        # After a conflict, also drop reviews deleted since the batch was read
+        live = {row[0] for row in db.query(review.id).filter(review.id.in_(ids))} if conflict else set(ids)
+        remaining = [row for row in reviews if row[0] in live and row[0] not in indexed]
+        if conflict and len(remaining) == len(reviews):
+            raise conflict  # Not caused by a live write
+        reviews = remaining
+        if not reviews:
+            return 0
+        try:
+            with db.begin_nested():
+                return add(db, reviews)
+        except IntegrityError as e:
+            # A live write indexed or deleted one of them after the check, look again
+            conflict = e
+
+
+def reindex(db: Session, batch_size: int = None):
+    """Rebuild the whole index from the reviews table, batch_size reviews per transaction.
+
+    Reviews created or edited meanwhile index themselves; a batch skips the
+    ones that already have postings.
+    """
+    batch_size = batch_size or conf.review_search_batch_size
+    review = review_model.Review
+    try:
+        db.execute(delete(model.ReviewTerm))
+        db.execute(delete(model.ReviewTermStat))
+        db.commit()
+        indexed = 0
+        after_id = 0
+        while True:
+            rows = db.query(review.id, review.sandwich_id, review.rating, review.review_text).filter(
+                review.id > after_id
+            ).order_by(review.id).limit(batch_size).all()
+            if not rows:
+                break
+            _add_unindexed(db, [tuple(row) for row in rows])
+            db.commit()
+            indexed += len(rows)
+            after_id = rows[-1][0]
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return {"reviews": indexed}
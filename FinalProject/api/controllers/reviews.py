@@ -1,8 +1,13 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from fastapi import HTTPException, status, Response
 from ..models import reviews as model
+from . import review_search
+from . import review_ratings
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_
+from datetime import datetime
+import base64
+import json
 
 
 def create(db: Session, request):
@@ -10,11 +15,16 @@ def create(db: Session, request):
         order_id=request.order_id,
         sandwich_id=request.sandwich_id,
         rating=request.rating,
-        review_text=request.review_text
+        review_text=request.review_text,
+        # The column default is fixed when the module loads, page order needs the real time
+        created_at=datetime.now()
     )
 
     try:
         db.add(new_item)
+        db.flush()
+        review_search.add(db, [(new_item.id, new_item.sandwich_id, new_item.rating, new_item.review_text)])
+        review_ratings.apply(db, review_ratings.count({}, new_item.sandwich_id, new_item.rating))
         db.commit()
         db.refresh(new_item)
     except SQLAlchemyError as e:
@@ -24,18 +34,80 @@ def create(db: Session, request):
     return new_item
 
 
-def read_all(db: Session, sandwich_id: int = None, order_id: int = None):
+SORTS = {
+    # sort name: (columns of the keyset, descending)
+    "newest": (("created_at", "id"), True),
+    "oldest": (("created_at", "id"), False),
+    "rating_high": (("rating", "created_at", "id"), True),
+    "rating_low": (("rating", "created_at", "id"), False),
+}
+
+
+def encode_cursor(sort: str, review):
+    keys, _ = SORTS[sort]
+    values = [getattr(review, key) for key in keys]
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps([sort] + values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort: str, cursor: str):
+    """Key values of the last review of the previous page, 400 if the cursor isn't one of ours"""
     try:
-        query = db.query(model.Review)
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        keys, _ = SORTS[sort]
+        if values[0] != sort or len(values) != len(keys) + 1:
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if key == "created_at" else int(value)
+            for key, value in zip(keys, values[1:])
+        ]
+    except (ValueError, TypeError, IndexError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def _after(columns, values, descending: bool):
+    """Rows that come after values in (columns) order, as nested comparisons an index range can use"""
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(column == value, _after(columns[1:], values[1:], descending)))
+
+
+def read_page(db: Session, sandwich_id: int = None, order_id: int = None, min_rating: int = None,
+              max_rating: int = None, sort: str = "newest", limit: int = 50, cursor: str = None):
+    """One page of reviews and the cursor of the next page (None on the last page).
+
+    Pages are keyset pages: the cursor holds the sort key of the last review
+    returned and the next page starts right after it, so page 1000 costs the
+    same index range scan as page 1. With a sandwich_id filter the scan runs on
+    ix_reviews_sandwich_created or ix_reviews_sandwich_rating.
+    """
+    if sort not in SORTS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown sort, use one of: {', '.join(SORTS)}")
+    keys, descending = SORTS[sort]
+    columns = [getattr(model.Review, key) for key in keys]
+    try:
+        query = db.query(model.Review).options(selectinload(model.Review.sandwich))
         if sandwich_id:
             query = query.filter(model.Review.sandwich_id == sandwich_id)
         if order_id:
             query = query.filter(model.Review.order_id == order_id)
-        result = query.all()
+        if min_rating is not None:
+            query = query.filter(model.Review.rating >= min_rating)
+        if max_rating is not None:
+            query = query.filter(model.Review.rating <= max_rating)
+        if cursor:
+            query = query.filter(_after(columns, decode_cursor(sort, cursor), descending))
+        # One extra row tells whether there is a next page
+        rows = query.order_by(*[c.desc() if descending else c.asc() for c in columns]).limit(limit + 1).all()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
-    return result
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(sort, rows[limit - 1])
+    return rows, None
 
 
 def read_one(db: Session, item_id):
@@ -52,10 +124,20 @@ def read_one(db: Session, item_id):
 def update(db: Session, item_id, request):
     try:
         item = db.query(model.Review).filter(model.Review.id == item_id)
-        if not item.first():
+        current = item.first()
+        if not current:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         update_data = request.dict(exclude_unset=True)
         item.update(update_data, synchronize_session=False)
+        if 'review_text' in update_data or 'rating' in update_data:
+            review_search.remove(db, [item_id])
+            review_search.add(db, [(
+                item_id, current.sandwich_id,
+                update_data.get('rating', current.rating), update_data.get('review_text', current.review_text)
+            )])
+        if update_data.get('rating') is not None and update_data['rating'] != current.rating:
+            deltas = review_ratings.count({}, current.sandwich_id, current.rating, -1)
+            review_ratings.apply(db, review_ratings.count(deltas, current.sandwich_id, update_data['rating']))
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
@@ -66,8 +148,11 @@ def update(db: Session, item_id, request):
 def delete(db: Session, item_id):
     try:
         item = db.query(model.Review).filter(model.Review.id == item_id)
-        if not item.first():
+        current = item.first()
+        if not current:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+        review_search.remove(db, [item_id])
+        review_ratings.apply(db, review_ratings.count({}, current.sandwich_id, current.rating, -1))
         item.delete(synchronize_session=False)
         db.commit()
     except SQLAlchemyError as e:
@@ -76,22 +161,57 @@ def delete(db: Session, item_id):
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
+def search(db: Session, q: str, sandwich_id: int = None, min_rating: int = None, max_rating: int = None,
+           limit: int = 20):
+    return review_search.search(db, q, sandwich_id=sandwich_id, min_rating=min_rating,
+                                max_rating=max_rating, limit=limit)
+
+
 def get_complaints(db: Session, min_rating: int = 2):
     """Get sandwiches with low ratings (complaints)"""
     try:
         from ..models import sandwiches as sandwich_model
-        result = db.query(
-            sandwich_model.Sandwich,
-            func.avg(model.Review.rating).label('avg_rating'),
-            func.count(model.Review.id).label('review_count')
-        ).join(
-            model.Review, sandwich_model.Sandwich.id == model.Review.sandwich_id
-        ).group_by(
-            sandwich_model.Sandwich.id
-        ).having(
-            func.avg(model.Review.rating) <= min_rating
-        ).all()
-        return result
+        from . import archives as archive_controller
+        archived = archive_controller.sandwich_stats(db)
+        if not archived:
+            return db.query(
+                sandwich_model.Sandwich,
+                func.avg(model.Review.rating).label('avg_rating'),
+                func.count(model.Review.id).label('review_count')
+            ).join(
+                model.Review, sandwich_model.Sandwich.id == model.Review.sandwich_id
+            ).group_by(
+                sandwich_model.Sandwich.id
+            ).having(
+                func.avg(model.Review.rating) <= min_rating
+            ).all()
+
+        # Archived reviews only exist as per-sandwich sums, so combine them with the live sums here
+        totals = {
+            sandwich.id: [sandwich, int(rating_sum or 0), review_count]
+            for sandwich, rating_sum, review_count in db.query(
+                sandwich_model.Sandwich,
+                func.sum(model.Review.rating),
+                func.count(model.Review.id)
+            ).join(
+                model.Review, sandwich_model.Sandwich.id == model.Review.sandwich_id
+            ).group_by(
+                sandwich_model.Sandwich.id
+            ).all()
+        }
+        missing = [sandwich_id for sandwich_id, stat in archived.items() if stat.review_count and sandwich_id not in totals]
+        if missing:
+            for sandwich in db.query(sandwich_model.Sandwich).filter(sandwich_model.Sandwich.id.in_(missing)):
+                totals[sandwich.id] = [sandwich, 0, 0]
+        for sandwich_id, stat in archived.items():
+            if sandwich_id in totals:
+                totals[sandwich_id][1] += stat.rating_sum
+                totals[sandwich_id][2] += stat.review_count
+        return [
+            (sandwich, rating_sum / review_count, review_count)
+            for sandwich, rating_sum, review_count in totals.values()
+            if review_count and rating_sum / review_count <= min_rating
+        ]
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
@@ -1,26 +1,35 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status, Response
 from ..models import sandwiches as model
+from . import availability
+from . import cache_versions
+from .menu_search import menu_search, VERSION_NAME
+from .menu import menu_cache
 from sqlalchemy.exc import SQLAlchemyError
 
 
 def create(db: Session, request):
+    is_listed = request.is_available if request.is_available is not None else True
     new_item = model.Sandwich(
         sandwich_name=request.sandwich_name,
         price=request.price,
         category=request.category,
         description=request.description,
-        is_available=request.is_available if request.is_available is not None else True
+        is_listed=is_listed,
+        is_available=is_listed
     )
 
     try:
         db.add(new_item)
+        cache_versions.bump(db, VERSION_NAME)
         db.commit()
         db.refresh(new_item)
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
 
+    menu_search.invalidate()
+    menu_cache.invalidate()
     return new_item
 
 
@@ -55,11 +64,19 @@ def update(db: Session, item_id, request):
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         update_data = request.dict(exclude_unset=True)
-        item.update(update_data, synchronize_session=False)
+        # Clients switch the sandwich on or off; whether it is in stock decides the rest
+        if 'is_available' in update_data:
+            update_data['is_listed'] = update_data.pop('is_available')
+        if update_data:
+            item.update(update_data, synchronize_session=False)
+        availability.refresh(db, sandwich_ids=[item_id])
+        cache_versions.bump(db, VERSION_NAME)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    menu_search.invalidate()
+    menu_cache.invalidate()
     return item.first()
 
 
@@ -69,8 +86,15 @@ def delete(db: Session, item_id):
         if not item.first():
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
         item.delete(synchronize_session=False)
+        cache_versions.bump(db, VERSION_NAME)
         db.commit()
     except SQLAlchemyError as e:
         error = str(e.__dict__['orig'])
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    menu_search.invalidate()
+    menu_cache.invalidate()
     return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+def refresh_availability(db: Session):
+    return availability.refresh_all(db)
@@ -0,0 +1,97 @@
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from ..models import settlements as model
+from ..models import payments as payment_model
+from ..dependencies.config import conf
+from .payments import uses_gateway
+from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime, date
+from decimal import Decimal
+
+
+def default_methods():
+    """Methods settled at close: everything the payment gateway does not settle itself"""
+    return [method for method in payment_model.PaymentMethod if not uses_gateway(method)]
+
+
+def create(db: Session, request):
+    """Mark a day's pending payments completed and record the totals.
+
+    Payments are read and updated chunk_size at a time with one SELECT ...
+    FOR UPDATE and one UPDATE ... WHERE id IN (...) per chunk. Everything,
+    including the summary, is committed together, so a failed settlement
+    leaves no payment half settled.
+    """
+    try:
+        methods = [payment_model.PaymentMethod(m) for m in request.payment_methods] \
+            if request.payment_methods else default_methods()
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid enum value: {str(e)}")
+    business_date = request.business_date or date.today()
+    start = datetime.combine(business_date, datetime.min.time())
+    end = datetime.combine(business_date, datetime.max.time())
+    chunk_size = conf.settlement_chunk_size
+
+    payment = payment_model.Payment
+    totals = {}
+    try:
+        last_id = 0
+        while True:
+            rows = db.query(payment.id, payment.payment_method, payment.amount).filter(
+                payment.payment_status == payment_model.PaymentStatus.PENDING,
+                payment.payment_date >= start,
+                payment.payment_date <= end,
+                payment.payment_method.in_(methods),
+                payment.id > last_id
+            ).order_by(payment.id).limit(chunk_size).with_for_update().all()
+            if not rows:
+                break
+            db.query(payment).filter(payment.id.in_([row.id for row in rows])).update(
+                {payment.payment_status: payment_model.PaymentStatus.COMPLETED}, synchronize_session=False
+            )
+            for row in rows:
+                count, amount = totals.get(row.payment_method, (0, Decimal('0.00')))
+                totals[row.payment_method] = (count + 1, amount + Decimal(str(row.amount)))
+            last_id = rows[-1].id
+
+        new_item = model.Settlement(
+            business_date=business_date,
+            settled_at=datetime.now(),
+            payment_count=sum(count for count, _ in totals.values()),
+            total_amount=sum((amount for _, amount in totals.values()), Decimal('0.00')),
+            lines=[
+                model.SettlementLine(payment_method=method, payment_count=count, total_amount=amount)
+                for method, (count, amount) in sorted(totals.items(), key=lambda pair: pair[0].value)
+            ]
+        )
+        db.add(new_item)
+        db.commit()
+        db.refresh(new_item)
+    except SQLAlchemyError as e:
+        db.rollback()
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return new_item
+
+
+def read_all(db: Session, business_date: date = None):
+    try:
+        query = db.query(model.Settlement)
+        if business_date:
+            query = query.filter(model.Settlement.business_date == business_date)
+        result = query.order_by(model.Settlement.settled_at.desc()).all()
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return result
+
+
+def read_one(db: Session, item_id):
+    try:
+        item = db.query(model.Settlement).filter(model.Settlement.id == item_id).first()
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Id not found!")
+    except SQLAlchemyError as e:
+        error = str(e.__dict__['orig'])
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error)
+    return item
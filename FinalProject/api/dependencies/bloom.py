@@ -0,0 +1,35 @@
+import hashlib
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    "not in" answers are exact; "in" answers are wrong with a probability that
+    depends on size_bits, hash_count and how many keys were added.
+    Positions come from one blake2b digest using double hashing.
+    """
+
+    def __init__(self, size_bits: int, hash_count: int):
+        self.size_bits = size_bits
+        self.hash_count = hash_count
+        self.bits = bytearray((size_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size_bits for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def memory_bytes(self):
+        return len(self.bits)
@@ -5,4 +5,95 @@ class conf:
     db_user = "root"
     db_password = "***"
     app_host = "localhost"
-    app_port = 8000
\ No newline at end of file
+    app_port = 8000
+    db_connect_timeout = 5  # seconds
+    db_pool_size = 5
+    # How the app prepares the database when a worker boots:
+    #   "create" - run create_all before serving (slowest, always safe)
+    #   "check"  - compare the stored schema fingerprint in the background, create only if it changed
+    # Both log the ALTER TABLE / CREATE INDEX statements for columns and indexes
+    # that existing tables lack, or foreign keys the models dropped, since
+    # create_all never alters a table
+    #   "skip"   - no schema work at all, just warm the connection pool in the background
+    startup_mode = "create"
+    # Completed orders older than this are moved to the archive tables
+    archive_after_days = 365
+    archive_batch_size = 500
+    # The kitchen plan is updated order by order and fully reloaded this often
+    kitchen_resync_seconds = 60
+    # Card and online payments are charged through this gateway (see payment_gateway.GATEWAYS).
+    # "manual" charges nothing and leaves them pending, "local" is a stand-in that completes them
+    # for development and load tests, None keeps the old behaviour of storing whatever status the client sends
+    payment_gateway = "manual"
+    payment_gateway_timeout = 2.0  # seconds per call
+    payment_gateway_retries = 2
+    payment_gateway_max_concurrency = 50
+    payment_gateway_breaker_threshold = 5
+    payment_gateway_breaker_reset_seconds = 30
+    # Behaviour of the "local" stand-in gateway
+    payment_gateway_latency_ms = 200
+    payment_gateway_failure_rate = 0.0
+    payment_gateway_decline_rate = 0.0
+    reconciliation_chunk_size = 1000  # orders per keyset chunk
+    settlement_chunk_size = 500  # payments per UPDATE statement
+    # Bloom filter that rejects unknown promo codes without a query.
+    # 2**23 bits = 1 MiB, about 1% false positives at 870k codes with 7 hashes
+    promo_filter_bits = 2 ** 23
+    promo_filter_hashes = 7
+    promo_filter_refresh_seconds = 5  # How often a worker checks for codes added by other workers
+    promo_counter_shards = 8  # Rows a limited promo code's uses are spread over
+    promo_batch_chunk_size = 1000  # Codes per multi-row INSERT when generating a campaign
+    # Expired promo codes are deactivated in batches of promo_sweep_batch_size every
+    # promo_sweep_interval_seconds (None turns the background sweeper off)
+    promo_sweep_interval_seconds = 300
+    promo_sweep_batch_size = 500
+    promo_sweep_pause_seconds = 0.05  # between batches, lets other writers at the table
+    # Stock changes are appended to inventory_movements and folded into resources.amount
+    # every inventory_compact_interval_seconds (None turns the background compactor off)
+    inventory_compact_interval_seconds = 30
+    inventory_compact_batch_size = 100  # resources per compaction transaction
+    inventory_compact_grace_seconds = 5  # younger movements are left for the next run
+    inventory_hold_seconds = 60  # holds neither confirmed nor released by then are given back by the compactor
+    # Stock-out forecast from order movements in the inventory ledger
+    forecast_bucket_hours = 1
+    forecast_history_days = 28  # a whole number of weeks, for the weekly seasonality
+    forecast_horizon_days = 60
+    forecast_ttl_seconds = 300
+    review_search_batch_size = 1000  # reviews per transaction when rebuilding the search index
+    # POST /reviews/ingest acknowledges a review once it is buffered and writes the buffer
+    # every review_ingest_flush_seconds or as soon as review_ingest_batch_size reviews wait.
+    # review_ingest_durability says what must hold before the acknowledgement:
+    #   "memory" - nothing, a crash loses the reviews still buffered
+    #   "spool"  - appended to review_ingest_spool_path, survives a crash of the process
+    #   "fsync"  - appended and fsynced, survives losing the machine's power
+    # review_ingest_spool_path is a prefix, each worker process spools to <prefix>.<pid> and
+    # replays on start what workers that exited left behind.
+    review_ingest_flush_seconds = 1.0
+    review_ingest_batch_size = 500
+    review_ingest_max_buffered = 20000  # beyond this new reviews get a 503 until the buffer drains
+    review_ingest_durability = "spool"
+    review_ingest_spool_path = "review_ingest.spool"
+    menu_search_refresh_seconds = 5  # How often a worker checks for menu changes made by other workers
+    menu_refresh_seconds = 2  # How often a worker checks whether its GET /menu document is still current
+    # Responses of read endpoints marked with @cached are kept for their TTL and dropped early
+    # when a write invalidates one of their tags. "memory" is private to each worker (other
+    # workers only see a change once their copy expires); "sqlite" shares one LRU file between
+    # all workers on the host, so invalidations reach every worker at once.
+    response_cache_enabled = True
+    response_cache_backend = "memory"
+    response_cache_path = "response_cache.sqlite3"
+    response_cache_max_bytes = 32 * 2 ** 20
+    # Identical concurrent requests to @coalesced endpoints share one run
+    single_flight_enabled = True
+    # Latency and database work per route, served by GET /metrics. With several uvicorn
+    # workers set metrics_dir to a directory they share (emptied before starting) so the
+    # scraped worker can report all of them.
+    metrics_enabled = True
+    metrics_dir = None
+    metrics_flush_seconds = 5
+    # Every response carries X-DB-Queries and X-DB-Time-Ms. A statement shape (the SQL without
+    # its values) run more than query_repeat_threshold times in one request is logged as a
+    # likely N+1; with query_strict it fails the request instead (the test suite turns it on).
+    query_audit_enabled = True
+    query_repeat_threshold = 5
+    query_strict = False
@@ -4,8 +4,11 @@ from .config import conf
 from urllib.parse import quote_plus
 
 SQLALCHEMY_DATABASE_URL = f"mysql+pymysql://{conf.db_user}:{quote_plus(conf.db_password)}@{conf.db_host}:{conf.db_port}/{conf.db_name}?charset=utf8mb4"
+# create_engine does not connect; the first connection is opened on first use
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=conf.db_pool_size,
+    connect_args={"connect_timeout": conf.db_connect_timeout}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+KITCHEN_TOPIC = "kitchen"
+
+
+def order_topic(tracking_number: str):
+    return f"order:{tracking_number}"
+
+
+class Subscription:
+    """One listener: an asyncio queue bound to the event loop that created it.
+
+    The queue is bounded. When a client stops reading, the oldest event is
+    dropped so a stalled connection can never hold more than queue_size events.
+    """
+
+    def __init__(self, broker, topic: str, queue_size: int):
+        self.broker = broker
+        self.topic = topic
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    def _offer(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float = None):
+        """Next event, or None if nothing arrived within timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """In-process pub/sub for order status changes.
+
+    Controllers run in the threadpool, so publish() is thread-safe and hands
+    each event to the subscriber's own loop with call_soon_threadsafe. Idle
+    subscribers cost one queue and one suspended coroutine each, no thread
+    and no database connection.
+    """
+
+    def __init__(self, queue_size: int = 32):
+        self.queue_size = queue_size
+        self._topics = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topic: str):
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def subscriber_count(self, topic: str = None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(subscribers) for subscribers in self._topics.values())
+
+    def publish(self, topic: str, event):
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._offer, event)
+            except RuntimeError:
+                # The subscriber's loop is closed, it will never read again
+                self.unsubscribe(subscription)
+        return len(subscribers)
+
+
+broker = EventBroker()
+
+
+def order_event(order):
+    return {
+        "order_id": order.id,
+        "tracking_number": order.tracking_number,
+        "order_type": getattr(order.order_type, "value", order.order_type),
+        "order_status": getattr(order.order_status, "value", order.order_status),
+    }
+
+
+def publish_order_status(order):
+    """Send an order's current status to its tracking topic and the kitchen feed"""
+    event = order_event(order)
+    if order.tracking_number:
+        broker.publish(order_topic(order.tracking_number), event)
+    broker.publish(KITCHEN_TOPIC, event)
+    return event
+
+
+def publish_order_statuses(events):
+    """Publish a batch of status changes.
+
+    Each tracking topic still gets its own event, but the kitchen feed gets
+    the whole batch as a single list so it redraws once instead of per order.
+    """
+    for event in events:
+        if event["tracking_number"]:
+            broker.publish(order_topic(event["tracking_number"]), event)
+    if events:
+        broker.publish(KITCHEN_TOPIC, list(events))
@@ -0,0 +1,95 @@
+from sqlalchemy.exc import SQLAlchemyError
+from .database import SessionLocal
+from datetime import datetime
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicJob:
+    """Runs work() every interval_seconds in a daemon thread and keeps its metrics.
+
+    Subclasses implement work(db) and return a dict of counts; numeric
+    values are also added up across runs in totals. A falsy interval means
+    the job only runs when run_once() is called.
+    """
+
+    name = "job"
+
+    def __init__(self, interval_seconds: float = None):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.failures = 0
+        self.totals = {}
+        self.last_run_at = None
+        self.last_result = None
+        self.last_duration_ms = None
+        self.last_error = None
+
+    def work(self, db):
+        raise NotImplementedError
+
+    def run_once(self, db=None):
+        """One run, records metrics. Uses its own session unless one is given."""
+        session = db or SessionLocal()
+        start = time.perf_counter()
+        try:
+            result = self.work(session)
+        except Exception as e:
+            session.rollback()
+            with self._lock:
+                self.runs += 1
+                self.failures += 1
+                self.last_run_at = datetime.now()
+                self.last_error = str(e.__dict__.get('orig', e))
+            # A traceback only helps for errors that are not the database's
+            logger.warning(f"{self.name} failed: {self.last_error}", exc_info=not isinstance(e, SQLAlchemyError))
+            raise
+        finally:
+            if db is None:
+                session.close()
+        with self._lock:
+            self.runs += 1
+            for key, value in result.items():
+                if isinstance(value, (int, float)):
+                    self.totals[key] = self.totals.get(key, 0) + value
+            self.last_run_at = datetime.now()
+            self.last_result = result
+            self.last_duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.last_error = None
+        return result
+
+    def _loop(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.run_once()
+            except Exception:
+                pass  # Already recorded and logged by run_once, try again next interval
+
+    def start(self):
+        if not self.interval_seconds or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "interval_seconds": self.interval_seconds,
+                "runs": self.runs,
+                "failures": self.failures,
+                "totals": dict(self.totals),
+                "last_run_at": self.last_run_at,
+                "last_result": self.last_result,
+                "last_duration_ms": self.last_duration_ms,
+                "last_error": self.last_error,
+            }
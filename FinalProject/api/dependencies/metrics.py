@@ -0,0 +1,290 @@
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from contextvars import ContextVar
+from .config import conf
+from . import query_audit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [count per bucket (not cumulative, last is +Inf), sum]
+
+    def observe(self, values: tuple, amount: float):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, amount)] += 1
+        series[1] += amount
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, labels):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.series = {}  # label values -> value
+
+    def add(self, values: tuple, amount: float):
+        self.series[values] = self.series.get(values, 0) + amount
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """Metrics of this worker, merged with the other workers' when rendered.
+
+    Observations only touch dicts under one lock. With conf.metrics_dir set,
+    every worker writes its numbers to metrics-<pid>.json there every
+    conf.metrics_flush_seconds, and /metrics adds up all files, so whichever
+    worker answers the scrape reports the whole service. Histograms of
+    workers that exited are kept so totals never go backwards; gauges only
+    count files written recently. Empty the directory before the service
+    starts, as with prometheus_client's multiprocess mode.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._thread = None
+        self._stop = threading.Event()
+
+    def histogram(self, name: str, help: str, labels, buckets):
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels):
+        return self._metrics.setdefault(name, Gauge(name, help, labels))
+
+    def observe(self, metric: Histogram, values: tuple, amount: float):
+        with self._lock:
+            metric.observe(values, amount)
+
+    def add(self, metric: Gauge, values: tuple, amount: float):
+        with self._lock:
+            metric.add(values, amount)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "written_at": time.time(),
+                "metrics": {
+                    name: [[list(values), series] for values, series in metric.series.items()]
+                    for name, metric in self._metrics.items()
+                },
+            }
+
+    def _path(self):
+        return os.path.join(conf.metrics_dir, f"metrics-{os.getpid()}.json")
+
+    def flush(self):
+        """Write this worker's numbers for the others, if conf.metrics_dir is set"""
+        if not conf.metrics_dir:
+            return
+        path = self._path()
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    def _snapshots(self):
+        if not conf.metrics_dir:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(conf.metrics_dir, "metrics-*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics file {path}: {e}")
+        return snapshots
+
+    def render(self):
+        """All metrics in the Prometheus text format"""
+        stale_before = time.time() - 3 * conf.metrics_flush_seconds
+        merged = {name: {} for name in self._metrics}
+        for snapshot in self._snapshots():
+            for name, entries in snapshot["metrics"].items():
+                metric = self._metrics.get(name)
+                if metric is None:
+                    continue
+                if isinstance(metric, Gauge) and snapshot["written_at"] < stale_before:
+                    continue
+                totals = merged[name]
+                for values, series in entries:
+                    values = tuple(values)
+                    if isinstance(metric, Histogram):
+                        current = totals.setdefault(values, [[0] * (len(metric.buckets) + 1), 0.0])
+                        current[0] = [a + b for a, b in zip(current[0], series[0])]
+                        current[1] += series[1]
+                    else:
+                        totals[values] = totals.get(values, 0) + series
+
+        lines = []
+        for name, metric in self._metrics.items():
+            kind = "histogram" if isinstance(metric, Histogram) else "gauge"
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for values, series in sorted(merged[name].items()):
+                if kind == "gauge":
+                    lines.append(f"{name}{_labels(metric.labels, values)} {_number(series)}")
+                    continue
+                counts, total = series
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (None,), counts):
+                    cumulative += count
+                    le = "+Inf" if bound is None else _number(bound)
+                    bucket = _labels(metric.labels, values, f'le="{le}"')
+                    lines.append(f"{name}_bucket{bucket} {cumulative}")
+                lines.append(f"{name}_sum{_labels(metric.labels, values)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(metric.labels, values)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def _loop(self):
+        while not self._stop.wait(conf.metrics_flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                logger.warning(f"Writing metrics failed: {e}")
+
+    def start(self):
+        """Write this worker's file periodically; nothing to do for a single process"""
+        if not conf.metrics_enabled or not conf.metrics_dir or self._thread is not None:
+            return
+        os.makedirs(conf.metrics_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._loop, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+
+registry = Registry()
+request_duration = registry.histogram(
+    "http_request_duration_seconds", "Time to answer a request, by route template and status",
+    ("method", "route", "status"), LATENCY_BUCKETS
+)
+requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "Requests being answered", ("method",)
+)
+request_queries = registry.histogram(
+    "http_request_db_queries", "Database statements executed while answering a request",
+    ("method", "route"), QUERY_BUCKETS
+)
+request_db_time = registry.histogram(
+    "http_request_db_seconds", "Time spent in database statements while answering a request",
+    ("method", "route"), LATENCY_BUCKETS
+)
+
+
+class RequestQueries:
+    """Statements run on behalf of one request"""
+
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}  # statement -> times run, for query_audit
+
+
+# Set by the middleware; sync endpoints and dependencies run in threads that
+# copy the context, so they see and update the same object
+current_queries: ContextVar = ContextVar("current_queries", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    if current_queries.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    started = conn.info.get("query_started")
+    if queries is not None and started:
+        queries.count += 1
+        queries.seconds += time.perf_counter() - started.pop()
+        queries.statements[statement] = queries.statements.get(statement, 0) + 1
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and database work per route.
+
+    The route label is the matched path template (e.g. /orders/{item_id}),
+    or "unmatched" for requests no route answered, so the number of series
+    stays bounded. With conf.query_audit_enabled every response also gets
+    X-DB-Queries and X-DB-Time-Ms headers, and the statements are checked
+    for repeated shapes by query_audit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (conf.metrics_enabled or conf.query_audit_enabled):
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        status = 500
+        queries = RequestQueries()
+        checked = None
+        token = current_queries.set(queries)
+
+        async def send_status(message):
+            nonlocal status, checked
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if conf.query_audit_enabled:
+                    checked = queries.count
+                    found = query_audit.check(scope, queries.statements)
+                    headers = list(message.get("headers", ()))
+                    headers.append((b"x-db-queries", str(queries.count).encode()))
+                    headers.append((b"x-db-time-ms", f"{queries.seconds * 1000:.1f}".encode()))
+                    if found:
+                        headers.append((b"x-db-repeated-queries", str(sum(count for _, count in found)).encode()))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        if conf.metrics_enabled:
+            registry.add(requests_in_flight, (method,), 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+            if checked is not None and queries.count != checked:
+                # A streaming response kept querying after its headers went out
+                query_audit.check(scope, queries.statements)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_queries.reset(token)
+            if conf.metrics_enabled:
+                registry.add(requests_in_flight, (method,), -1)
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                registry.observe(request_duration, (method, route, str(status)), elapsed)
+                registry.observe(request_queries, (method, route), queries.count)
+                registry.observe(request_db_time, (method, route), queries.seconds)
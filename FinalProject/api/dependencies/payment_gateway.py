@@ -0,0 +1,238 @@
+from abc import ABC, abstractmethod
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+from .config import conf
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """Temporary failure (network, timeout, 5xx). Safe to retry."""
+
+
+class CircuitOpenError(GatewayError):
+    """Raised without calling the gateway while the circuit breaker is open"""
+
+
+class PaymentDeclined(Exception):
+    """The gateway refused the card. Retrying will not help."""
+
+
+class PaymentNotCharged(Exception):
+    """The gateway did not charge the payment; it stays pending for someone to settle by hand."""
+
+
+class PaymentGateway(ABC):
+    """Interface every gateway implements. Both calls must be idempotent per reference."""
+
+    @abstractmethod
+    async def authorize(self, reference: str, amount, method: str):
+        """Reserve amount on the customer's card, return an authorization id"""
+
+    @abstractmethod
+    async def capture(self, authorization: str, amount):
+        """Collect a previously authorized amount, return a capture id"""
+
+
+class ManualGateway(PaymentGateway):
+    """No gateway at all: card and online payments stay pending until staff record
+    the outcome (PUT /payments/{id}). The default, so nothing is marked paid
+    without a real gateway having charged it.
+    """
+
+    async def authorize(self, reference: str, amount, method: str):
+        raise PaymentNotCharged("No payment gateway configured, the payment stays pending")
+
+    async def capture(self, authorization: str, amount):
+        raise PaymentNotCharged("No payment gateway configured, the payment stays pending")
+
+
+class LocalGateway(PaymentGateway):
+    """In-process stand-in for a real gateway, for development and load tests.
+
+    Every call sleeps for latency_ms +/- jitter_ms, then fails with
+    failure_rate probability (GatewayError) or declines the authorization
+    with decline_rate probability (PaymentDeclined).
+    """
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, failure_rate: float = 0.0,
+                 decline_rate: float = 0.0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.decline_rate = decline_rate
+        self._random = random.Random(seed)
+        self._authorizations = {}
+
+    async def _network(self):
+        delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay / 1000)
+        if self._random.random() < self.failure_rate:
+            raise GatewayError("Local gateway: simulated failure")
+
+    async def authorize(self, reference: str, amount, method: str):
+        await self._network()
+        if reference in self._authorizations:
+            return self._authorizations[reference]
+        if self._random.random() < self.decline_rate:
+            raise PaymentDeclined("Local gateway: card declined")
+        authorization = f"auth_{uuid.uuid4().hex[:12]}"
+        self._authorizations[reference] = authorization
+        return authorization
+
+    async def capture(self, authorization: str, amount):
+        await self._network()
+        return f"cap_{authorization[5:]}"
+
+
+class CircuitBreaker:
+    """Stops calling a gateway that keeps failing.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast for reset_seconds. Then one trial call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._trial_running):
+            raise CircuitOpenError("Payment gateway circuit is open")
+        if state == "half-open":
+            self._trial_running = True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+
+class GatewayClient:
+    """Calls a gateway with bounded concurrency, a per-call timeout, retries with
+    exponential backoff for temporary errors, and a circuit breaker.
+
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, gateway: PaymentGateway, max_concurrency: int = 50, timeout: float = 2.0,
+                 retries: int = 2, backoff: float = 0.2, breaker: CircuitBreaker = None):
+        self.gateway = gateway
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _call(self, operation, *args):
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            try:
+                async with self._semaphore:
+                    result = await asyncio.wait_for(operation(*args), self.timeout)
+            except (PaymentDeclined, PaymentNotCharged):
+                # The gateway answered, so it is healthy
+                self.breaker.record_success()
+                raise
+            except (GatewayError, asyncio.TimeoutError) as e:
+                self.breaker.record_failure()
+                if attempt >= self.retries:
+                    raise GatewayError(f"Payment gateway failed after {attempt + 1} attempts: {e!r}") from e
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def charge(self, reference: str, amount, method: str):
+        """Authorize then capture, return the capture id"""
+        authorization = await self._call(self.gateway.authorize, reference, amount, method)
+        return await self._call(self.gateway.capture, authorization, amount)
+
+
+GATEWAYS = {
+    "manual": ManualGateway,
+    "local": lambda: LocalGateway(
+        latency_ms=conf.payment_gateway_latency_ms,
+        failure_rate=conf.payment_gateway_failure_rate,
+        decline_rate=conf.payment_gateway_decline_rate,
+    ),
+}
+
+
+class PaymentDispatcher:
+    """Runs gateway calls on a private event loop in a daemon thread.
+
+    HTTP handlers submit work and return right away; the loop multiplexes all
+    in-flight gateway calls, so no request thread ever waits on the gateway.
+    """
+
+    def __init__(self, gateway: PaymentGateway):
+        self._ready = threading.Event()
+        self._loop = None
+        self.client = None
+        self._gateway = gateway
+        self._thread = threading.Thread(target=self._run, name="payment-dispatcher", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self.client = GatewayClient(
+            self._gateway,
+            max_concurrency=conf.payment_gateway_max_concurrency,
+            timeout=conf.payment_gateway_timeout,
+            retries=conf.payment_gateway_retries,
+            breaker=CircuitBreaker(conf.payment_gateway_breaker_threshold, conf.payment_gateway_breaker_reset_seconds),
+        )
+        self._ready.set()
+        self._loop.run_forever()
+
+    def submit(self, coroutine):
+        """Schedule a coroutine on the dispatcher loop, returns a concurrent.futures.Future"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+        future.add_done_callback(_log_failure)
+        return future
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logger.error(f"Payment dispatch failed: {future.exception()!r}")
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    """The process-wide dispatcher for conf.payment_gateway, started on first use"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = PaymentDispatcher(GATEWAYS[conf.payment_gateway]())
+        return _dispatcher
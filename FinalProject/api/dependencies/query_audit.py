@@ -0,0 +1,67 @@
+from .config import conf
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Statements a request may legitimately run many times
+_IGNORED = re.compile(r"^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT|ROLLBACK)\b", re.IGNORECASE)
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAMETER = re.compile(r"%\(\w+\)s|%s|\?|:\w+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_SPACE = re.compile(r"\s+")
+_shapes = {}  # statement -> shape, statements are few and repeat, so this stays small
+
+
+class RepeatedQueriesError(RuntimeError):
+    """Raised in strict mode when one request runs the same statement shape too often"""
+
+
+def allow_repeated_queries(endpoint):
+    """Mark an endpoint that repeats statements on purpose, e.g. a job working in chunks"""
+    endpoint.__allow_repeated_queries__ = True
+    return endpoint
+
+
+def shape(statement: str):
+    """statement without its values, so one query run for many ids reads the same each time"""
+    result = _shapes.get(statement)
+    if result is None:
+        result = _SPACE.sub(" ", statement).strip()
+        result = _PARAMETER.sub("?", _NUMBER.sub("?", _STRING.sub("?", result)))
+        result = _ROWS.sub(r"\1", _LIST.sub("(?)", result))
+        if len(_shapes) >= 10000:
+            _shapes.clear()
+        _shapes[statement] = result
+    return result
+
+
+def repeated(statements: dict):
+    """(shape, count) of shapes run more than conf.query_repeat_threshold times, most frequent first.
+
+    statements maps each executed statement to how often it ran.
+    """
+    counts = {}
+    for statement, count in statements.items():
+        if not _IGNORED.match(statement):
+            key = shape(statement)
+            counts[key] = counts.get(key, 0) + count
+    found = [(key, count) for key, count in counts.items() if count > conf.query_repeat_threshold]
+    return sorted(found, key=lambda item: -item[1])
+
+
+def check(scope, statements: dict):
+    """Log the repeated shapes of a request, or raise RepeatedQueriesError in strict mode"""
+    route = scope.get("route")
+    if not statements or getattr(getattr(route, "endpoint", None), "__allow_repeated_queries__", False):
+        return []
+    found = repeated(statements)
+    if found:
+        where = f"{scope['method']} {getattr(route, 'path', None) or scope['path']}"
+        summary = "; ".join(f"{count}x {key[:200]}" for key, count in found)
+        if conf.query_strict:
+            raise RepeatedQueriesError(f"Likely N+1 queries in {where}: {summary}")
+        logger.warning(f"Likely N+1 queries in {where}: {summary}")
+    return found
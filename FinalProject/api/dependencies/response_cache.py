@@ -0,0 +1,356 @@
+from fastapi import Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode
+from .config import conf
+from .single_flight import single_flight
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ENTRY_OVERHEAD = 200  # rough bytes per entry besides key and body, for the memory budget
+
+
+def cached(ttl: float, tags=()):
+    """Mark a GET endpoint of a router using CachedRoute as cacheable.
+
+    The whole response is kept for ttl seconds under its path and sorted
+    query parameters, and dropped early when one of tags is invalidated.
+    The function itself is returned unchanged.
+    """
+    def mark(endpoint):
+        endpoint.__response_cache__ = {"ttl": ttl, "tags": tuple(tags)}
+        return endpoint
+    return mark
+
+
+def cache_key(request: Request):
+    """Path plus query parameters sorted by name, so ?b=1&a=2 and ?a=2&b=1 share an entry"""
+    params = sorted(parse_qsl(request.url.query, keep_blank_values=True))
+    return f"{request.url.path}?{urlencode(params)}" if params else request.url.path
+
+
+class MemoryBackend:
+    """LRU of responses within max_bytes, private to this worker"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, body, media_type, tags, size)
+        self._tags = {}  # tag -> keys
+        self._bytes = 0
+
+    def get(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1], entry[2]
+
+    def _drop(self, key: str):
+        _, _, _, tags, size = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def set(self, key: str, body: bytes, media_type: str, expires_at: float, tags):
+        """Store an entry, return how many older entries were evicted to make room"""
+        if key in self._entries:
+            self._drop(key)
+        size = len(key) + len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        while self._bytes + size > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            evicted += 1
+        self._entries[key] = (expires_at, body, media_type, tuple(tags), size)
+        self._bytes += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        return evicted
+
+    def invalidate(self, tags):
+        keys = set()
+        for tag in tags:
+            keys |= self._tags.get(tag, set())
+        for key in keys:
+            self._drop(key)
+        return len(keys)
+
+    def clear(self):
+        self._entries.clear()
+        self._tags.clear()
+        self._bytes = 0
+
+    def usage(self):
+        return len(self._entries), self._bytes
+
+
+class SqliteBackend:
+    """LRU of responses in an SQLite file, shared by every worker on the host.
+
+    Invalidations from one worker are seen by all of them, which the memory
+    backend can't do. Each call is a short transaction on a WAL database.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB NOT NULL, media_type TEXT,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used_at)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entry_tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+
+    def get(self, key: str, now: float):
+        row = self._db.execute("SELECT body, media_type, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if row[2] <= now:
+            self._delete([key])
+            return None
+        # Touching on every hit would turn reads into writes; once a second is enough for LRU
+        self._db.execute("UPDATE entries SET used_at = ? WHERE key = ? AND used_at < ?", (now, key, now - 1))
+        return row[0], row[1]
+
+    def _delete(self, keys):
+        marks = ",".join("?" * len(keys))
+        self._db.execute(f"DELETE FROM entries WHERE key IN ({marks})", keys)
+        self._db.execute(f"DELETE FROM entry_tags WHERE key IN ({marks})", keys)
+
+    def set(self, key: str, body: bytes, media_type: str, expires_at: float, tags):
+        size = len(key) + len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete([key])
+            self._db.execute(
+                "INSERT INTO entries (key, body, media_type, expires_at, used_at, size) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, body, media_type, expires_at, time.time(), size)
+            )
+            self._db.executemany("INSERT OR IGNORE INTO entry_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+            excess = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                victims = []
+                for victim, victim_size in self._db.execute("SELECT key, size FROM entries ORDER BY used_at"):
+                    if excess <= 0:
+                        break
+                    if victim != key:
+                        victims.append(victim)
+                        excess -= victim_size
+                if victims:
+                    self._delete(victims)
+                evicted = len(victims)
+            self._db.execute("COMMIT")
+        except sqlite3.Error:
+            self._db.execute("ROLLBACK")
+            raise
+        return evicted
+
+    def invalidate(self, tags):
+        marks = ",".join("?" * len(tags))
+        keys = [row[0] for row in self._db.execute(
+            f"SELECT DISTINCT key FROM entry_tags WHERE tag IN ({marks})", list(tags)
+        )]
+        if keys:
+            self._delete(keys)
+        return len(keys)
+
+    def clear(self):
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM entry_tags")
+
+    def usage(self):
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return entries, size
+
+
+class ResponseCache:
+    """Front of the configured backend, with hit and miss statistics.
+
+    conf.response_cache_backend picks "memory" (per worker) or "sqlite"
+    (shared through conf.response_cache_path); the backend is created on
+    first use. Any backend error is logged and treated as a miss, so the
+    cache can never take an endpoint down.
+    """
+
+    def __init__(self):
+        self._backend = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.invalidated = 0
+        self.errors = 0
+        self.routes = {}  # route path -> [hits, misses]
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if conf.response_cache_backend == "sqlite":
+                self._backend = SqliteBackend(conf.response_cache_path, conf.response_cache_max_bytes)
+            else:
+                self._backend = MemoryBackend(conf.response_cache_max_bytes)
+        return self._backend
+
+    def _count(self, route: str, hit: bool):
+        counts = self.routes.setdefault(route, [0, 0])
+        counts[0 if hit else 1] += 1
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def get(self, route: str, key: str):
+        with self._lock:
+            try:
+                entry = self.backend.get(key, time.time())
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Response cache read failed: {e}")
+                entry = None
+            self._count(route, entry is not None)
+            return entry
+
+    def set(self, key: str, body: bytes, media_type: str, ttl: float, tags):
+        with self._lock:
+            try:
+                self.evictions += self.backend.set(key, body, media_type, time.time() + ttl, tags)
+                self.stores += 1
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Response cache write failed: {e}")
+
+    def invalidate(self, *tags):
+        if not tags:
+            return 0
+        with self._lock:
+            try:
+                dropped = self.backend.invalidate(tags)
+            except sqlite3.Error as e:
+                self.errors += 1
+                logger.warning(f"Response cache invalidation failed: {e}")
+                return 0
+            self.invalidated += dropped
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self.backend.usage()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": conf.response_cache_enabled,
+                "backend": conf.response_cache_backend,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": conf.response_cache_max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "invalidated": self.invalidated,
+                "errors": self.errors,
+                "routes": {route: {"hits": hits, "misses": misses} for route, (hits, misses) in sorted(self.routes.items())},
+            }
+
+
+response_cache = ResponseCache()
+
+
+class CachedRoute(APIRoute):
+    """Route class for endpoints marked with @cached and/or @coalesced.
+
+    A cache hit is answered before any dependency runs, so it never opens a
+    database session. Only 200 responses with a body are stored. On a miss,
+    a @coalesced endpoint runs once for all identical requests in flight
+    and every one of them gets a copy of that response.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        options = getattr(self.endpoint, "__response_cache__", None)
+        coalesce = getattr(self.endpoint, "__single_flight__", False)
+        if (options is None and not coalesce) or "GET" not in self.methods:
+            return handler
+        route = self.path
+
+        async def run(request: Request, key: str):
+            response = await handler(request)
+            body = getattr(response, "body", None)
+            if options is not None and response.status_code == 200 and body:
+                response_cache.set(key, body, response.media_type, options["ttl"], options["tags"])
+            return response
+
+        async def cached_handler(request: Request):
+            key = cache_key(request)
+            caching = options is not None and conf.response_cache_enabled
+            if caching:
+                entry = response_cache.get(route, key)
+                if entry is not None:
+                    body, media_type = entry
+                    return Response(content=body, media_type=media_type, headers={"X-Cache": "HIT"})
+            if coalesce and conf.single_flight_enabled:
+                response, shared = await single_flight.do_async(key, run, request, key, name=route)
+                if shared:
+                    # The same Response object can't be sent twice
+                    copy = Response(content=response.body, status_code=response.status_code)
+                    copy.raw_headers = [header for header in response.raw_headers if header[0] != b"x-cache"]
+                    response = copy
+                    if caching:
+                        response.headers["X-Cache"] = "COALESCED"
+                    return response
+            else:
+                response = await run(request, key)
+            if caching:
+                response.headers["X-Cache"] = "MISS"
+            return response
+
+        return cached_handler
+
+
+def invalidate_on_commit(db: Session, *tags):
+    """Invalidate tags once db's current transaction commits; nothing happens on rollback.
+
+    Dropping entries before the commit would let a concurrent request cache
+    the old rows again before the new ones are visible.
+    """
+    db.info.setdefault("response_cache_tags", set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    tags = session.info.pop("response_cache_tags", None)
+    if tags:
+        response_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_uncommitted(session, transaction):
+    # Runs after after_commit, so anything left here was rolled back or closed
+    # unfinished. A rolled back savepoint keeps its tags: an extra invalidation
+    # is harmless, a missing one is not.
+    if transaction.parent is None:
+        session.info.pop("response_cache_tags", None)
@@ -0,0 +1,110 @@
+import asyncio
+import threading
+
+
+def coalesced(endpoint):
+    """Mark an endpoint of a router using CachedRoute so identical concurrent requests share one run.
+
+    Requests are identical when their path and sorted query parameters are.
+    Only use it on endpoints that return a plain (non-streaming) response.
+    """
+    endpoint.__single_flight__ = True
+    return endpoint
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """At most one computation per key at a time; callers arriving while it runs get its outcome.
+
+    do() is for plain functions called from several threads, do_async() for
+    coroutines on the event loop. Both return (result, shared), shared being
+    True for callers that waited on someone else's run. An exception reaches
+    every caller of that run and nothing is remembered afterwards, so the
+    next call after a failure tries again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> _Call
+        self._tasks = {}  # (event loop, key) -> asyncio.Task
+        self.executions = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.routes = {}  # name -> [executions, coalesced]
+
+    def _count(self, name, shared: bool):
+        counts = self.routes.setdefault(name, [0, 0])
+        counts[1 if shared else 0] += 1
+        if shared:
+            self.coalesced += 1
+        else:
+            self.executions += 1
+
+    def do(self, key, fn, *args, name=None):
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+            self._count(name or str(key), shared)
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args)
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    async def do_async(self, key, fn, *args, name=None):
+        """Like do() for a coroutine function; the run is a task of its own, so it
+        finishes for the others even if the caller that started it goes away"""
+        task_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            shared = task is not None
+            if not shared:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn(*args))
+                task.add_done_callback(lambda done: self._finished(task_key, done))
+            self._count(name or str(key), shared)
+        return await asyncio.shield(task), shared
+
+    def _finished(self, task_key, task):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+            if task.cancelled() or task.exception() is not None:
+                self.errors += 1
+
+    def stats(self):
+        with self._lock:
+            calls = self.executions + self.coalesced
+            return {
+                "in_flight": len(self._calls) + len(self._tasks),
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": round(self.coalesced / calls, 4) if calls else None,
+                "errors": self.errors,
+                "routes": {
+                    name: {"executions": executions, "coalesced": coalesced}
+                    for name, (executions, coalesced) in sorted(self.routes.items())
+                },
+            }
+
+
+single_flight = SingleFlight()
@@ -4,13 +4,19 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
 from .routers import index as indexRoute
 from .models import model_loader
+from .controllers.promo_sweeper import sweeper as promo_sweeper
+from .controllers.inventory import compactor as inventory_compactor
+from .controllers.review_ingest import ingestor as review_ingestor
 from .dependencies.config import conf
+from .dependencies.metrics import MetricsMiddleware, registry as metrics_registry
 
 
 app = FastAPI(
     title="Sandwich Maker API",
     description="API for managing a sandwich shop",
-    version="1.0.0"
+    version="1.0.0",
+    # Reviews acknowledged by POST /reviews/ingest are written before the worker exits
+    on_shutdown=[lambda: review_ingestor.drain()]
 )
 
 origins = ["*"]
@@ -22,9 +28,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
-model_loader.index()
+model_loader.startup()
 indexRoute.load_routes(app)
+promo_sweeper.start()
+inventory_compactor.start()
+review_ingestor.start()
+metrics_registry.start()
 
 
 @app.get("/")
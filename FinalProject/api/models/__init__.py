@@ -7,6 +7,15 @@ from . import order_details
 from . import reviews
 from . import promotional_codes
 from . import payments
+from . import archives
+from . import schema_version
+from . import reconciliation
+from . import settlements
+from . import cache_versions
+from . import promo_redemptions
+from . import inventory
+from . import review_terms
+from . import menu
 
 # Ensure all models are loaded
 __all__ = [
@@ -17,5 +26,14 @@ __all__ = [
     "order_details",
     "reviews",
     "promotional_codes",
-    "payments"
+    "payments",
+    "archives",
+    "schema_version",
+    "reconciliation",
+    "settlements",
+    "cache_versions",
+    "promo_redemptions",
+    "inventory",
+    "review_terms",
+    "menu"
 ]
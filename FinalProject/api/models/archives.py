@@ -0,0 +1,78 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME, Enum, Text
+from sqlalchemy.orm import relationship
+from ..dependencies.database import Base
+from .orders import OrderType, OrderStatus
+from .payments import PaymentMethod, PaymentStatus
+
+
+# Cold storage for completed orders. Rows keep the ids they had in the live
+# tables, so tracking numbers, payments and reviews still line up after a move.
+# There are no foreign keys back to the live tables on purpose: a sandwich can
+# still be deleted after its old orders have been archived.
+
+
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    customer_name = Column(String(100))
+    order_date = Column(DATETIME, nullable=False, index=True)
+    description = Column(String(300))
+    tracking_number = Column(String(50), unique=True, nullable=True, index=True)
+    order_type = Column(Enum(OrderType), nullable=False)
+    order_status = Column(Enum(OrderStatus), nullable=False)
+    total_price = Column(DECIMAL(10, 2), nullable=False)
+    promo_code_id = Column(Integer, nullable=True)
+    payment_id = Column(Integer, nullable=True)
+
+    order_details = relationship("ArchivedOrderDetail", back_populates="order")
+
+
+class ArchivedOrderDetail(Base):
+    __tablename__ = "archived_order_details"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, ForeignKey("archived_orders.id"), index=True)
+    sandwich_id = Column(Integer, index=True)
+    amount = Column(Integer, nullable=False)
+
+    order = relationship("ArchivedOrder", back_populates="order_details")
+
+
+class ArchivedReview(Base):
+    __tablename__ = "archived_reviews"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, nullable=False, index=True)
+    sandwich_id = Column(Integer, nullable=False, index=True)
+    rating = Column(Integer, nullable=False)
+    review_text = Column(Text, nullable=True)
+    created_at = Column(DATETIME, nullable=False)
+
+
+class ArchivedPayment(Base):
+    __tablename__ = "archived_payments"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    order_id = Column(Integer, nullable=False, unique=True)
+    amount = Column(DECIMAL(10, 2), nullable=False)
+    payment_method = Column(Enum(PaymentMethod), nullable=False)
+    payment_status = Column(Enum(PaymentStatus), nullable=False)
+    payment_date = Column(DATETIME, nullable=False)
+
+
+class ArchivedSandwichStat(Base):
+    """Per-sandwich rollup of everything that has been archived.
+
+    Analytics add these totals to the live aggregates instead of scanning
+    the archive tables.
+    """
+    __tablename__ = "archived_sandwich_stats"
+
+    sandwich_id = Column(Integer, primary_key=True, autoincrement=False)
+    order_count = Column(Integer, nullable=False, server_default='0')
+    total_quantity = Column(Integer, nullable=False, server_default='0')
+    review_count = Column(Integer, nullable=False, server_default='0')
+    rating_sum = Column(Integer, nullable=False, server_default='0')
+    min_rating = Column(Integer, nullable=True)
+    max_rating = Column(Integer, nullable=True)
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from ..dependencies.database import Base
+
+
+class CacheVersion(Base):
+    """Version counter per cached dataset.
+
+    Writers bump the counter in the same transaction as their change; every
+    worker compares it with the version it has cached to know when to reload.
+    """
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, server_default='0')
@@ -0,0 +1,48 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, DATETIME, Enum, Index
+from datetime import datetime
+import enum
+from ..dependencies.database import Base
+
+
+class MovementReason(str, enum.Enum):
+    ORDER = "order"
+    RESTOCK = "restock"
+    ADJUSTMENT = "adjustment"
+    HOLD = "hold"
+    RELEASE = "release"
+
+
+class InventoryMovement(Base):
+    """One change to a resource's stock. Rows are only ever inserted.
+
+    The current level of a resource is resources.amount (its snapshot) plus
+    the deltas of every movement after resources.snapshot_movement_id.
+    """
+    __tablename__ = "inventory_movements"
+    __table_args__ = (
+        # Deltas since a snapshot are read as a range scan on this index
+        Index("ix_inventory_movements_resource", "resource_id", "id"),
+        # The stale hold sweep looks up recent holds and the releases matching their note
+        Index("ix_inventory_movements_reason", "reason", "created_at"),
+        Index("ix_inventory_movements_note", "note"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False)
+    delta = Column(Integer, nullable=False)
+    reason = Column(Enum(MovementReason), nullable=False)
+    # Not a foreign key: archived orders are deleted but their movements stay
+    order_id = Column(Integer, nullable=True, index=True)
+    note = Column(String(200), nullable=True)  # HOLD and RELEASE rows of one hold share a token here
+    created_at = Column(DATETIME, nullable=False)
+
+
+class InventorySnapshot(Base):
+    """History of compactions: the level of a resource up to and including a movement"""
+    __tablename__ = "inventory_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    resource_id = Column(Integer, ForeignKey("resources.id"), nullable=False, index=True)
+    amount = Column(Integer, nullable=False)
+    last_movement_id = Column(Integer, nullable=False)
+    taken_at = Column(DATETIME, nullable=False)
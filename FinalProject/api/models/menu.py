@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DATETIME, Text
+from ..dependencies.database import Base
+
+
+class MenuDocument(Base):
+    """The GET /menu response built for one combination of menu versions.
+
+    The first worker to see a new version builds the document and stores it
+    here; the other workers load it with one primary-key read instead of
+    building it again.
+    """
+    __tablename__ = "menu_documents"
+
+    version = Column(String(100), primary_key=True)
+    etag = Column(String(66), nullable=False)
+    body = Column(Text(2 ** 24), nullable=False)  # MEDIUMTEXT and up on MySQL
+    built_at = Column(DATETIME, nullable=False)
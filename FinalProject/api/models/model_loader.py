@@ -1,9 +1,16 @@
 # Import all models to ensure relationships are properly resolved
-from . import orders, order_details, recipes, sandwiches, resources, reviews, promotional_codes, payments
+from . import orders, order_details, recipes, sandwiches, resources, reviews, promotional_codes, payments, archives, schema_version, reconciliation, settlements, cache_versions, promo_redemptions, inventory, review_terms, menu
 
 from ..dependencies.database import engine, Base
-from sqlalchemy.exc import OperationalError
+from ..dependencies.config import conf
+from sqlalchemy import text, inspect, ForeignKeyConstraint, UniqueConstraint
+from sqlalchemy.schema import AddConstraint, CreateColumn, CreateIndex
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+from datetime import datetime
+import hashlib
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +21,14 @@ def index():
         # Import all models first to ensure relationships are resolved
         # All models are already imported at the top, but we need to ensure
         # they're all loaded before creating tables
-        _ = [orders, order_details, recipes, sandwiches, resources, reviews, promotional_codes, payments]
+        _ = [orders, order_details, recipes, sandwiches, resources, reviews, promotional_codes, payments, archives, schema_version, reconciliation, settlements, cache_versions, promo_redemptions, inventory, review_terms, menu]
         
         # Use Base.metadata.create_all to create all tables at once
         # This ensures all relationships are properly resolved
         Base.metadata.create_all(engine)
         logger.info("Database tables created successfully")
+        with engine.connect() as connection:
+            report_drift(schema_drift(connection))
     except OperationalError as e:
         logger.warning(f"Could not connect to database: {e}")
         logger.warning("Server will start, but database operations will fail until connection is established")
@@ -27,3 +36,169 @@ def index():
         logger.error(f"Error creating database tables: {e}")
         import traceback
         logger.error(traceback.format_exc())
+
+
+def _server_default(column):
+    """The column's server default as DDL states it.
+
+    Some models default a DATETIME to the time the module was imported; such a
+    literal timestamp counts as just "timestamp", or every restart would look
+    like a schema change.
+    """
+    if column.server_default is None:
+        return ""
+    arg = getattr(column.server_default, "arg", column.server_default)
+    if isinstance(arg, str):
+        try:
+            datetime.fromisoformat(arg)
+            return "timestamp"
+        except ValueError:
+            return arg
+    return str(arg)
+
+
+def schema_fingerprint(metadata=None):
+    """Hash of every table, column (with its server default), foreign key, unique constraint and index the models declare"""
+    metadata = metadata or Base.metadata
+    parts = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type!r}:{c.nullable}:{c.unique}:{_server_default(c)}" for c in table.columns)
+        parts.extend(sorted(
+            f"fk:{fk.parent.name}->{fk.target_fullname}:{fk.ondelete}" for fk in table.foreign_keys
+        ))
+        parts.extend(sorted(
+            "unique:" + ",".join(c.name for c in constraint.columns)
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+        ))
+        parts.extend(sorted(
+            f"{i.name}:{i.unique}:" + ",".join(c.name for c in i.columns) for i in table.indexes if i.name
+        ))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+
+def schema_drift(connection, metadata=None):
+    """Statements adding what the models declare but existing tables lack.
+
+    create_all only creates tables that are missing; it never alters one
+    that exists, so a column or index added to a model afterwards, or a
+    foreign key removed from one, has to be changed by hand. Returns the
+    ALTER TABLE / CREATE INDEX statements for those, an empty list when the
+    live tables match.
+    """
+    metadata = metadata or Base.metadata
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    dialect = connection.dialect
+    statements = []
+    for table in sorted(metadata.tables.values(), key=lambda t: t.name):
+        if table.name not in existing:
+            continue
+        live_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = {column.name for column in table.columns if column.name not in live_columns}
+        for column in table.columns:
+            if column.name in missing:
+                statements.append(f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(column).compile(dialect=dialect)}")
+        for constraint in table.constraints:
+            if isinstance(constraint, (UniqueConstraint, ForeignKeyConstraint)) and \
+                    missing.intersection(c.name for c in constraint.columns):
+                statements.append(str(AddConstraint(constraint).compile(dialect=dialect)))
+        # A foreign key the models dropped still blocks deletes until it is dropped here too
+        declared = {tuple(c.name for c in fk.columns) for fk in table.foreign_key_constraints}
+        for fk in inspector.get_foreign_keys(table.name):
+            if fk.get("name") and tuple(fk["constrained_columns"]) not in declared:
+                statements.append(f"ALTER TABLE {table.name} DROP FOREIGN KEY {fk['name']}")
+        live_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name and index.name not in live_indexes:
+                statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+    return statements
+
+
+def report_drift(statements):
+    if statements:
+        logger.error(
+            "Existing tables differ from the models (missing columns or indexes, or foreign keys the models "
+            "dropped); create_all does not "
+            "alter tables, so run these statements:\n" + ";\n".join(statements) + ";"
+        )
+
+
+def ensure_schema():
+    """Run create_all only if the stored fingerprint differs from the models.
+
+    In the common case this is a single primary-key SELECT instead of the
+    table reflection create_all does for every table. After create_all the
+    existing tables are compared with the models; if columns or indexes are
+    missing they are reported with the statements to add them, and the
+    fingerprint is not stored, so the check runs again on the next start.
+    """
+    fingerprint = schema_fingerprint()
+    with Session(engine) as db:
+        try:
+            current = db.get(schema_version.SchemaVersion, 1)
+            stored = current.fingerprint if current else None
+        except SQLAlchemyError:
+            # Most likely the schema_version table does not exist yet
+            db.rollback()
+            stored = None
+        if stored == fingerprint:
+            logger.info("Database schema is up to date")
+            return False
+
+        Base.metadata.create_all(engine)
+        with engine.connect() as connection:
+            drift = schema_drift(connection)
+        if drift:
+            report_drift(drift)
+            return True
+        db.merge(schema_version.SchemaVersion(id=1, fingerprint=fingerprint, applied_at=datetime.now()))
+        db.commit()
+        logger.info("Database tables created successfully")
+        return True
+
+
+def warm_pool(size: int = None):
+    """Open up to size pooled connections so the first requests don't pay for the connect"""
+    size = size or conf.db_pool_size
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connections.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def _background_startup(check_schema: bool):
+    try:
+        if check_schema:
+            ensure_schema()
+        warm_pool()
+    except OperationalError as e:
+        logger.warning(f"Could not connect to database: {e}")
+        logger.warning("Server will start, but database operations will fail until connection is established")
+    except Exception as e:
+        logger.error(f"Error preparing database: {e}")
+
+
+def startup(mode: str = None):
+    """Prepare the database according to conf.startup_mode.
+
+    "create" blocks the import exactly like index() always has. The other
+    modes return immediately and leave the connecting to a daemon thread, so
+    a slow or unreachable MySQL never delays a worker from accepting requests.
+    """
+    mode = mode or conf.startup_mode
+    if mode == "create":
+        index()
+        return None
+    if mode not in ("check", "skip"):
+        raise ValueError(f"Unknown startup mode: {mode}")
+    thread = threading.Thread(
+        target=_background_startup, args=(mode == "check",), name="db-startup", daemon=True
+    )
+    thread.start()
+    return thread
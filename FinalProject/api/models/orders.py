@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME, Enum
+from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -17,8 +17,21 @@ class OrderStatus(str, enum.Enum):
     COMPLETED = "completed"
 
 
+# Legal moves for bulk status changes: each status may only advance one step
+STATUS_TRANSITIONS = {
+    OrderStatus.PENDING: {OrderStatus.PREPARING},
+    OrderStatus.PREPARING: {OrderStatus.READY},
+    OrderStatus.READY: {OrderStatus.COMPLETED},
+    OrderStatus.COMPLETED: set(),
+}
+
+
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (
+        # Used by the archiver to find old completed orders
+        Index("ix_orders_status_date", "order_status", "order_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     customer_name = Column(String(100))
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME, Enum
+from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -21,6 +21,10 @@ class PaymentStatus(str, enum.Enum):
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Used by settlement to find the day's pending payments
+        Index("ix_payments_status_date", "payment_status", "payment_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False, unique=True)
@@ -0,0 +1,35 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, DATETIME, UniqueConstraint
+from datetime import datetime
+from ..dependencies.database import Base
+
+
+class PromoCodeShard(Base):
+    """One slice of a code's max_uses.
+
+    Redemptions claim a use from a random shard with a conditional UPDATE,
+    so concurrent orders lock different rows, and the sum of all capacities
+    is exactly max_uses.
+    """
+    __tablename__ = "promo_code_shards"
+
+    promo_code_id = Column(Integer, ForeignKey("promotional_codes.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True, autoincrement=False)
+    capacity = Column(Integer, nullable=False)
+    used = Column(Integer, nullable=False, server_default='0')
+
+
+class PromoRedemption(Base):
+    __tablename__ = "promo_redemptions"
+    __table_args__ = (
+        # slot runs 1..max_uses_per_customer, so the unique key enforces the per-customer limit
+        UniqueConstraint("promo_code_id", "customer_key", "slot", name="uq_promo_redemption_slot"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    promo_code_id = Column(Integer, ForeignKey("promotional_codes.id"), nullable=False)
+    # Not a foreign key: archived and deleted orders go, but their redemptions
+    # keep counting against the code's limits
+    order_id = Column(Integer, nullable=False, index=True)
+    customer_key = Column(String(100), nullable=False)
+    slot = Column(Integer, nullable=True)  # NULL when the code has no per-customer limit
+    redeemed_at = Column(DATETIME, nullable=False)
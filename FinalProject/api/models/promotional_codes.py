@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DECIMAL, DATETIME, Boolean
+from sqlalchemy import Column, Integer, String, DECIMAL, DATETIME, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..dependencies.database import Base
@@ -6,12 +6,18 @@ from ..dependencies.database import Base
 
 class PromotionalCode(Base):
     __tablename__ = "promotional_codes"
+    __table_args__ = (
+        # Used by the expiry sweeper to find active codes past their expiration date
+        Index("ix_promotional_codes_active_expiry", "is_active", "expiration_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     code = Column(String(50), unique=True, nullable=False, index=True)
     discount_percent = Column(DECIMAL(5, 2), nullable=False)  # e.g., 10.00 for 10%
     expiration_date = Column(DATETIME, nullable=True)
     is_active = Column(Boolean, nullable=False, server_default='1')
+    max_uses = Column(Integer, nullable=True)  # None means unlimited
+    max_uses_per_customer = Column(Integer, nullable=True)
     created_at = Column(DATETIME, nullable=False, server_default=str(datetime.now()))
 
     orders = relationship("Order", back_populates="promo_code")
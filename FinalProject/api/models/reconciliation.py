@@ -0,0 +1,32 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, DECIMAL, DATETIME
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..dependencies.database import Base
+
+
+class ReconciliationRun(Base):
+    __tablename__ = "reconciliation_runs"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    started_at = Column(DATETIME, nullable=False)
+    finished_at = Column(DATETIME, nullable=True)
+    last_order_id = Column(Integer, nullable=False, server_default='0')  # Checkpoint: every order up to here is checked
+    orders_checked = Column(Integer, nullable=False, server_default='0')
+    amount_mismatches = Column(Integer, nullable=False, server_default='0')
+    missing_payments = Column(Integer, nullable=False, server_default='0')
+
+    issues = relationship("ReconciliationIssue", back_populates="run", cascade="all, delete-orphan")
+
+
+class ReconciliationIssue(Base):
+    __tablename__ = "reconciliation_issues"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    run_id = Column(Integer, ForeignKey("reconciliation_runs.id"), nullable=False, index=True)
+    issue = Column(String(30), nullable=False)  # "amount_mismatch" or "missing_payment"
+    order_id = Column(Integer, nullable=False)
+    payment_id = Column(Integer, nullable=True)
+    order_total = Column(DECIMAL(10, 2), nullable=True)
+    payment_amount = Column(DECIMAL(10, 2), nullable=True)
+
+    run = relationship("ReconciliationRun", back_populates="issues")
@@ -13,6 +13,9 @@ class Resource(Base):
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     item = Column(String(100), unique=True, nullable=False)
+    # Stock as of the last compaction; the current level adds the inventory
+    # movements after snapshot_movement_id (see controllers/inventory.py)
     amount = Column(Integer, index=True, nullable=False, server_default='0.0')
+    snapshot_movement_id = Column(Integer, nullable=False, server_default='0')
 
     recipes = relationship("Recipe", back_populates="resource", lazy="select")
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, Float, Index
+from ..dependencies.database import Base
+
+
+class ReviewTerm(Base):
+    """Posting of the review search index: one row per distinct term of a review.
+
+    sandwich_id and rating are copied from the review so search filters
+    never need to join the reviews table.
+    """
+    __tablename__ = "review_terms"
+    __table_args__ = (
+        # Single-term searches read the best postings straight off this index
+        Index("ix_review_terms_rank", "term", "weight"),
+        Index("ix_review_terms_review", "review_id"),
+    )
+
+    term = Column(String(64), primary_key=True)
+    review_id = Column(Integer, ForeignKey("reviews.id"), primary_key=True, autoincrement=False)
+    sandwich_id = Column(Integer, nullable=False)
+    rating = Column(Integer, nullable=False)
+    weight = Column(Float, nullable=False)  # BM25 term-frequency part, length normalised
+
+
+class ReviewTermStat(Base):
+    """How many reviews contain a term, for the inverse document frequency"""
+    __tablename__ = "review_term_stats"
+
+    term = Column(String(64), primary_key=True)
+    doc_count = Column(Integer, nullable=False, server_default='0')
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, DATETIME, Text
+from sqlalchemy import Column, ForeignKey, Integer, String, DATETIME, Text, Index
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from ..dependencies.database import Base
@@ -6,6 +7,12 @@ from ..dependencies.database import Base
 
 class Review(Base):
     __tablename__ = "reviews"
+    __table_args__ = (
+        # Keyset pages of GET /reviews: newest/oldest per sandwich, then by rating per sandwich
+        Index("ix_reviews_sandwich_created", "sandwich_id", "created_at", "id"),
+        Index("ix_reviews_sandwich_rating", "sandwich_id", "rating", "created_at", "id"),
+        Index("ix_reviews_created", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
@@ -13,6 +20,25 @@ class Review(Base):
     rating = Column(Integer, nullable=False)  # 1-5
     review_text = Column(Text, nullable=True)
     created_at = Column(DATETIME, nullable=False, server_default=str(datetime.now()))
+    # Set on reviews that came through POST /reviews/ingest, so a replayed spool can't insert one twice
+    ingest_key = Column(String(36), nullable=True, unique=True)
 
     order = relationship("Order", back_populates="reviews")
     sandwich = relationship("Sandwich", back_populates="reviews")
+
+
+class ReviewRatingCount(Base):
+    """How many live reviews gave a sandwich each rating.
+
+    Kept current by every review write (ingested reviews once per batch), so
+    rating summaries never scan the reviews table. updated_at is stamped on
+    every change; GET /menu versions its ratings by the latest one instead
+    of a shared counter row every review write would have to update.
+    """
+    __tablename__ = "review_rating_counts"
+
+    sandwich_id = Column(Integer, primary_key=True, autoincrement=False)
+    rating = Column(Integer, primary_key=True, autoincrement=False)
+    review_count = Column(Integer, nullable=False, server_default='0')
+    # Microseconds on MySQL too, so two changes in the same second still differ
+    updated_at = Column(DATETIME().with_variant(mysql.DATETIME(fsp=6), "mysql"), nullable=True)
@@ -12,7 +12,11 @@ class Sandwich(Base):
     price = Column(DECIMAL(10, 2), nullable=False, server_default='0.00')
     category = Column(String(50), nullable=True)  # e.g., "vegetarian", "meat", "vegan"
     description = Column(String(500), nullable=True)
+    # is_listed is the manual on/off switch; is_available is kept up to date from it and
+    # sellable_quantity, the number that current stock can make (NULL without a recipe)
+    is_listed = Column(Boolean, nullable=False, server_default='1')
     is_available = Column(Boolean, nullable=False, server_default='1')
+    sellable_quantity = Column(Integer, nullable=True)
 
     recipes = relationship("Recipe", back_populates="sandwich", cascade="all, delete-orphan")
     order_details = relationship("OrderDetail", back_populates="sandwich")
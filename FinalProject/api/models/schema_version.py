@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, DATETIME
+from datetime import datetime
+from ..dependencies.database import Base
+
+
+class SchemaVersion(Base):
+    """Single row holding the fingerprint of the last schema created by model_loader"""
+    __tablename__ = "schema_version"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    fingerprint = Column(String(64), nullable=False)
+    applied_at = Column(DATETIME, nullable=False)
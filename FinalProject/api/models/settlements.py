@@ -0,0 +1,30 @@
+from sqlalchemy import Column, ForeignKey, Integer, DECIMAL, DATETIME, DATE, Enum
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from ..dependencies.database import Base
+from .payments import PaymentMethod
+
+
+class Settlement(Base):
+    __tablename__ = "settlements"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    business_date = Column(DATE, nullable=False, index=True)
+    settled_at = Column(DATETIME, nullable=False)
+    payment_count = Column(Integer, nullable=False, server_default='0')
+    total_amount = Column(DECIMAL(12, 2), nullable=False, server_default='0.00')
+
+    lines = relationship("SettlementLine", back_populates="settlement", cascade="all, delete-orphan")
+
+
+class SettlementLine(Base):
+    """Count and total of one payment method within a settlement"""
+    __tablename__ = "settlement_lines"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    settlement_id = Column(Integer, ForeignKey("settlements.id"), nullable=False, index=True)
+    payment_method = Column(Enum(PaymentMethod), nullable=False)
+    payment_count = Column(Integer, nullable=False)
+    total_amount = Column(DECIMAL(12, 2), nullable=False)
+
+    settlement = relationship("Settlement", back_populates="lines")
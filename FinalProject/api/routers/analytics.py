@@ -3,19 +3,25 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from datetime import datetime
 from ..dependencies.database import get_db
+from ..dependencies.response_cache import CachedRoute, cached
+from ..dependencies.single_flight import coalesced
 from ..models import orders as order_model
 from ..models import order_details as order_detail_model
 from ..models import sandwiches as sandwich_model
 from ..models import reviews as review_model
+from ..controllers import archives as archive_controller
 from decimal import Decimal
 
 router = APIRouter(
     tags=['Analytics'],
-    prefix="/analytics"
+    prefix="/analytics",
+    route_class=CachedRoute
 )
 
 
 @router.get("/revenue")
+@cached(ttl=60, tags=("orders",))
+@coalesced
 def get_revenue(
     date: datetime = Query(None, description="Get revenue for specific date (YYYY-MM-DD)"),
     start_date: datetime = Query(None, description="Start date for revenue range"),
@@ -26,21 +32,19 @@ def get_revenue(
     try:
         query = db.query(func.sum(order_model.Order.total_price))
         
+        start, end = start_date, end_date
         if date:
             # Get revenue for a specific date
             start = datetime.combine(date.date(), datetime.min.time())
             end = datetime.combine(date.date(), datetime.max.time())
-            query = query.filter(
-                order_model.Order.order_date >= start,
-                order_model.Order.order_date <= end
-            )
-        elif start_date or end_date:
-            if start_date:
-                query = query.filter(order_model.Order.order_date >= start_date)
-            if end_date:
-                query = query.filter(order_model.Order.order_date <= end_date)
+        if start:
+            query = query.filter(order_model.Order.order_date >= start)
+        if end:
+            query = query.filter(order_model.Order.order_date <= end)
         
         total_revenue = query.scalar() or Decimal('0.00')
+        if archive_controller.range_needs_archive(db, start):
+            total_revenue += archive_controller.revenue(db, start_date=start, end_date=end) or Decimal('0.00')
         
         return {
             "total_revenue": float(total_revenue),
@@ -53,13 +57,15 @@ def get_revenue(
 
 
 @router.get("/popular-dishes")
+@cached(ttl=60, tags=("orders", "sandwiches"))
+@coalesced
 def get_popular_dishes(
     limit: int = Query(10, description="Number of dishes to return"),
     db: Session = Depends(get_db)
 ):
     """Get most popular dishes based on order count"""
     try:
-        result = db.query(
+        query = db.query(
             sandwich_model.Sandwich,
             func.count(order_detail_model.OrderDetail.id).label('order_count'),
             func.sum(order_detail_model.OrderDetail.amount).label('total_quantity')
@@ -70,14 +76,30 @@ def get_popular_dishes(
             sandwich_model.Sandwich.id
         ).order_by(
             desc('order_count')
-        ).limit(limit).all()
+        )
+        
+        archived = archive_controller.sandwich_stats(db)
+        if not archived:
+            result = [(sandwich, count, int(quantity) if quantity else 0) for sandwich, count, quantity in query.limit(limit).all()]
+        else:
+            # Add the archived rollup to the live counts, including dishes only ordered in the past
+            totals = {sandwich.id: [sandwich, count, int(quantity) if quantity else 0] for sandwich, count, quantity in query.all()}
+            missing = [sandwich_id for sandwich_id in archived if sandwich_id not in totals]
+            if missing:
+                for sandwich in db.query(sandwich_model.Sandwich).filter(sandwich_model.Sandwich.id.in_(missing)):
+                    totals[sandwich.id] = [sandwich, 0, 0]
+            for sandwich_id, stat in archived.items():
+                if sandwich_id in totals:
+                    totals[sandwich_id][1] += stat.order_count
+                    totals[sandwich_id][2] += stat.total_quantity
+            result = sorted(totals.values(), key=lambda row: row[1], reverse=True)[:limit]
         
         return [
             {
                 "sandwich_id": sandwich.id,
                 "sandwich_name": sandwich.sandwich_name,
                 "order_count": count,
-                "total_quantity": int(quantity) if quantity else 0
+                "total_quantity": quantity
             }
             for sandwich, count, quantity in result
         ]
@@ -86,6 +108,8 @@ def get_popular_dishes(
 
 
 @router.get("/complaints")
+@cached(ttl=60, tags=("review_ratings", "sandwiches"))
+@coalesced
 def get_complaints(
     min_rating: int = Query(2, description="Maximum rating to consider as complaint (default: 2)"),
     db: Session = Depends(get_db)
@@ -109,6 +133,8 @@ def get_complaints(
 
 
 @router.get("/dish-ratings/{sandwich_id}")
+@cached(ttl=60, tags=("review_ratings", "sandwiches"))
+@coalesced
 def get_dish_ratings(
     sandwich_id: int,
     db: Session = Depends(get_db)
@@ -131,13 +157,26 @@ def get_dish_ratings(
             review_model.Review.sandwich_id == sandwich_id
         ).first()
         
+        average_rating = float(ratings.avg_rating) if ratings.avg_rating else None
+        review_count = ratings.review_count
+        min_rating = ratings.min_rating
+        max_rating = ratings.max_rating
+        
+        archived = archive_controller.sandwich_stat(db, sandwich_id)
+        if archived and archived.review_count:
+            rating_sum = (average_rating or 0) * review_count + archived.rating_sum
+            review_count += archived.review_count
+            average_rating = rating_sum / review_count
+            min_rating = archived.min_rating if min_rating is None else min(min_rating, archived.min_rating)
+            max_rating = archived.max_rating if max_rating is None else max(max_rating, archived.max_rating)
+        
         return {
             "sandwich_id": sandwich_id,
             "sandwich_name": sandwich.sandwich_name,
-            "average_rating": float(ratings.avg_rating) if ratings.avg_rating else None,
-            "review_count": ratings.review_count,
-            "min_rating": ratings.min_rating,
-            "max_rating": ratings.max_rating
+            "average_rating": average_rating,
+            "review_count": review_count,
+            "min_rating": min_rating,
+            "max_rating": max_rating
         }
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
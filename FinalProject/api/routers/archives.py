@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from ..controllers import archives as controller
+from ..schemas import archives as schema
+from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
+
+router = APIRouter(
+    tags=['Archive'],
+    prefix="/archive"
+)
+
+
+@router.post("/orders", response_model=schema.ArchiveRun)
+@allow_repeated_queries
+def archive_orders(
+    older_than_days: int = Query(None, ge=0, description="Archive completed orders older than this many days"),
+    batch_size: int = Query(None, ge=1, description="Orders moved per transaction"),
+    max_batches: int = Query(None, ge=1, description="Stop after this many batches, run again to resume"),
+    db: Session = Depends(get_db)
+):
+    return controller.archive_orders(db, older_than_days=older_than_days, batch_size=batch_size, max_batches=max_batches)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Query, Response, status
+from ..schemas import cache as schema
+from ..dependencies.response_cache import response_cache
+from ..dependencies.single_flight import single_flight
+
+router = APIRouter(
+    tags=['Response Cache'],
+    prefix="/cache"
+)
+
+
+@router.get("/stats", response_model=schema.ResponseCacheStats)
+def read_stats():
+    return response_cache.stats()
+
+
+@router.get("/single-flight", response_model=schema.SingleFlightStats)
+def read_single_flight():
+    """How many requests to @coalesced endpoints shared another request's run"""
+    return single_flight.stats()
+
+
+@router.post("/invalidate", response_model=schema.ResponseCacheInvalidation)
+def invalidate(tags: list[str] = Query(..., description="Drop every cached response with one of these tags")):
+    """For data changed outside the API, e.g. by a manual SQL fix"""
+    return {"tags": tags, "invalidated": response_cache.invalidate(*tags)}
+
+
+@router.delete("")
+def clear():
+    response_cache.clear()
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
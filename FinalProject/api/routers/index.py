@@ -1,4 +1,4 @@
-from . import orders, order_details, sandwiches, recipes, resources, reviews, promotional_codes, payments, analytics
+from . import orders, order_details, sandwiches, recipes, resources, reviews, promotional_codes, payments, analytics, archives, kitchen, reconciliation, settlements, menu, cache, metrics
 
 
 def load_routes(app):
@@ -11,3 +11,10 @@ def load_routes(app):
     app.include_router(promotional_codes.router)
     app.include_router(payments.router)
     app.include_router(analytics.router)
+    app.include_router(archives.router)
+    app.include_router(kitchen.router)
+    app.include_router(reconciliation.router)
+    app.include_router(settlements.router)
+    app.include_router(menu.router)
+    app.include_router(cache.router)
+    app.include_router(metrics.router)
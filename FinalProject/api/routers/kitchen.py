@@ -0,0 +1,16 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from ..controllers import kitchen as controller
+from ..schemas import kitchen as schema
+from ..dependencies.database import get_db
+
+router = APIRouter(
+    tags=['Kitchen'],
+    prefix="/kitchen"
+)
+
+
+@router.get("/plan", response_model=schema.PrepPlan)
+def read_plan(db: Session = Depends(get_db)):
+    """Pending orders grouped into one batch per sandwich, most urgent batch first"""
+    return controller.read_plan(db)
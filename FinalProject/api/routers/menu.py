@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+from sqlalchemy.orm import Session
+from ..controllers import menu as controller
+from ..dependencies.database import get_db
+
+router = APIRouter(
+    tags=['Menu'],
+    prefix="/menu"
+)
+
+
+def _matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match compares weakly, so a W/ prefix added by a proxy still matches
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+@router.get("")
+def read_menu(request: Request, db: Session = Depends(get_db)):
+    """Sandwiches with availability, average rating and ingredients in one document.
+
+    Send the ETag back in If-None-Match to get a 304 while the menu is unchanged.
+    """
+    etag, body = controller.read_menu(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Response
+from ..dependencies.metrics import registry, CONTENT_TYPE
+
+router = APIRouter(
+    tags=['Metrics'],
+    prefix="/metrics"
+)
+
+
+@router.get("")
+def read_metrics():
+    """Request latency, requests in flight and database work per route, in the Prometheus text format"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,9 +1,17 @@
-from fastapi import APIRouter, Depends, FastAPI, status, Response, Query
+from fastapi import APIRouter, Depends, FastAPI, status, Response, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime
+import json
 from ..controllers import orders as controller
 from ..schemas import orders as schema
+from ..models.orders import OrderStatus
 from ..dependencies.database import engine, get_db
+from ..dependencies.events import broker, order_event, order_topic, KITCHEN_TOPIC
+
+# Idle streams send a comment this often so proxies don't close them
+HEARTBEAT_SECONDS = 15
 
 router = APIRouter(
     tags=['Orders'],
@@ -30,6 +38,118 @@ def read_by_tracking(tracking_number: str, db: Session = Depends(get_db)):
     return controller.read_by_tracking(db, tracking_number=tracking_number)
 
 
+def _sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def _is_completed(event):
+    return event["order_status"] == OrderStatus.COMPLETED.value
+
+
+async def _snapshot(db: Session, tracking_number: str = None):
+    """Current state to send before any change events.
+
+    Runs after subscribing so nothing published in between is lost, and
+    closes the session afterwards so an idle stream never pins a pooled
+    database connection.
+    """
+    try:
+        if tracking_number:
+            order = await run_in_threadpool(controller.read_by_tracking, db, tracking_number)
+            return order_event(order)
+        orders = await run_in_threadpool(controller.read_active, db)
+        return [order_event(order) for order in orders]
+    finally:
+        db.close()
+
+
+async def _events(subscription, snapshot, single_order: bool):
+    """Yield (event_type, data) pairs, a ("keep-alive", None) pair for every idle heartbeat"""
+    try:
+        yield "snapshot", snapshot
+        if single_order and _is_completed(snapshot):
+            return
+        while True:
+            event = await subscription.get(timeout=HEARTBEAT_SECONDS)
+            if event is None:
+                yield "keep-alive", None
+                continue
+            if isinstance(event, list):
+                yield "status-batch", event
+                continue
+            yield "status", event
+            if single_order and _is_completed(event):
+                return
+    finally:
+        subscription.close()
+
+
+async def _event_stream(subscription, snapshot, single_order: bool):
+    async for event_type, data in _events(subscription, snapshot, single_order):
+        if event_type == "keep-alive":
+            yield ": keep-alive\n\n"
+        else:
+            yield _sse(event_type, data)
+
+
+async def _open_stream(db: Session, tracking_number: str = None):
+    topic = order_topic(tracking_number) if tracking_number else KITCHEN_TOPIC
+    subscription = broker.subscribe(topic)
+    try:
+        snapshot = await _snapshot(db, tracking_number)
+    except Exception:
+        subscription.close()
+        raise
+    return subscription, snapshot
+
+
+@router.get("/events")
+async def kitchen_events(db: Session = Depends(get_db)):
+    """Server-sent events: every active order, then each status change as it happens"""
+    subscription, snapshot = await _open_stream(db)
+    return StreamingResponse(
+        _event_stream(subscription, snapshot, single_order=False),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/tracking/{tracking_number}/events")
+async def tracking_events(tracking_number: str, db: Session = Depends(get_db)):
+    """Server-sent events for one order, the stream ends once it is completed"""
+    subscription, snapshot = await _open_stream(db, tracking_number)
+    return StreamingResponse(
+        _event_stream(subscription, snapshot, single_order=True),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def order_events_ws(websocket: WebSocket, tracking_number: str = None, db: Session = Depends(get_db)):
+    """WebSocket version of the event streams, pass tracking_number to follow one order"""
+    await websocket.accept()
+    try:
+        subscription, snapshot = await _open_stream(db, tracking_number)
+    except Exception as e:
+        await websocket.send_json({"type": "error", "detail": getattr(e, "detail", str(e))})
+        await websocket.close()
+        return
+    try:
+        async for event_type, data in _events(subscription, snapshot, single_order=bool(tracking_number)):
+            if event_type != "keep-alive":
+                await websocket.send_json({"type": event_type, "data": data})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.patch("/status", response_model=schema.OrderStatusBulkResult)
+def update_status(request: schema.OrderStatusBulkUpdate, db: Session = Depends(get_db)):
+    """Move many orders to one status in a single statement, reporting each order's outcome"""
+    return controller.update_status(db=db, request=request)
+
+
 @router.get("/{item_id}", response_model=schema.Order)
 def read_one(item_id: int, db: Session = Depends(get_db)):
     return controller.read_one(db, item_id=item_id)
@@ -37,6 +37,12 @@ def read_by_order(order_id: int, db: Session = Depends(get_db)):
     return result
 
 
+@router.post("/{item_id}/process", response_model=schema.Payment)
+def process(item_id: int, db: Session = Depends(get_db)):
+    """Retry a pending or failed card/online payment through the gateway"""
+    return controller.process(db, item_id=item_id)
+
+
 @router.put("/{item_id}", response_model=schema.Payment)
 def update(item_id: int, request: schema.PaymentUpdate, db: Session = Depends(get_db)):
     return controller.update(db=db, request=request, item_id=item_id)
@@ -1,12 +1,18 @@
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from ..controllers import promotional_codes as controller
+from ..controllers import promo_batches
+from ..controllers import promo_sweeper
 from ..schemas import promotional_codes as schema
 from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
+from ..dependencies.response_cache import CachedRoute, cached
 
 router = APIRouter(
     tags=['Promotional Codes'],
-    prefix="/promotional-codes"
+    prefix="/promotional-codes",
+    route_class=CachedRoute
 )
 
 
@@ -15,7 +21,20 @@ def create(request: schema.PromotionalCodeCreate, db: Session = Depends(get_db))
     return controller.create(db=db, request=request)
 
 
+@router.post("/generate")
+@allow_repeated_queries
+def generate(request: schema.PromotionalCodeBatch, db: Session = Depends(get_db)):
+    """Create a campaign of unique codes and stream them back as CSV while they are inserted"""
+    promo_batches.validate(request)
+    return StreamingResponse(
+        promo_batches.generate_csv(db, request),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="promo_codes.csv"'}
+    )
+
+
 @router.get("/", response_model=list[schema.PromotionalCode])
+@cached(ttl=30, tags=("promotional_codes",))
 def read_all(
     is_active: bool = Query(None, description="Filter by active status"),
     db: Session = Depends(get_db)
@@ -23,12 +42,31 @@ def read_all(
     return controller.read_all(db, is_active=is_active)
 
 
+@router.get("/sweeper", response_model=schema.ExpirySweeperStatus)
+def read_sweeper():
+    return promo_sweeper.sweeper.metrics()
+
+
+@router.post("/sweeper/run", response_model=schema.ExpirySweeperStatus)
+@allow_repeated_queries
+def run_sweeper(db: Session = Depends(get_db)):
+    """Deactivate expired codes now instead of waiting for the next interval"""
+    return promo_sweeper.run_now(db)
+
+
 @router.get("/{item_id}", response_model=schema.PromotionalCode)
+@cached(ttl=30, tags=("promotional_codes",))
 def read_one(item_id: int, db: Session = Depends(get_db)):
     return controller.read_one(db, item_id=item_id)
 
 
+@router.get("/{item_id}/usage", response_model=schema.PromotionalCodeUsage)
+def read_usage(item_id: int, db: Session = Depends(get_db)):
+    return controller.read_usage(db, item_id=item_id)
+
+
 @router.get("/code/{code}", response_model=schema.PromotionalCode)
+@cached(ttl=30, tags=("promotional_codes",))
 def read_by_code(code: str, db: Session = Depends(get_db)):
     result = controller.read_by_code(db, code=code)
     if not result:
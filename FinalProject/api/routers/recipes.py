@@ -3,10 +3,12 @@ from sqlalchemy.orm import Session
 from ..controllers import recipes as controller
 from ..schemas import recipes as schema
 from ..dependencies.database import get_db
+from ..dependencies.response_cache import CachedRoute, cached
 
 router = APIRouter(
     tags=['Recipes'],
-    prefix="/recipes"
+    prefix="/recipes",
+    route_class=CachedRoute
 )
 
 
@@ -16,6 +18,7 @@ def create(request: schema.RecipeCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=list[schema.Recipe])
+@cached(ttl=30, tags=("recipes", "resources", "sandwiches"))
 def read_all(
     sandwich_id: int = Query(None, description="Filter by sandwich ID"),
     resource_id: int = Query(None, description="Filter by resource ID"),
@@ -25,6 +28,7 @@ def read_all(
 
 
 @router.get("/{item_id}", response_model=schema.Recipe)
+@cached(ttl=30, tags=("recipes", "resources", "sandwiches"))
 def read_one(item_id: int, db: Session = Depends(get_db)):
     return controller.read_one(db, item_id=item_id)
 
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from ..controllers import reconciliation as controller
+from ..schemas import reconciliation as schema
+from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
+
+router = APIRouter(
+    tags=['Reconciliation'],
+    prefix="/reconciliation"
+)
+
+
+@router.post("/runs", response_model=schema.ReconciliationRun)
+@allow_repeated_queries
+def start_run(
+    resume: bool = Query(True, description="Continue the latest unfinished run instead of starting over"),
+    chunk_size: int = Query(None, ge=1, description="Orders checked per chunk"),
+    max_chunks: int = Query(None, ge=1, description="Stop after this many chunks, call again to resume"),
+    db: Session = Depends(get_db)
+):
+    unfinished = controller.read_latest_unfinished(db) if resume else None
+    return controller.run(db, run_id=unfinished.id if unfinished else None, chunk_size=chunk_size, max_chunks=max_chunks)
+
+
+@router.get("/runs/{run_id}", response_model=schema.ReconciliationRun)
+def read_run(run_id: int, db: Session = Depends(get_db)):
+    return controller.read_one(db, item_id=run_id)
+
+
+@router.get("/runs/{run_id}/issues", response_model=list[schema.ReconciliationIssue])
+def read_issues(
+    run_id: int,
+    issue: str = Query(None, description="amount_mismatch or missing_payment"),
+    after_id: int = Query(0, description="Return issues after this id (use the last id of the previous page)"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    controller.read_one(db, item_id=run_id)
+    return controller.read_issues(db, run_id=run_id, issue=issue, after_id=after_id, limit=limit)
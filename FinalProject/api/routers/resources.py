@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from ..controllers import resources as controller
+from ..controllers import inventory
+from ..controllers import forecast
 from ..schemas import resources as schema
 from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
 
 router = APIRouter(
     tags=['Resources (Ingredients)'],
@@ -15,11 +18,47 @@ def create(request: schema.ResourceCreate, db: Session = Depends(get_db)):
     return controller.create(db=db, request=request)
 
 
+@router.post("/restock", response_model=list[schema.RestockLevel])
+def restock(request: schema.RestockManifest, db: Session = Depends(get_db)):
+    return controller.restock(db=db, request=request)
+
+
 @router.get("/", response_model=list[schema.Resource])
 def read_all(db: Session = Depends(get_db)):
     return controller.read_all(db)
 
 
+@router.get("/forecast", response_model=schema.StockForecast)
+def read_forecast(
+    refresh: bool = Query(False, description="Recompute instead of returning the cached forecast"),
+    db: Session = Depends(get_db)
+):
+    """When each ingredient is projected to run out, soonest first"""
+    return forecast.read_forecast(db, refresh=refresh)
+
+
+@router.get("/compactor", response_model=schema.CompactorStatus)
+def read_compactor():
+    return inventory.compactor.metrics()
+
+
+@router.post("/compactor/run", response_model=schema.CompactorStatus)
+@allow_repeated_queries
+def run_compactor(db: Session = Depends(get_db)):
+    """Fold the inventory ledger into snapshots now instead of waiting for the next interval"""
+    return inventory.run_compaction(db)
+
+
+@router.get("/{item_id}/movements", response_model=list[schema.InventoryMovement])
+def read_movements(
+    item_id: int,
+    after_id: int = Query(0, description="Return movements after this id"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return inventory.read_movements(db, resource_id=item_id, after_id=after_id, limit=limit)
+
+
 @router.get("/{item_id}", response_model=schema.Resource)
 def read_one(item_id: int, db: Session = Depends(get_db)):
     return controller.read_one(db, item_id=item_id)
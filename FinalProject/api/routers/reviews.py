@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Response
 from sqlalchemy.orm import Session
 from ..controllers import reviews as controller
+from ..controllers import review_search
+from ..controllers import review_ingest
+from ..controllers import review_ratings
 from ..schemas import reviews as schema
 from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
 
 router = APIRouter(
     tags=['Reviews'],
@@ -17,11 +21,76 @@ def create(request: schema.ReviewCreate, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=list[schema.Review])
 def read_all(
+    response: Response,
     sandwich_id: int = Query(None, description="Filter by sandwich ID"),
     order_id: int = Query(None, description="Filter by order ID"),
+    min_rating: int = Query(None, ge=1, le=5),
+    max_rating: int = Query(None, ge=1, le=5),
+    sort: str = Query("newest", description="newest, oldest, rating_high or rating_low"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = Query(None, description="X-Next-Cursor header of the previous page"),
     db: Session = Depends(get_db)
 ):
-    return controller.read_all(db, sandwich_id=sandwich_id, order_id=order_id)
+    """One page of reviews; the X-Next-Cursor header is absent on the last page"""
+    items, next_cursor = controller.read_page(
+        db, sandwich_id=sandwich_id, order_id=order_id, min_rating=min_rating, max_rating=max_rating,
+        sort=sort, limit=limit, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+
+@router.get("/search", response_model=schema.ReviewSearchResult)
+def search(
+    q: str = Query(..., min_length=1, description="Words that must all appear in the review"),
+    sandwich_id: int = Query(None, description="Filter by sandwich ID"),
+    min_rating: int = Query(None, ge=1, le=5),
+    max_rating: int = Query(None, ge=1, le=5),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    return controller.search(db, q, sandwich_id=sandwich_id, min_rating=min_rating, max_rating=max_rating, limit=limit)
+
+
+@router.post("/search/reindex")
+@allow_repeated_queries
+def reindex(db: Session = Depends(get_db)):
+    """Rebuild the search index from every review"""
+    return review_search.reindex(db)
+
+
+@router.post("/ingest", response_model=schema.ReviewIngestAck, status_code=202)
+def ingest(request: schema.ReviewCreate, db: Session = Depends(get_db)):
+    """Accept a review into the write-behind buffer, it is written with the next batch"""
+    return review_ingest.submit(db, request)
+
+
+@router.get("/ingest", response_model=schema.ReviewIngestStatus)
+def read_ingest():
+    return review_ingest.ingestor.metrics()
+
+
+@router.post("/ingest/flush", response_model=schema.ReviewIngestStatus)
+@allow_repeated_queries
+def flush_ingest(db: Session = Depends(get_db)):
+    """Write the buffered reviews now instead of waiting for the next batch"""
+    return review_ingest.flush_now(db)
+
+
+@router.get("/ratings", response_model=list[schema.SandwichRatingSummary])
+def read_ratings(
+    sandwich_id: int = Query(None, description="Filter by sandwich ID"),
+    db: Session = Depends(get_db)
+):
+    return review_ratings.summary(db, sandwich_id=sandwich_id)
+
+
+@router.post("/ratings/rebuild")
+@allow_repeated_queries
+def rebuild_ratings(db: Session = Depends(get_db)):
+    """Recount the rating summaries from every review"""
+    return review_ratings.rebuild(db)
 
 
 @router.get("/{item_id}", response_model=schema.Review)
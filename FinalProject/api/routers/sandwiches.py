@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from ..controllers import sandwiches as controller
+from ..controllers import menu_search
 from ..schemas import sandwiches as schema
 from ..dependencies.database import get_db
+from ..dependencies.response_cache import CachedRoute, cached
 
 router = APIRouter(
     tags=['Sandwiches (Menu Items)'],
-    prefix="/sandwiches"
+    prefix="/sandwiches",
+    route_class=CachedRoute
 )
 
 
@@ -16,6 +19,7 @@ def create(request: schema.SandwichCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=list[schema.Sandwich])
+@cached(ttl=30, tags=("sandwiches",))
 def read_all(
     category: str = Query(None, description="Filter by category (e.g., vegetarian)"),
     is_available: bool = Query(None, description="Filter by availability"),
@@ -24,7 +28,25 @@ def read_all(
     return controller.read_all(db, category=category, is_available=is_available)
 
 
+@router.get("/search", response_model=schema.MenuSearchResult)
+def search(
+    q: str = Query(..., min_length=1, description="Words or word beginnings, typos are tolerated"),
+    category: str = Query(None, description="Only this category; facet counts still cover all of them"),
+    available_only: bool = Query(False),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    return menu_search.search(db, q, category=category, available_only=available_only, limit=limit)
+
+
+@router.post("/availability/refresh")
+def refresh_availability(db: Session = Depends(get_db)):
+    """Recompute every sellable quantity, for stock changed outside the API"""
+    return controller.refresh_availability(db)
+
+
 @router.get("/{item_id}", response_model=schema.Sandwich)
+@cached(ttl=30, tags=("sandwiches",))
 def read_one(item_id: int, db: Session = Depends(get_db)):
     return controller.read_one(db, item_id=item_id)
 
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from datetime import date
+from ..controllers import settlements as controller
+from ..schemas import settlements as schema
+from ..dependencies.database import get_db
+from ..dependencies.query_audit import allow_repeated_queries
+
+router = APIRouter(
+    tags=['Settlements'],
+    prefix="/settlements"
+)
+
+
+@router.post("/", response_model=schema.Settlement)
+@allow_repeated_queries
+def create(request: schema.SettlementCreate, db: Session = Depends(get_db)):
+    """End-of-day close: complete the day's pending payments and record totals per method"""
+    return controller.create(db=db, request=request)
+
+
+@router.get("/", response_model=list[schema.Settlement])
+def read_all(
+    business_date: date = Query(None, description="Filter by business date"),
+    db: Session = Depends(get_db)
+):
+    return controller.read_all(db, business_date=business_date)
+
+
+@router.get("/{item_id}", response_model=schema.Settlement)
+def read_one(item_id: int, db: Session = Depends(get_db)):
+    return controller.read_one(db, item_id=item_id)
@@ -0,0 +1,12 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class ArchiveRun(BaseModel):
+    cutoff: datetime
+    batches: int
+    orders_archived: int
+    order_details_archived: int
+    reviews_archived: int
+    payments_archived: int
+    remaining: int  # Eligible orders still live, non-zero when max_batches stopped the run
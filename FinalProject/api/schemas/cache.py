@@ -0,0 +1,42 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class RouteCacheStats(BaseModel):
+    hits: int
+    misses: int
+
+
+class ResponseCacheStats(BaseModel):
+    enabled: bool
+    backend: str
+    entries: int
+    bytes: int
+    max_bytes: int
+    hits: int
+    misses: int
+    hit_ratio: Optional[float] = None
+    stores: int
+    evictions: int
+    invalidated: int
+    errors: int
+    routes: dict[str, RouteCacheStats]  # route path -> lookups of that route
+
+
+class ResponseCacheInvalidation(BaseModel):
+    tags: list[str]
+    invalidated: int
+
+
+class RouteSingleFlightStats(BaseModel):
+    executions: int
+    coalesced: int
+
+
+class SingleFlightStats(BaseModel):
+    in_flight: int
+    executions: int  # runs that actually computed a result
+    coalesced: int  # requests that got the result of a run started by another
+    coalesced_ratio: Optional[float] = None
+    errors: int
+    routes: dict[str, RouteSingleFlightStats]
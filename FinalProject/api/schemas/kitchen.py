@@ -0,0 +1,19 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class PrepBatch(BaseModel):
+    sequence: int
+    sandwich_id: int
+    sandwich_name: Optional[str] = None
+    quantity: int
+    order_ids: list[int]  # Most urgent first
+    has_delivery: bool
+    oldest_order_date: Optional[datetime] = None
+
+
+class PrepPlan(BaseModel):
+    generated_at: datetime
+    pending_orders: int
+    batches: list[PrepBatch]
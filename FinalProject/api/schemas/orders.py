@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from .order_details import OrderDetail
 
 
@@ -26,6 +26,25 @@ class OrderUpdate(BaseModel):
     order_status: Optional[str] = None  # "pending", "preparing", "ready", "completed"
 
 
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: list[int] = []
+    tracking_numbers: list[str] = []
+    order_status: str  # Target status, see STATUS_TRANSITIONS for what may move there
+
+
+class OrderStatusOutcome(BaseModel):
+    order_id: Optional[int] = None
+    tracking_number: Optional[str] = None
+    outcome: str  # "updated", "unchanged", "illegal_transition" or "not_found"
+    previous_status: Optional[str] = None
+
+
+class OrderStatusBulkResult(BaseModel):
+    order_status: str
+    updated: int
+    results: list[OrderStatusOutcome]
+
+
 class Order(OrderBase):
     id: int
     order_date: Optional[datetime] = None
@@ -34,5 +53,11 @@ class Order(OrderBase):
     total_price: Optional[float] = None
     order_details: Optional[list[OrderDetail]] = None
 
+    @field_validator("promo_code", mode="before")
+    @classmethod
+    def promo_code_string(cls, value):
+        # Read from the model this is the PromotionalCode relationship, show its code
+        return getattr(value, "code", value)
+
     class ConfigDict:
         from_attributes = True
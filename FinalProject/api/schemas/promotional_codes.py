@@ -8,6 +8,8 @@ class PromotionalCodeBase(BaseModel):
     discount_percent: float = Field(..., ge=0, le=100)
     expiration_date: Optional[datetime] = None
     is_active: bool = True
+    max_uses: Optional[int] = Field(None, ge=0)
+    max_uses_per_customer: Optional[int] = Field(None, ge=1)
 
 
 class PromotionalCodeCreate(PromotionalCodeBase):
@@ -19,6 +21,37 @@ class PromotionalCodeUpdate(BaseModel):
     discount_percent: Optional[float] = Field(None, ge=0, le=100)
     expiration_date: Optional[datetime] = None
     is_active: Optional[bool] = None
+    max_uses: Optional[int] = Field(None, ge=0)
+    max_uses_per_customer: Optional[int] = Field(None, ge=1)
+
+
+class PromotionalCodeBatch(BaseModel):
+    pattern: str = Field(..., min_length=1)  # e.g. "SUMMER-####-####", every # becomes a random character
+    count: int = Field(..., ge=1, le=1000000)
+    discount_percent: float = Field(..., ge=0, le=100)
+    expiration_date: Optional[datetime] = None
+    is_active: bool = True
+    max_uses: Optional[int] = Field(1, ge=0)  # Campaign codes are single use unless told otherwise
+    max_uses_per_customer: Optional[int] = Field(None, ge=1)
+
+
+class PromotionalCodeUsage(BaseModel):
+    promo_code_id: int
+    max_uses: Optional[int] = None
+    used: int
+    remaining: Optional[int] = None
+
+
+class ExpirySweeperStatus(BaseModel):
+    running: bool
+    interval_seconds: Optional[float] = None
+    runs: int
+    failures: int
+    deactivated_total: int
+    last_run_at: Optional[datetime] = None
+    last_deactivated: int
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
 
 
 class PromotionalCode(PromotionalCodeBase):
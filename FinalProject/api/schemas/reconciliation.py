@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class ReconciliationRun(BaseModel):
+    id: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    last_order_id: int
+    orders_checked: int
+    amount_mismatches: int
+    missing_payments: int
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class ReconciliationIssue(BaseModel):
+    id: int
+    issue: str
+    order_id: int
+    payment_id: Optional[int] = None
+    order_total: Optional[float] = None
+    payment_amount: Optional[float] = None
+
+    class ConfigDict:
+        from_attributes = True
@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class ResourceBase(BaseModel):
@@ -22,3 +22,61 @@ class Resource(ResourceBase):
 
     class ConfigDict:
         from_attributes = True
+
+
+class RestockLine(BaseModel):
+    id: Optional[int] = None  # Either the resource id ...
+    item: Optional[str] = None  # ... or its name; unknown names are created
+    delta: int  # Negative to correct a count down
+
+
+class RestockManifest(BaseModel):
+    items: list[RestockLine] = Field(..., min_length=1)
+
+
+class RestockLevel(BaseModel):
+    id: int
+    item: str
+    amount: int
+    delta: int
+    created: bool = False
+
+
+class InventoryMovement(BaseModel):
+    id: int
+    resource_id: int
+    delta: int
+    reason: str  # "order", "restock", "adjustment", "hold" or "release"
+    order_id: Optional[int] = None
+    note: Optional[str] = None
+    created_at: datetime
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class CompactorStatus(BaseModel):
+    running: bool
+    interval_seconds: Optional[float] = None
+    runs: int
+    failures: int
+    totals: dict
+    last_run_at: Optional[datetime] = None
+    last_result: Optional[dict] = None
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class ResourceForecast(BaseModel):
+    resource_id: int
+    item: str
+    level: int
+    daily_consumption: float  # average units ordered per day over the history window
+    stockout_at: Optional[datetime] = None  # None if it lasts beyond the horizon
+    days_left: Optional[float] = None
+
+
+class StockForecast(BaseModel):
+    generated_at: datetime
+    horizon_days: int
+    resources: list[ResourceForecast]
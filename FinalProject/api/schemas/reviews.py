@@ -28,3 +28,42 @@ class Review(ReviewBase):
 
     class ConfigDict:
         from_attributes = True
+
+
+class ReviewSearchHit(BaseModel):
+    score: float
+    review: Review
+
+
+class ReviewSearchResult(BaseModel):
+    query: str
+    terms: list[str]  # Words actually searched for, after stemming and stopwords
+    results: list[ReviewSearchHit]
+
+
+class ReviewIngestAck(BaseModel):
+    ingest_key: str
+    durability: str  # what already holds: "memory", "spool" or "fsync"
+    buffered: int
+
+
+class ReviewIngestStatus(BaseModel):
+    running: bool
+    interval_seconds: Optional[float] = None
+    durability: str
+    buffered: int
+    accepted: int
+    runs: int
+    failures: int
+    totals: dict
+    last_run_at: Optional[datetime] = None
+    last_result: Optional[dict] = None
+    last_duration_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class SandwichRatingSummary(BaseModel):
+    sandwich_id: int
+    review_count: int
+    average_rating: float
+    histogram: dict[int, int]  # rating -> number of reviews
@@ -25,6 +25,24 @@ class SandwichUpdate(BaseModel):
 
 class Sandwich(SandwichBase):
     id: int
+    sellable_quantity: Optional[int] = None  # None when the sandwich has no recipe
 
     class ConfigDict:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class MenuSearchHit(BaseModel):
+    id: int
+    sandwich_name: str
+    price: float
+    category: Optional[str] = None
+    description: Optional[str] = None
+    is_available: bool
+    score: float
+
+
+class MenuSearchResult(BaseModel):
+    query: str
+    total: int  # matches before limit, after the category filter
+    results: list[MenuSearchHit]
+    facets: dict[str, dict[str, int]]  # facet -> value -> matches, e.g. {"category": {"vegan": 3}}
@@ -0,0 +1,29 @@
+from datetime import datetime, date
+from typing import Optional
+from pydantic import BaseModel
+
+
+class SettlementCreate(BaseModel):
+    business_date: Optional[date] = None  # Defaults to today
+    payment_methods: Optional[list[str]] = None  # Defaults to methods the gateway does not settle (cash)
+
+
+class SettlementLine(BaseModel):
+    payment_method: str
+    payment_count: int
+    total_amount: float
+
+    class ConfigDict:
+        from_attributes = True
+
+
+class Settlement(BaseModel):
+    id: int
+    business_date: date
+    settled_at: datetime
+    payment_count: int
+    total_amount: float
+    lines: list[SettlementLine] = []
+
+    class ConfigDict:
+        from_attributes = True
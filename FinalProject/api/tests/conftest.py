@@ -0,0 +1,29 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from ..dependencies.config import conf
+from ..dependencies.database import Base
+from ..models import model_loader  # noqa: F401, registers every table on Base.metadata
+
+
+@pytest.fixture(autouse=True)
+def strict_queries(monkeypatch):
+    """Any request in a test that repeats a statement shape too often fails the test"""
+    monkeypatch.setattr(conf, "query_strict", True)
+
+
+@pytest.fixture
+def db():
+    """A session on a fresh in-memory SQLite database with foreign keys enforced like MySQL"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+    @event.listens_for(engine, "connect")
+    def foreign_keys_on(connection, record):
+        connection.execute("PRAGMA foreign_keys=ON")
+
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    yield session
+    session.close()
+    engine.dispose()
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import event
+from ..controllers import archives as controller
+from ..routers import analytics
+from ..models import archives as model
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.order_details import OrderDetail
+from ..models.payments import Payment, PaymentMethod, PaymentStatus
+from ..models.promo_redemptions import PromoRedemption
+from ..models.promotional_codes import PromotionalCode
+from ..models.reviews import Review
+from ..models.sandwiches import Sandwich
+
+
+def add_order(db, sandwich_id, amount, total, days_ago, order_status=OrderStatus.COMPLETED, rating=None):
+    order = Order(
+        customer_name="Ada", order_date=datetime.now() - timedelta(days=days_ago), order_type=OrderType.TAKEOUT,
+        order_status=order_status, total_price=Decimal(total)
+    )
+    db.add(order)
+    db.flush()
+    db.add(OrderDetail(order_id=order.id, sandwich_id=sandwich_id, amount=amount))
+    payment = Payment(
+        order_id=order.id, amount=Decimal(total), payment_method=PaymentMethod.CASH,
+        payment_status=PaymentStatus.COMPLETED, payment_date=order.order_date
+    )
+    db.add(payment)
+    db.flush()
+    order.payment_id = payment.id
+    if rating is not None:
+        db.add(Review(order_id=order.id, sandwich_id=sandwich_id, rating=rating, created_at=order.order_date))
+    db.commit()
+    return order.id
+
+
+def seed(db):
+    blt = Sandwich(sandwich_name="BLT", price=Decimal("5.00"))
+    club = Sandwich(sandwich_name="Club", price=Decimal("7.00"))
+    db.add_all([blt, club])
+    db.commit()
+    old = [
+        add_order(db, blt.id, 2, "10.00", 100, rating=4),
+        add_order(db, blt.id, 1, "5.00", 90, rating=2),
+        add_order(db, club.id, 3, "21.00", 80),
+    ]
+    recent = add_order(db, blt.id, 1, "5.00", 1)
+    unfinished = add_order(db, club.id, 1, "7.00", 100, order_status=OrderStatus.READY)
+    return blt, club, old, [recent, unfinished]
+
+
+def test_archive_batch_moves_old_completed_orders_and_rolls_them_up(db):
+    blt, club, old, kept = seed(db)
+
+    counts = controller.archive_batch(db, datetime.now() - timedelta(days=30), batch_size=10)
+
+    assert counts == {"orders": 3, "order_details": 3, "reviews": 2, "payments": 3}
+    assert sorted(row.id for row in db.query(Order)) == sorted(kept)
+    assert db.query(Payment).count() == 2
+    assert db.query(Review).count() == 0
+    assert sorted(row.id for row in db.query(model.ArchivedOrder)) == sorted(old)
+    assert db.query(model.ArchivedReview).count() == 2
+
+    stats = controller.sandwich_stats(db)
+    assert (stats[blt.id].order_count, stats[blt.id].total_quantity) == (2, 3)
+    assert (stats[blt.id].review_count, stats[blt.id].rating_sum) == (2, 6)
+    assert (stats[blt.id].min_rating, stats[blt.id].max_rating) == (2, 4)
+    assert (stats[club.id].order_count, stats[club.id].total_quantity, stats[club.id].review_count) == (1, 3, 0)
+
+
+def test_archive_batch_stops_at_batch_size_and_adds_to_the_rollup(db):
+    blt, club, old, kept = seed(db)
+    cutoff = datetime.now() - timedelta(days=30)
+
+    assert controller.archive_batch(db, cutoff, batch_size=2)["orders"] == 2
+    assert controller.archive_batch(db, cutoff, batch_size=2)["orders"] == 1
+    assert controller.archive_batch(db, cutoff, batch_size=2)["orders"] == 0
+
+    stats = controller.sandwich_stats(db)
+    assert (stats[blt.id].order_count, stats[blt.id].review_count) == (2, 2)
+    assert stats[club.id].total_quantity == 3
+
+
+def test_redeemed_orders_are_archived_and_keep_counting_against_the_code(db):
+    blt, club, old, kept = seed(db)
+    code = PromotionalCode(code="SAVE10", discount_percent=10, is_active=True,
+                           expiration_date=datetime.now() + timedelta(days=30))
+    db.add(code)
+    db.flush()
+    db.add(PromoRedemption(promo_code_id=code.id, order_id=old[0], customer_key="ada", redeemed_at=datetime.now()))
+    db.commit()
+
+    counts = controller.archive_batch(db, datetime.now() - timedelta(days=30), batch_size=10)
+
+    assert counts["orders"] == 3
+    assert db.query(Order).filter(Order.id == old[0]).count() == 0
+    assert [r.order_id for r in db.query(PromoRedemption)] == [old[0]]
+
+
+def test_read_all_loads_archived_details_in_one_query(db):
+    seed(db)
+    controller.archive_batch(db, datetime.now() - timedelta(days=30), batch_size=10)
+    db.expire_all()
+    statements = []
+    event.listen(db.bind, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    orders = controller.read_all(db)
+    details = [detail.amount for order in orders for detail in order.order_details]
+
+    assert sorted(details) == [1, 2, 3]
+    assert len(statements) == 2
+
+
+def test_revenue_adds_archived_orders_in_range(db):
+    seed(db)
+    controller.archive_batch(db, datetime.now() - timedelta(days=30), batch_size=10)
+
+    everything = analytics.get_revenue(date=None, start_date=None, end_date=None, db=db)
+    recent = analytics.get_revenue(date=None, start_date=datetime.now() - timedelta(days=7), end_date=None, db=db)
+    older = analytics.get_revenue(
+        date=None, start_date=datetime.now() - timedelta(days=95), end_date=datetime.now() - timedelta(days=85), db=db
+    )
+
+    assert everything["total_revenue"] == 48.0
+    assert recent["total_revenue"] == 5.0
+    assert older["total_revenue"] == 5.0
+
+
+def test_popular_dishes_merges_the_archived_rollup(db):
+    blt, club, old, kept = seed(db)
+    controller.archive_batch(db, datetime.now() - timedelta(days=30), batch_size=10)
+
+    dishes = analytics.get_popular_dishes(limit=10, db=db)
+
+    assert [(d["sandwich_id"], d["order_count"], d["total_quantity"]) for d in dishes] == [
+        (blt.id, 3, 4), (club.id, 2, 4)
+    ]
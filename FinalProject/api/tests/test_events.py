@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from ..dependencies.events import EventBroker
+
+
+def test_publish_from_worker_thread_reaches_subscriber():
+    """Controllers publish from the threadpool, subscribers read on the event loop"""
+    broker = EventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe("order:TRK-1")
+        thread = threading.Thread(target=broker.publish, args=("order:TRK-1", {"order_status": "ready"}))
+        thread.start()
+        event = await subscription.get(timeout=1)
+        subscription.close()
+        return event
+
+    assert asyncio.run(scenario()) == {"order_status": "ready"}
+    assert broker.subscriber_count() == 0
+
+
+def test_slow_subscriber_keeps_only_newest_events():
+    broker = EventBroker(queue_size=2)
+
+    async def scenario():
+        subscription = broker.subscribe("kitchen")
+        for status in ["pending", "preparing", "ready"]:
+            broker.publish("kitchen", status)
+        await asyncio.sleep(0)
+        events = [await subscription.get(timeout=1), await subscription.get(timeout=1)]
+        assert await subscription.get(timeout=0.01) is None
+        return events
+
+    assert asyncio.run(scenario()) == ["preparing", "ready"]
+
+
+def test_publish_only_reaches_matching_topic():
+    broker = EventBroker()
+
+    async def scenario():
+        subscription = broker.subscribe("order:TRK-1")
+        delivered = broker.publish("order:TRK-2", {"order_status": "ready"})
+        await asyncio.sleep(0)
+        return delivered, await subscription.get(timeout=0.01)
+
+    assert asyncio.run(scenario()) == (0, None)
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+from ..controllers import forecast as controller
+
+
+def test_projects_stockout_from_steady_consumption(mocker):
+    now = datetime(2026, 3, 2, 12, 30)
+    # Resource 1 used 2 units every hour for the last two days
+    rows = [(i + 1, 1, now - timedelta(hours=i), -2) for i in range(48)]
+    db = mocker.Mock()
+    db.query.return_value.filter.return_value.order_by.return_value.all.return_value = rows
+    forecaster = controller.DepletionForecaster(bucket_hours=1, history_days=7, horizon_days=7, ttl_seconds=0)
+
+    assert forecaster.refresh(db, now) == 48
+    projected = forecaster.project({1: 24, 2: 10}, now)
+
+    per_day, stockout = projected[1]
+    assert per_day == 48
+    assert stockout == datetime(2026, 3, 2, 13) + timedelta(hours=12)
+    assert projected[2] == (0.0, None)
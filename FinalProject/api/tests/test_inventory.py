@@ -0,0 +1,71 @@
+import pytest
+from ..controllers import inventory as controller
+from ..models import resources as resource_model
+
+HOLD = controller.model.MovementReason.HOLD
+RELEASE = controller.model.MovementReason.RELEASE
+ORDER = controller.model.MovementReason.ORDER
+
+
+@pytest.fixture
+def bread(db):
+    db.add(resource_model.Resource(item="Bread", amount=100))
+    db.commit()
+    return 1
+
+
+def movements(db):
+    return [(m.reason, m.delta, m.order_id) for m in db.query(controller.model.InventoryMovement).order_by("id")]
+
+
+def test_hold_appends_first_and_checks_without_locking(mocker):
+    levels = mocker.patch.object(controller, "levels", return_value={1: 496, 2: 298})
+    record = mocker.patch.object(controller, "record")
+    db = mocker.Mock()
+
+    token, short = controller.hold(db, {1: 4, 2: 2})
+
+    assert token and short == {}
+    record.assert_called_once_with(db, [(1, -4), (2, -2)], HOLD, note=token)
+    db.commit.assert_called_once()
+    levels.assert_called_once_with(db, [1, 2])
+
+
+def test_holds_one_after_another_cannot_oversell(db, bread):
+    outcomes = [controller.hold(db, {bread: 50}) for _ in range(3)]
+
+    assert [short for _, short in outcomes] == [{}, {}, {bread: (50, 0)}]
+    assert outcomes[2][0] is None
+    assert controller.levels(db, [bread]) == {bread: 0}
+    # The refused hold was given back right away
+    assert movements(db)[-2:] == [(HOLD, -50, None), (RELEASE, 50, None)]
+
+
+def test_confirmed_hold_becomes_the_orders_movement(db, bread):
+    token, _ = controller.hold(db, {bread: 30})
+
+    controller.confirm(db, token, {bread: 30}, order_id=7)
+    db.commit()
+
+    assert controller.levels(db, [bread]) == {bread: 70}
+    assert movements(db) == [(HOLD, -30, None), (RELEASE, 30, None), (ORDER, -30, 7)]
+    assert controller.release_stale_holds(db, older_than_seconds=0) == 0
+
+
+def test_hold_of_a_failed_order_is_released(db, bread):
+    token, _ = controller.hold(db, {bread: 30})
+    controller.confirm(db, token, {bread: 30}, order_id=7)
+    db.rollback()  # The order failed
+
+    controller.release(db, token, {bread: 30})
+
+    assert controller.levels(db, [bread]) == {bread: 100}
+
+
+def test_stale_holds_are_released_by_the_sweep(db, bread):
+    controller.hold(db, {bread: 30})
+
+    assert controller.release_stale_holds(db, older_than_seconds=3600) == 0
+    assert controller.release_stale_holds(db, older_than_seconds=0) == 1
+    assert controller.release_stale_holds(db, older_than_seconds=0) == 0
+    assert controller.levels(db, [bread]) == {bread: 100}
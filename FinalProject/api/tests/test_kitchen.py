@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+import time
+from ..controllers.kitchen import KitchenScheduler
+from ..models.orders import OrderType, OrderStatus
+
+
+class FakeOrder:
+    def __init__(self, order_id, order_type, minutes_ago, order_status=OrderStatus.PENDING):
+        self.id = order_id
+        self.order_type = order_type
+        self.order_date = datetime.now() - timedelta(minutes=minutes_ago)
+        self.order_status = order_status
+        self.order_details = []
+
+
+def make_scheduler():
+    scheduler = KitchenScheduler(resync_seconds=3600)
+    scheduler._loaded_at = time.monotonic()  # Skip the initial database load
+    return scheduler
+
+
+def test_identical_sandwiches_are_batched_across_orders(mocker):
+    scheduler = make_scheduler()
+    scheduler.add_order(FakeOrder(1, OrderType.TAKEOUT, 10), [(7, 2)])
+    scheduler.add_order(FakeOrder(2, OrderType.TAKEOUT, 5), [(7, 1), (8, 1)])
+
+    plan = scheduler.plan(mocker.Mock())
+
+    assert plan["pending_orders"] == 2
+    assert plan["batches"][0]["sandwich_id"] == 7
+    assert plan["batches"][0]["quantity"] == 3
+    assert plan["batches"][0]["order_ids"] == [1, 2]
+
+
+def test_delivery_orders_come_before_older_takeout(mocker):
+    scheduler = make_scheduler()
+    scheduler.add_order(FakeOrder(1, OrderType.TAKEOUT, 30), [(7, 1)])
+    scheduler.add_order(FakeOrder(2, OrderType.DELIVERY, 1), [(8, 1)])
+
+    plan = scheduler.plan(mocker.Mock())
+
+    assert [batch["sandwich_id"] for batch in plan["batches"]] == [8, 7]
+    assert plan["batches"][0]["has_delivery"] is True
+
+
+def test_order_leaves_plan_when_it_stops_being_pending(mocker):
+    scheduler = make_scheduler()
+    order = FakeOrder(1, OrderType.TAKEOUT, 10)
+    scheduler.add_order(order, [(7, 2)])
+    scheduler.add_order(FakeOrder(2, OrderType.TAKEOUT, 5), [(7, 1)])
+
+    order.order_status = OrderStatus.PREPARING
+    scheduler.order_changed(order)
+    plan = scheduler.plan(mocker.Mock())
+
+    assert plan["batches"][0]["order_ids"] == [2]
+    assert plan["batches"][0]["quantity"] == 1
+
+
+def test_resync_without_pending_orders_empties_the_plan(mocker):
+    scheduler = make_scheduler()
+    scheduler.add_order(FakeOrder(1, OrderType.TAKEOUT, 10), [(7, 2)])
+    assert scheduler.plan(mocker.Mock())["pending_orders"] == 1
+
+    db = mocker.Mock()
+    db.query.return_value.join.return_value.filter.return_value.all.return_value = []
+    scheduler._loaded_at = None
+    plan = scheduler.plan(db)
+
+    assert plan == {"pending_orders": 0, "batches": []}
@@ -0,0 +1,44 @@
+from ..controllers import menu as controller
+from ..controllers import review_ratings
+from ..models.cache_versions import CacheVersion
+from ..models.sandwiches import Sandwich
+from ..routers.menu import _matches
+
+
+def test_document_is_reused_while_versions_are_unchanged(mocker):
+    versions = mocker.patch.object(controller.cache_versions, "current_many",
+                                   return_value=dict.fromkeys(controller.VERSION_NAMES, 3))
+    mocker.patch.object(controller, "ratings_version", return_value="0")
+    load = mocker.patch.object(controller.MenuCache, "_load", return_value=("3.3.3.0", '"abc"', b"{}"))
+    cache = controller.MenuCache(refresh_seconds=0)
+    db = mocker.Mock()
+
+    assert cache.get(db) == ('"abc"', b"{}")
+    assert cache.get(db) == ('"abc"', b"{}")
+
+    assert versions.call_count == 2
+    load.assert_called_once_with(db, "3.3.3.0")
+
+
+def test_review_writes_change_the_menu_without_a_shared_version_row(db):
+    db.add(Sandwich(sandwich_name="BLT", price=5))
+    db.commit()
+    cache = controller.MenuCache(refresh_seconds=0)
+    empty, _ = cache.get(db)
+
+    review_ratings.apply(db, review_ratings.count({}, 1, 4))
+    db.commit()
+    rated, body = cache.get(db)
+    review_ratings.apply(db, review_ratings.count({}, 1, 2))
+    db.commit()
+
+    assert rated != empty and b'"average_rating":4.0' in body
+    assert b'"average_rating":3.0' in cache.get(db)[1]
+    assert db.query(CacheVersion).count() == 0
+
+
+def test_if_none_match_accepts_lists_and_weak_tags():
+    assert _matches('"x", W/"abc"', '"abc"')
+    assert _matches("*", '"abc"')
+    assert not _matches('"abcd"', '"abc"')
+    assert not _matches(None, '"abc"')
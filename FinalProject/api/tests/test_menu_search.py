@@ -0,0 +1,29 @@
+from ..controllers import menu_search as controller
+
+
+def _index():
+    return controller.MenuIndex([
+        {"id": 1, "sandwich_name": "Chicken Club", "price": 8.0, "category": "meat",
+         "description": "Grilled chicken and bacon", "is_available": True},
+        {"id": 2, "sandwich_name": "Caprese", "price": 7.0, "category": "vegetarian",
+         "description": "Mozzarella, tomato and basil", "is_available": True},
+        {"id": 3, "sandwich_name": "Crème Brûlée Toastie", "price": 5.0, "category": "dessert",
+         "description": None, "is_available": False},
+    ])
+
+
+def test_prefix_and_typo_matches_are_ranked_below_exact_ones():
+    index = _index()
+
+    assert [hit["id"] for hit in index.search("chiken")["results"]] == [1]
+    assert [hit["id"] for hit in index.search("mozarela tom")["results"]] == [2]
+    assert [hit["id"] for hit in index.search("creme")["results"]] == [3]
+    assert index.search("chicken")["results"][0]["score"] > index.search("chick")["results"][0]["score"]
+
+
+def test_facets_ignore_the_category_filter():
+    result = _index().search("c", category="Vegetarian")
+
+    assert [hit["id"] for hit in result["results"]] == [2]
+    assert result["facets"]["category"] == {"dessert": 1, "meat": 1, "vegetarian": 1}
+    assert _index().search("toastie", available_only=True)["total"] == 0
@@ -0,0 +1,35 @@
+import json
+import time
+from ..dependencies import metrics
+
+
+def test_histogram_buckets_are_rendered_cumulatively():
+    registry = metrics.Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), (0.1, 1.0))
+    for amount in (0.05, 0.5, 0.7, 3.0):
+        registry.observe(latency, ("/orders/",), amount)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE latency_seconds histogram" in lines
+    assert 'latency_seconds_bucket{route="/orders/",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/orders/",le="1"} 3' in lines
+    assert 'latency_seconds_bucket{route="/orders/",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{route="/orders/"} 4' in lines
+
+
+def test_workers_are_added_up_and_stale_gauges_dropped(tmp_path, mocker):
+    mocker.patch.object(metrics.conf, "metrics_dir", str(tmp_path))
+    registry = metrics.Registry()
+    latency = registry.histogram("latency_seconds", "Latency", ("route",), (1.0,))
+    in_flight = registry.gauge("in_flight", "In flight", ())
+    registry.observe(latency, ("/menu",), 0.5)
+    registry.add(in_flight, (), 2)
+    exited = registry.snapshot()
+    exited["written_at"] = time.time() - 3600
+    (tmp_path / "metrics-1.json").write_text(json.dumps(exited))
+
+    lines = registry.render().splitlines()
+
+    assert 'latency_seconds_count{route="/menu"} 2' in lines
+    assert "in_flight 2" in lines
@@ -0,0 +1,107 @@
+import logging
+import pytest
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+from ..models import model_loader
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    monkeypatch.setattr(model_loader, "engine", engine)
+    yield engine
+    engine.dispose()
+
+
+def stored_fingerprint(engine):
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT fingerprint FROM schema_version WHERE id = 1")).scalar()
+
+
+def test_create_mode_creates_every_table_before_returning(engine):
+    assert model_loader.startup("create") is None
+
+    assert set(model_loader.Base.metadata.tables) <= set(inspect(engine).get_table_names())
+
+
+def test_check_mode_creates_once_then_only_compares_the_fingerprint(engine, mocker):
+    warm_pool = mocker.patch.object(model_loader, "warm_pool")
+
+    model_loader.startup("check").join()
+
+    assert stored_fingerprint(engine) == model_loader.schema_fingerprint()
+    warm_pool.assert_called_once()
+    create_all = mocker.spy(model_loader.Base.metadata, "create_all")
+    assert model_loader.ensure_schema() is False
+    create_all.assert_not_called()
+
+
+def test_skip_mode_only_warms_the_pool(engine, mocker):
+    warm_pool = mocker.patch.object(model_loader, "warm_pool")
+
+    model_loader.startup("skip").join()
+
+    warm_pool.assert_called_once()
+    assert inspect(engine).get_table_names() == []
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        model_loader.startup("migrate")
+
+
+def test_check_mode_reports_columns_create_all_cannot_add(engine, caplog):
+    # reviews as it was before ingest_key was added
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE reviews (id INTEGER PRIMARY KEY, order_id INTEGER NOT NULL, sandwich_id INTEGER NOT NULL, "
+            "rating INTEGER NOT NULL, review_text TEXT, created_at DATETIME NOT NULL)"
+        ))
+
+    with caplog.at_level(logging.ERROR, logger=model_loader.__name__):
+        assert model_loader.ensure_schema() is True
+
+    assert "ALTER TABLE reviews ADD COLUMN ingest_key VARCHAR(36)" in caplog.text
+    assert "ALTER TABLE reviews ADD UNIQUE (ingest_key)" in caplog.text
+    assert "CREATE INDEX ix_reviews_sandwich_rating ON reviews" in caplog.text
+    # Not recorded as up to date, so the next start checks again
+    assert stored_fingerprint(engine) is None
+    with engine.connect() as connection:
+        assert model_loader.schema_drift(connection)
+
+
+def test_drift_reports_foreign_keys_the_models_dropped(engine):
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE orders (id INTEGER PRIMARY KEY)"))
+        connection.execute(text(
+            "CREATE TABLE promo_redemptions (id INTEGER PRIMARY KEY, promo_code_id INTEGER NOT NULL, "
+            "order_id INTEGER NOT NULL, customer_key VARCHAR(100) NOT NULL, slot INTEGER, redeemed_at DATETIME NOT NULL, "
+            "CONSTRAINT promo_redemptions_ibfk_2 FOREIGN KEY (order_id) REFERENCES orders (id))"
+        ))
+        drift = model_loader.schema_drift(connection)
+
+    assert "ALTER TABLE promo_redemptions DROP FOREIGN KEY promo_redemptions_ibfk_2" in drift
+
+
+def test_fingerprint_covers_foreign_keys_and_server_defaults():
+    def fingerprint(foreign_key=True, default="0"):
+        metadata = MetaData()
+        Table("sandwiches", metadata, Column("id", Integer, primary_key=True))
+        Table(
+            "menu_items", metadata,
+            Column("id", Integer, primary_key=True),
+            Column("sandwich_id", Integer, ForeignKey("sandwiches.id") if foreign_key else None),
+            Column("status", String(10), server_default=default),
+        )
+        return model_loader.schema_fingerprint(metadata)
+
+    assert fingerprint() == fingerprint()
+    assert fingerprint(foreign_key=False) != fingerprint()
+    assert fingerprint(default="1") != fingerprint()
+
+
+def test_fingerprint_ignores_the_import_time_stamped_into_datetime_defaults():
+    orders = model_loader.Base.metadata.tables["orders"]
+    assert model_loader._server_default(orders.c.order_date) == "timestamp"
+    assert model_loader._server_default(orders.c.total_price) == "0.00"
+    assert model_loader._server_default(orders.c.customer_name) == ""
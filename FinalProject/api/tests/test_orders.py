@@ -2,6 +2,7 @@ from fastapi.testclient import TestClient
 from ..controllers import orders as controller
 from ..main import app
 import pytest
+from fastapi import HTTPException
 from ..models import orders as model
 
 # Create a test client for the app
@@ -29,3 +30,60 @@ def test_create_order(db_session):
     assert created_order is not None
     assert created_order.customer_name == "John Doe"
     assert created_order.description == "Test order"
+
+
+def test_update_status_only_moves_legal_transitions(db_session, mocker):
+    rows = [
+        mocker.Mock(id=1, tracking_number="TRK-1", order_type=model.OrderType.TAKEOUT, order_status=model.OrderStatus.PREPARING),
+        mocker.Mock(id=2, tracking_number="TRK-2", order_type=model.OrderType.TAKEOUT, order_status=model.OrderStatus.PENDING),
+    ]
+    db_session.query.return_value.filter.return_value.with_for_update.return_value.all.return_value = rows
+    request = mocker.Mock(order_ids=[1, 2, 3], tracking_numbers=[], order_status="ready")
+
+    result = controller.update_status(db_session, request)
+
+    outcomes = {r.get("order_id"): r["outcome"] for r in result["results"]}
+    assert result["updated"] == 1
+    assert outcomes == {1: "updated", 2: "illegal_transition", 3: "not_found"}
+    db_session.commit.assert_called_once()
+
+
+def _order_with_stock(db, promo=None):
+    from ..controllers import promo_redemptions
+    from ..models.promotional_codes import PromotionalCode
+    from ..models.recipes import Recipe
+    from ..models.resources import Resource
+    from ..models.sandwiches import Sandwich
+    from ..schemas.orders import OrderCreate
+    db.add_all([Sandwich(sandwich_name="BLT", price=5), Resource(item="Bread", amount=10)])
+    db.flush()
+    db.add(Recipe(sandwich_id=1, resource_id=1, amount=2))
+    if promo:
+        db.add(PromotionalCode(code=promo, discount_percent=10, is_active=True, max_uses=0))
+        db.flush()
+        promo_redemptions.set_limit(db, 1, 0)
+    db.commit()
+    return OrderCreate(customer_name="Ada", promo_code=promo, order_details=[{"sandwich_id": 1, "amount": 3}])
+
+
+def test_create_holds_then_takes_the_ingredients(db):
+    from ..controllers import inventory
+    request = _order_with_stock(db)
+
+    order = controller.create(db, request)
+
+    assert inventory.levels(db, [1]) == {1: 4}
+    reasons = [(m.reason.value, m.delta, m.order_id) for m in db.query(inventory.model.InventoryMovement)]
+    assert reasons[-3:] == [("hold", -6, None), ("release", 6, None), ("order", -6, order.id)]
+
+
+def test_failed_create_gives_the_held_ingredients_back(db):
+    from ..controllers import inventory
+    request = _order_with_stock(db, promo="GONE")
+
+    with pytest.raises(HTTPException) as error:
+        controller.create(db, request)
+
+    assert error.value.detail == "Promotional code usage limit reached"
+    assert inventory.levels(db, [1]) == {1: 10}
+    assert db.query(model.Order).count() == 0
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+from ..dependencies.config import conf
+from ..dependencies.payment_gateway import (
+    GATEWAYS, LocalGateway, ManualGateway, PaymentGateway, GatewayClient, CircuitBreaker, GatewayError,
+    CircuitOpenError, PaymentDeclined, PaymentNotCharged
+)
+
+
+def test_local_gateway_charge_succeeds():
+    async def scenario():
+        client = GatewayClient(LocalGateway(latency_ms=1, jitter_ms=0), timeout=1)
+        return await client.charge("payment-1", 10, "credit_card")
+
+    assert asyncio.run(scenario()).startswith("cap_")
+
+
+def test_declined_card_is_not_retried():
+    gateway = LocalGateway(latency_ms=1, jitter_ms=0, decline_rate=1.0)
+
+    async def scenario():
+        client = GatewayClient(gateway, timeout=1, retries=3)
+        with pytest.raises(PaymentDeclined):
+            await client.charge("payment-1", 10, "credit_card")
+        return client.breaker.state
+
+    assert asyncio.run(scenario()) == "closed"
+
+
+def test_circuit_opens_after_repeated_failures():
+    gateway = LocalGateway(latency_ms=1, jitter_ms=0, failure_rate=1.0)
+
+    async def scenario():
+        client = GatewayClient(gateway, timeout=1, retries=1, backoff=0,
+                               breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+        with pytest.raises(GatewayError):
+            await client.charge("payment-1", 10, "credit_card")
+        with pytest.raises(CircuitOpenError):
+            await client.charge("payment-2", 10, "credit_card")
+        return client.breaker.state
+
+    assert asyncio.run(scenario()) == "open"
+
+
+def test_default_gateway_charges_nothing():
+    assert isinstance(GATEWAYS[conf.payment_gateway](), ManualGateway)
+
+    async def scenario():
+        client = GatewayClient(ManualGateway(), timeout=1, retries=3)
+        with pytest.raises(PaymentNotCharged):
+            await client.charge("payment-1", 10, "credit_card")
+        return client.breaker.state
+
+    assert asyncio.run(scenario()) == "closed"
+
+
+def test_gateway_must_implement_both_calls():
+    class AuthorizeOnly(PaymentGateway):
+        async def authorize(self, reference, amount, method):
+            return "auth_1"
+
+    with pytest.raises(TypeError):
+        PaymentGateway()
+    with pytest.raises(TypeError):
+        AuthorizeOnly()
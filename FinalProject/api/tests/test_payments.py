@@ -0,0 +1,62 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from fastapi import HTTPException
+from ..controllers import payments as controller
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.payments import Payment, PaymentMethod, PaymentStatus
+
+
+@pytest.fixture
+def submit(mocker):
+    mocker.patch.object(controller, "_charge", mocker.Mock())
+    submit = mocker.patch.object(controller, "get_dispatcher").return_value.submit
+    yield submit
+    controller._in_flight.clear()
+
+
+def add_payment(db, payment_status, method=PaymentMethod.CREDIT_CARD):
+    order = Order(order_date=datetime.now(), order_type=OrderType.TAKEOUT, order_status=OrderStatus.PENDING,
+                  total_price=Decimal("9.00"))
+    db.add(order)
+    db.flush()
+    payment = Payment(order_id=order.id, amount=Decimal("9.00"), payment_method=method,
+                      payment_status=payment_status, payment_date=datetime.now())
+    db.add(payment)
+    db.commit()
+    return payment.id
+
+
+def test_failed_payment_is_retried_once(db, submit):
+    payment_id = add_payment(db, PaymentStatus.FAILED)
+
+    assert controller.process(db, payment_id).payment_status == PaymentStatus.PENDING
+    with pytest.raises(HTTPException) as again:
+        controller.process(db, payment_id)
+
+    assert again.value.detail == "Payment is already being processed"
+    submit.assert_called_once()
+
+
+def test_pending_payment_is_resent_only_when_not_in_flight(db, submit):
+    payment_id = add_payment(db, PaymentStatus.PENDING)
+
+    controller.process(db, payment_id)
+    with pytest.raises(HTTPException):
+        controller.process(db, payment_id)
+    controller._done(payment_id)  # The gateway answered, still pending (e.g. circuit open)
+    controller.process(db, payment_id)
+
+    assert submit.call_count == 2
+
+
+def test_settled_or_cash_payments_are_not_dispatched(db, submit):
+    completed = add_payment(db, PaymentStatus.COMPLETED)
+    cash = add_payment(db, PaymentStatus.PENDING, method=PaymentMethod.CASH)
+
+    for payment_id, detail in ((completed, "Payment is already completed"),
+                               (cash, "Payment method is not processed by the gateway")):
+        with pytest.raises(HTTPException) as error:
+            controller.process(db, payment_id)
+        assert (error.value.status_code, error.value.detail) == (400, detail)
+    submit.assert_not_called()
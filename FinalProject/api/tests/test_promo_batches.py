@@ -0,0 +1,18 @@
+import pytest
+from fastapi import HTTPException
+from ..controllers import promo_batches as controller
+from ..schemas.promotional_codes import PromotionalCodeBatch
+
+
+def test_expand_fills_only_placeholders():
+    code = controller.expand("SUMMER-####")
+    assert code.startswith("SUMMER-")
+    assert len(code) == 11
+    assert all(c in controller.ALPHABET for c in code[7:])
+
+
+def test_validate_rejects_pattern_too_small_for_count():
+    request = PromotionalCodeBatch(pattern="X-##", count=1000, discount_percent=10)
+    with pytest.raises(HTTPException) as exc:
+        controller.validate(request)
+    assert exc.value.status_code == 400
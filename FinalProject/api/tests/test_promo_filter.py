@@ -0,0 +1,28 @@
+from ..dependencies.bloom import BloomFilter
+from ..controllers import promo_filter as controller
+
+
+def test_bloom_filter_never_forgets_added_codes():
+    bloom = BloomFilter(size_bits=4096, hash_count=5)
+    codes = [f"CODE{i}" for i in range(200)]
+    for code in codes:
+        bloom.add(code)
+
+    assert all(code in bloom for code in codes)
+    assert "NOT-A-CODE" not in bloom
+
+
+def test_normalize_matches_case_and_accent_insensitive_collation():
+    assert controller.normalize("Café10 ") == controller.normalize("CAFE10")
+
+
+def test_unknown_code_rejected_without_query(mocker):
+    mocker.patch.object(controller.cache_versions, "current", return_value=1)
+    db = mocker.Mock()
+    db.query.return_value.yield_per.return_value = [("SAVE10",)]
+    promo_filter = controller.PromoCodeFilter(size_bits=4096, hash_count=5, refresh_seconds=60)
+
+    assert promo_filter.might_exist(db, "save10") is True
+    db.reset_mock()
+    assert promo_filter.might_exist(db, "BOGUS") is False
+    db.query.assert_not_called()
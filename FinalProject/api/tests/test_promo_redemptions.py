@@ -0,0 +1,42 @@
+import pytest
+from fastapi import HTTPException
+from ..controllers import promo_redemptions as controller
+
+
+def test_split_spreads_capacity_evenly():
+    assert controller._split(10, 4) == [3, 3, 2, 2]
+    assert sum(controller._split(7, 8)) == 7
+
+
+def test_redeem_rejects_when_every_shard_is_full(mocker):
+    db = mocker.Mock()
+    db.query.return_value.filter.return_value.all.return_value = [(0,), (1,)]
+    db.execute.return_value.rowcount = 0
+    promo = mocker.Mock(id=1, max_uses=2, max_uses_per_customer=None)
+
+    with pytest.raises(HTTPException) as exc:
+        controller.redeem(db, promo, order_id=5, customer_name="Ann")
+
+    assert exc.value.status_code == 400
+    assert db.execute.call_count == 2
+    db.add.assert_not_called()
+
+
+def test_single_use_code_gets_one_shard():
+    assert controller.shard_rows(7, 1) == [{"promo_code_id": 7, "shard": 0, "capacity": 1, "used": 0}]
+
+
+def test_deleting_a_limited_code_removes_its_shards(db):
+    from ..controllers import promotional_codes
+    from ..models import promotional_codes as promo_model
+    from ..models import promo_redemptions as model
+    from ..schemas.promotional_codes import PromotionalCodeCreate
+
+    code_id = promotional_codes.create(db, PromotionalCodeCreate(code="LIMITED", discount_percent=10, max_uses=3)).id
+    assert db.query(model.PromoCodeShard).filter(model.PromoCodeShard.promo_code_id == code_id).count() > 0
+
+    response = promotional_codes.delete(db, code_id)
+
+    assert response.status_code == 204
+    assert db.query(model.PromoCodeShard).count() == 0
+    assert db.get(promo_model.PromotionalCode, code_id) is None
@@ -0,0 +1,51 @@
+import time
+import pytest
+from ..controllers import promo_sweeper as controller
+from ..dependencies import jobs
+
+
+def test_sweep_runs_until_a_batch_selects_nothing(mocker):
+    # The second batch lost three codes to concurrent edits but was full, so more may remain
+    batch = mocker.patch.object(controller, "sweep_batch", side_effect=[(500, 500), (500, 497), (3, 3), (0, 0)])
+    sleep = mocker.patch.object(controller.time, "sleep")
+
+    result = controller.sweep(mocker.Mock(), batch_size=500)
+
+    assert result == {"deactivated": 1000, "batches": 3}
+    assert batch.call_count == 4
+    assert sleep.call_count == 2
+
+
+def test_failed_run_is_counted(mocker):
+    mocker.patch.object(controller, "sweep", side_effect=controller.SQLAlchemyError("boom"))
+    sweeper = controller.ExpirySweeper(interval_seconds=None)
+
+    with pytest.raises(controller.SQLAlchemyError):
+        sweeper.run_once(mocker.Mock())
+
+    metrics = sweeper.metrics()
+    assert metrics["failures"] == 1
+    assert metrics["last_error"] == "boom"
+
+
+def test_background_thread_survives_unexpected_errors(mocker):
+    mocker.patch.object(jobs, "SessionLocal")
+    outcomes = iter([ValueError("bad row")])
+    mocker.patch.object(
+        controller, "sweep", side_effect=lambda db: next(outcomes, {"deactivated": 2, "batches": 1})
+    )
+    sweeper = controller.ExpirySweeper(interval_seconds=0.01)
+
+    sweeper.start()
+    try:
+        for _ in range(200):
+            if sweeper.runs >= 2:
+                break
+            time.sleep(0.01)
+        metrics = sweeper.metrics()
+    finally:
+        sweeper.stop()
+
+    assert metrics["running"] is True
+    assert metrics["runs"] >= 2 and metrics["failures"] == 1
+    assert metrics["last_error"] is None
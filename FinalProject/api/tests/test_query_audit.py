@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from ..controllers import orders
+from ..dependencies import query_audit
+from ..dependencies.config import conf
+from ..dependencies.database import get_db
+from ..dependencies.metrics import MetricsMiddleware
+from ..dependencies.response_cache import response_cache
+from ..main import app
+from ..models.order_details import OrderDetail
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.promotional_codes import PromotionalCode
+from ..models.recipes import Recipe
+from ..models.resources import Resource
+from ..models.reviews import Review
+from ..models.sandwiches import Sandwich
+
+ROWS = 8  # More than conf.query_repeat_threshold, so a lookup per row fails the request
+
+
+def test_statements_differing_only_in_values_share_a_shape():
+    assert query_audit.shape("SELECT * FROM orders WHERE id = 7 AND note = 'x'") == \
+        query_audit.shape("SELECT *\n  FROM orders WHERE id = %s AND note = %s")
+    assert query_audit.shape("SELECT * FROM recipes WHERE sandwich_id IN (%s, %s, %s)") == \
+        query_audit.shape("SELECT * FROM recipes WHERE sandwich_id IN (?)")
+    assert query_audit.repeated({"SAVEPOINT sa_savepoint_1": 50}) == []
+
+
+def _request(app, path="/orders/"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(MetricsMiddleware(app)(scope, receive, send))
+    return dict(sent[0]["headers"])
+
+
+def _app(lookups: int):
+    engine = create_engine("sqlite://")
+
+    async def app(scope, receive, send):
+        with engine.connect() as conn:
+            for i in range(lookups):
+                conn.execute(text("SELECT :id AS id"), {"id": i})
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"[]"})
+    return app
+
+
+def test_query_count_and_time_are_sent_as_headers():
+    headers = _request(_app(2))
+
+    assert headers[b"x-db-queries"] == b"2"
+    assert b"x-db-time-ms" in headers
+    assert b"x-db-repeated-queries" not in headers
+
+
+def test_strict_mode_fails_a_request_repeating_a_query_per_row():
+    with pytest.raises(query_audit.RepeatedQueriesError, match="SELECT"):
+        _request(_app(20))
+
+
+@pytest.fixture
+def client(db, monkeypatch):
+    """The app answering from the db fixture, with strict query auditing and no cached responses"""
+    monkeypatch.setattr(conf, "query_audit_enabled", True)
+    response_cache.clear()
+    app.dependency_overrides[get_db] = lambda: db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+    response_cache.clear()
+
+
+def seed(db):
+    """ROWS of each: sandwiches with a recipe line on their own resource, orders with a promo code and reviews"""
+    code = PromotionalCode(code="SAVE10", discount_percent=10, is_active=True,
+                           expiration_date=datetime.now() + timedelta(days=30))
+    db.add(code)
+    for i in range(ROWS):
+        sandwich = Sandwich(sandwich_name=f"Sandwich {i}", price=Decimal("5.00"))
+        resource = Resource(item=f"Ingredient {i}", amount=100)
+        db.add_all([sandwich, resource])
+        db.flush()
+        db.add(Recipe(sandwich_id=sandwich.id, resource_id=resource.id, amount=1))
+        order = Order(customer_name="Ada", order_date=datetime.now(), order_type=OrderType.TAKEOUT,
+                      order_status=OrderStatus.COMPLETED, total_price=Decimal("5.00"), promo_code_id=code.id)
+        db.add(order)
+        db.flush()
+        db.add(OrderDetail(order_id=order.id, sandwich_id=sandwich.id, amount=1))
+        db.add(Review(order_id=order.id, sandwich_id=sandwich.id, rating=4, created_at=datetime.now()))
+    db.commit()
+    db.expire_all()
+
+
+@pytest.mark.parametrize("path, nested", [
+    ("/orders/", "order_details"),  # Order.order_details and each detail's sandwich
+    ("/orderdetails/", "sandwich"),
+    ("/recipes/", "resource"),  # Recipe.resource, the other side of Resource.recipes
+    ("/reviews/", "sandwich"),  # Review.sandwich, the other side of Sandwich.reviews
+    ("/resources/", None),
+    ("/sandwiches/", None),
+    ("/menu", None),
+])
+def test_list_endpoints_do_not_query_per_row(client, db, path, nested):
+    seed(db)
+
+    response = client.get(path)
+
+    assert response.status_code == 200
+    assert int(response.headers["x-db-queries"]) > 0
+    assert "x-db-repeated-queries" not in response.headers
+    rows = response.json()
+    if nested:
+        assert len(rows) == ROWS and all(row[nested] for row in rows)
+
+
+def test_strict_mode_fails_a_real_request_that_loads_a_relationship_per_row(client, db, mocker):
+    seed(db)
+    # orders.read_all as it was before it loaded the details with the orders
+    mocker.patch.object(orders, "_with_details", return_value=())
+
+    with pytest.raises(query_audit.RepeatedQueriesError, match="order_details"):
+        client.get("/orders/")
@@ -0,0 +1,72 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from fastapi import HTTPException
+from ..controllers import reconciliation as controller
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.payments import Payment, PaymentMethod, PaymentStatus
+
+
+def seed(db):
+    """Five orders: 2 has no payment, 3 is paid the wrong amount, 4 is completed with a pending payment"""
+    rows = [
+        (OrderStatus.COMPLETED, "10.00", "10.00", PaymentStatus.COMPLETED),
+        (OrderStatus.COMPLETED, "8.00", None, None),
+        (OrderStatus.PENDING, "12.00", "11.00", PaymentStatus.PENDING),
+        (OrderStatus.COMPLETED, "6.00", "6.00", PaymentStatus.PENDING),
+        (OrderStatus.COMPLETED, "9.00", "9.00", PaymentStatus.COMPLETED),
+    ]
+    for order_status, total, paid, payment_status in rows:
+        order = Order(order_date=datetime.now(), order_type=OrderType.TAKEOUT, order_status=order_status,
+                      total_price=Decimal(total))
+        db.add(order)
+        db.flush()
+        if paid is not None:
+            db.add(Payment(order_id=order.id, amount=Decimal(paid), payment_method=PaymentMethod.CASH,
+                           payment_status=payment_status, payment_date=datetime.now()))
+    db.commit()
+
+
+def issues(db, run_id):
+    return sorted((issue.issue, issue.order_id) for issue in controller.read_issues(db, run_id))
+
+
+def test_run_records_mismatches_and_missing_payments(db):
+    seed(db)
+
+    run = controller.run(db, chunk_size=2)
+
+    assert run.finished_at is not None
+    assert (run.orders_checked, run.last_order_id) == (5, 5)
+    assert (run.amount_mismatches, run.missing_payments) == (1, 2)
+    assert issues(db, run.id) == [("amount_mismatch", 3), ("missing_payment", 2), ("missing_payment", 4)]
+
+
+def test_unfinished_run_resumes_after_its_checkpoint(db):
+    seed(db)
+
+    run = controller.run(db, chunk_size=2, max_chunks=1)
+    assert run.finished_at is None
+    assert (run.orders_checked, run.last_order_id) == (2, 2)
+    assert controller.read_latest_unfinished(db).id == run.id
+
+    run = controller.run(db, run_id=run.id, chunk_size=2)
+
+    assert run.finished_at is not None
+    assert run.orders_checked == 5
+    assert (run.amount_mismatches, run.missing_payments) == (1, 2)
+    assert issues(db, run.id) == [("amount_mismatch", 3), ("missing_payment", 2), ("missing_payment", 4)]
+    assert controller.read_latest_unfinished(db) is None
+
+
+def test_finished_or_unknown_run_cannot_be_resumed(db):
+    seed(db)
+    run = controller.run(db, chunk_size=10)
+
+    with pytest.raises(HTTPException) as finished:
+        controller.run(db, run_id=run.id)
+    with pytest.raises(HTTPException) as unknown:
+        controller.run(db, run_id=run.id + 1)
+
+    assert finished.value.status_code == 400
+    assert unknown.value.status_code == 404
@@ -0,0 +1,62 @@
+import pytest
+from fastapi import HTTPException
+from ..controllers import resources as controller
+from ..controllers import inventory
+from ..models import resources as model
+from ..schemas.resources import ResourceCreate, RestockManifest
+
+
+def manifest(*lines):
+    return RestockManifest(items=[dict(line) for line in lines])
+
+
+def test_item_names_match_like_the_database_collation():
+    assert controller._item_key(" Jalapeño ") == controller._item_key("JALAPENO")
+
+
+def test_restock_adds_to_known_items_and_creates_unknown_ones(db):
+    db.add_all([model.Resource(item="Bread", amount=10), model.Resource(item="Cheese", amount=5)])
+    db.commit()
+
+    levels = controller.restock(db, manifest(
+        {"item": "Bread", "delta": 4}, {"id": 2, "delta": 3}, {"item": "Bread", "delta": 1}, {"item": "Basil", "delta": 7}
+    ))
+
+    assert [(level["item"], level["amount"], level["delta"], level.get("created", False)) for level in levels] == [
+        ("Bread", 15, 5, False), ("Cheese", 8, 3, False), ("Basil", 7, 7, True)
+    ]
+    assert inventory.levels(db, [1, 2, 3]) == {1: 15, 2: 8, 3: 7}
+
+
+def test_restock_refuses_to_go_below_zero_and_changes_nothing(db):
+    db.add(model.Resource(item="Bread", amount=2))
+    db.commit()
+
+    with pytest.raises(HTTPException) as exc:
+        controller.restock(db, manifest({"id": 1, "delta": 5}, {"item": "Bread", "delta": -9}))
+
+    assert exc.value.status_code == 400
+    assert inventory.levels(db, [1]) == {1: 2}
+
+
+def test_restock_rejects_removing_unknown_items_and_unknown_ids(db):
+    with pytest.raises(HTTPException) as exc:
+        controller.restock(db, manifest({"item": "Saffron", "delta": -1}))
+    assert exc.value.status_code == 400
+
+    with pytest.raises(HTTPException) as exc:
+        controller.restock(db, manifest({"id": 42, "delta": 1}))
+    assert exc.value.status_code == 404
+
+
+def test_resources_with_inventory_history_are_kept(db):
+    stocked = controller.create(db, ResourceCreate(item="Bread", amount=5))
+    unused = controller.create(db, ResourceCreate(item="Truffle", amount=0))
+
+    with pytest.raises(HTTPException) as error:
+        controller.delete(db, stocked["id"])
+    controller.delete(db, unused["id"])
+
+    assert error.value.status_code == 400
+    assert [row.item for row in db.query(model.Resource)] == ["Bread"]
+    assert db.query(inventory.model.InventoryMovement).count() == 1
@@ -0,0 +1,37 @@
+from ..dependencies.response_cache import MemoryBackend, cache_key
+
+
+def test_key_ignores_query_parameter_order(mocker):
+    first = mocker.Mock()
+    first.url.path, first.url.query = "/sandwiches/", "is_available=true&category=vegan"
+    second = mocker.Mock()
+    second.url.path, second.url.query = "/sandwiches/", "category=vegan&is_available=true"
+    bare = mocker.Mock()
+    bare.url.path, bare.url.query = "/sandwiches/", ""
+
+    assert cache_key(first) == cache_key(second) == "/sandwiches/?category=vegan&is_available=true"
+    assert cache_key(bare) == "/sandwiches/"
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    backend = MemoryBackend(max_bytes=700)
+    backend.set("a", b"x" * 100, "application/json", 100.0, ["sandwiches"])
+    backend.set("b", b"x" * 100, "application/json", 100.0, ["sandwiches"])
+    assert backend.get("a", 0.0) is not None
+
+    assert backend.set("c", b"x" * 100, "application/json", 100.0, ["recipes"]) == 1
+    assert backend.get("b", 0.0) is None
+    assert backend.get("a", 0.0) is not None
+    assert backend.usage()[0] == 2
+
+
+def test_invalidation_drops_only_tagged_entries():
+    backend = MemoryBackend(max_bytes=10000)
+    backend.set("menu", b"[]", "application/json", 100.0, ["sandwiches"])
+    backend.set("popular", b"[]", "application/json", 100.0, ["orders", "sandwiches"])
+    backend.set("revenue", b"{}", "application/json", 100.0, ["orders"])
+
+    assert backend.invalidate(["sandwiches"]) == 2
+    assert backend.get("revenue", 0.0) == (b"{}", "application/json")
+    assert backend.get("menu", 0.0) is None
+    assert backend.get("revenue", 200.0) is None
@@ -0,0 +1,108 @@
+import time
+import pytest
+from sqlalchemy.exc import OperationalError
+from ..controllers import review_ingest as controller
+from ..dependencies.config import conf
+from ..dependencies import jobs
+
+
+def _review(rating=4):
+    return type("ReviewCreate", (), dict(order_id=1, sandwich_id=2, rating=rating, review_text="fresh"))()
+
+
+def _spool_files(tmp_path):
+    return sorted(path.name for path in tmp_path.iterdir() if not path.name.endswith(".lock"))
+
+
+def _worker(mocker, spool, pid, ratings):
+    """An ingestor that spooled reviews as process pid"""
+    getpid = mocker.patch.object(controller.os, "getpid", return_value=pid)
+    ingestor = controller.ReviewIngestor(interval_seconds=0, spool_path=spool)
+    for rating in ratings:
+        ingestor.submit(mocker.Mock(), _review(rating))
+    mocker.stop(getpid)
+    return ingestor
+
+
+def test_failed_flush_keeps_reviews_buffered_and_spooled(mocker, tmp_path):
+    mocker.patch.object(conf, "review_ingest_durability", "spool")
+    ingestor = controller.ReviewIngestor(interval_seconds=0, spool_path=str(tmp_path / "reviews.spool"))
+    db = mocker.Mock()
+    for rating in (1, 2, 3):
+        ingestor.submit(db, _review(rating))
+    mocker.patch.object(controller, "write_batch", side_effect=OperationalError("INSERT", {}, Exception("gone")))
+
+    with pytest.raises(OperationalError):
+        ingestor.run_once(db)
+
+    assert [entry["rating"] for entry in ingestor._buffer] == [1, 2, 3]
+    assert len(_spool_files(tmp_path)) == 1
+
+
+def test_spooled_reviews_are_recovered_and_spool_removed_after_commit(mocker, tmp_path):
+    mocker.patch.object(conf, "review_ingest_durability", "fsync")
+    spool = str(tmp_path / "reviews.spool")
+    crashed = _worker(mocker, spool, 4242, [4, 4])
+    keys = [entry["ingest_key"] for entry in crashed._buffer]
+    crashed._owner_lock.close()  # The process died, its lock went with it
+    db = mocker.Mock()
+
+    restarted = controller.ReviewIngestor(interval_seconds=0, spool_path=spool)
+    write_batch = mocker.patch.object(controller, "write_batch", return_value={"inserted": 2, "duplicates": 0, "rejected": 0})
+
+    assert restarted.recover() == 2
+    restarted.run_once(db)
+
+    assert [entry["ingest_key"] for entry in write_batch.call_args[0][1]] == keys
+    assert _spool_files(tmp_path) == []
+    assert not (tmp_path / "reviews.spool.4242.lock").exists()
+
+
+def test_workers_sharing_a_spool_path_only_recover_exited_workers_files(mocker, tmp_path):
+    mocker.patch.object(conf, "review_ingest_durability", "spool")
+    spool = str(tmp_path / "reviews.spool")
+    running = _worker(mocker, spool, 4343, [1, 2])
+    exited = _worker(mocker, spool, 4242, [3])
+    exited._owner_lock.close()
+    (tmp_path / "reviews.spool").write_text('{"rating": 4}\n')  # From before spools were per process
+
+    restarted = controller.ReviewIngestor(interval_seconds=0, spool_path=spool)
+
+    assert restarted.recover() == 2
+    assert sorted(entry["rating"] for entry in restarted._buffer) == [3, 4]
+    assert "reviews.spool.4343" in _spool_files(tmp_path)
+    assert restarted.recover() == 0
+    running._owner_lock.close()
+
+
+def test_unexpected_error_keeps_reviews_and_the_flush_thread(mocker, tmp_path):
+    mocker.patch.object(conf, "review_ingest_durability", "spool")
+    mocker.patch.object(conf, "review_ingest_batch_size", 1)
+    ingestor = controller.ReviewIngestor(interval_seconds=0.01, spool_path=str(tmp_path / "reviews.spool"))
+    write_batch = mocker.patch.object(controller, "write_batch", side_effect=ValueError("bad row"))
+    ingestor.submit(mocker.Mock(), _review(5))
+    ingestor._recovered = True
+    mocker.patch.object(jobs, "SessionLocal")
+
+    ingestor.start()
+    try:
+        for _ in range(200):
+            if ingestor.failures >= 2:
+                break
+            time.sleep(0.01)
+        assert ingestor.failures >= 2
+        assert ingestor._thread.is_alive()
+        assert "bad row" in ingestor.metrics()["last_error"]
+        with ingestor._buffer_lock:
+            assert [entry["rating"] for entry in ingestor._buffer] == [5]
+            assert len(ingestor._spooled_files) == 1
+
+        write_batch.side_effect = None
+        write_batch.return_value = {"inserted": 1, "duplicates": 0, "rejected": 0}
+        for _ in range(200):
+            if not ingestor._buffer and not _spool_files(tmp_path):
+                break
+            time.sleep(0.01)
+        assert ingestor._buffer == [] and _spool_files(tmp_path) == []
+    finally:
+        ingestor.stop()
@@ -0,0 +1,50 @@
+from datetime import datetime
+from decimal import Decimal
+from ..controllers import review_search as controller
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.reviews import Review
+from ..models.review_terms import ReviewTermStat
+from ..models.sandwiches import Sandwich
+
+
+def test_tokens_fold_case_accents_stopwords_and_suffixes():
+    assert controller.tokens("The bread was SOGGY, sogginess everywhere! Crème") == [
+        "bread", "soggy", "soggy", "everywhere", "creme"
+    ]
+
+
+def test_add_counts_each_term_once_per_review(mocker):
+    add_counts = mocker.patch.object(controller, "_add_counts")
+    db = mocker.Mock()
+
+    controller.add(db, [(1, 3, 2, "cold cold bread"), (2, 3, 5, "warm bread"), (3, 3, 4, None)])
+
+    postings = db.execute.call_args[0][1]
+    assert sorted((p["review_id"], p["term"]) for p in postings) == [
+        (1, "bread"), (1, "cold"), (2, "bread"), (2, "warm")
+    ]
+    add_counts.assert_called_once_with(db, {"cold": 1, "bread": 2, "warm": 1, controller.DOCS_TERM: 2})
+
+
+def test_reindex_skips_reviews_indexed_by_a_live_write_meanwhile(db, mocker):
+    db.add(Sandwich(sandwich_name="BLT", price=Decimal("5.00")))
+    db.add(Order(order_date=datetime.now(), order_type=OrderType.TAKEOUT, order_status=OrderStatus.COMPLETED,
+                 total_price=Decimal("5.00")))
+    texts = ["cold bread", "warm bread", "soggy bread"]
+    db.add_all([Review(order_id=1, sandwich_id=1, rating=3, review_text=text, created_at=datetime.now())
+                for text in texts])
+    db.commit()
+    add = controller.add
+
+    def edited_during_the_first_batch(db, reviews):
+        if reviews[0][0] == 1:
+            add(db, [(3, 1, 3, "soggy bread")])  # What reviews.update does for review 3
+        return add(db, reviews)
+
+    mocker.patch.object(controller, "add", side_effect=edited_during_the_first_batch)
+
+    assert controller.reindex(db, batch_size=1) == {"reviews": 3}
+
+    counts = dict(db.query(ReviewTermStat.term, ReviewTermStat.doc_count))
+    assert (counts[controller.DOCS_TERM], counts["bread"], counts["soggy"]) == (3, 3, 1)
+    assert [hit["review"].id for hit in controller.search(db, "soggy bread")["results"]] == [3]
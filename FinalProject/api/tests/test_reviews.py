@@ -0,0 +1,21 @@
+import pytest
+from datetime import datetime
+from fastapi import HTTPException
+from ..controllers import reviews as controller
+
+
+def test_cursor_round_trips_the_sort_key(mocker):
+    review = mocker.Mock(rating=4, created_at=datetime(2025, 3, 1, 12, 30), id=17)
+
+    cursor = controller.encode_cursor("rating_high", review)
+
+    assert controller.decode_cursor("rating_high", cursor) == [4, datetime(2025, 3, 1, 12, 30), 17]
+
+
+def test_cursor_of_another_sort_is_rejected(mocker):
+    cursor = controller.encode_cursor("newest", mocker.Mock(created_at=datetime(2025, 3, 1), id=17))
+
+    for sort, value in (("oldest", cursor), ("newest", "not-a-cursor")):
+        with pytest.raises(HTTPException) as error:
+            controller.decode_cursor(sort, value)
+        assert error.value.status_code == 400
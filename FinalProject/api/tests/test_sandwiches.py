@@ -33,3 +33,13 @@ def test_create_sandwich(db_session):
     assert created_sandwich.sandwich_name == "Test Sandwich"
     assert created_sandwich.price == 5.99
     assert created_sandwich.category == "vegetarian"
+
+
+def test_update_availability_sets_manual_switch(db_session, mocker):
+    refresh = mocker.patch.object(controller.availability, "refresh")
+    query = db_session.query.return_value.filter.return_value
+
+    controller.update(db_session, 1, mocker.Mock(dict=lambda exclude_unset: {"is_available": False}))
+
+    query.update.assert_called_once_with({"is_listed": False}, synchronize_session=False)
+    refresh.assert_called_once_with(db_session, sandwich_ids=[1])
@@ -0,0 +1,89 @@
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from ..controllers import payments, settlements as controller
+from ..dependencies.config import conf
+from ..models.orders import Order, OrderStatus, OrderType
+from ..models.payments import Payment, PaymentMethod, PaymentStatus
+
+
+def add_payment(db, method, amount, payment_status=PaymentStatus.PENDING, days_ago=0):
+    order = Order(order_date=datetime.now(), order_type=OrderType.TAKEOUT, order_status=OrderStatus.COMPLETED,
+                  total_price=Decimal(amount))
+    db.add(order)
+    db.flush()
+    payment = Payment(order_id=order.id, amount=Decimal(amount), payment_method=method,
+                      payment_status=payment_status, payment_date=datetime.now() - timedelta(days=days_ago))
+    db.add(payment)
+    db.commit()
+    return payment
+
+
+def settle(db, methods=("cash", "credit_card")):
+    request = type("SettlementCreate", (), dict(business_date=date.today(), payment_methods=list(methods)))()
+    return controller.create(db, request)
+
+
+def lines(settlement):
+    return {line.payment_method: (line.payment_count, line.total_amount) for line in settlement.lines}
+
+
+def test_settlement_totals_each_method_and_completes_its_payments(db, monkeypatch):
+    monkeypatch.setattr(conf, "settlement_chunk_size", 2)
+    settled = [
+        add_payment(db, PaymentMethod.CASH, "4.50"),
+        add_payment(db, PaymentMethod.CASH, "3.25"),
+        add_payment(db, PaymentMethod.CREDIT_CARD, "10.00"),
+    ]
+    untouched = [
+        add_payment(db, PaymentMethod.CASH, "7.00", days_ago=1),
+        add_payment(db, PaymentMethod.CASH, "2.00", payment_status=PaymentStatus.FAILED),
+        add_payment(db, PaymentMethod.ONLINE, "8.00"),
+    ]
+
+    settlement = settle(db)
+
+    assert lines(settlement) == {
+        PaymentMethod.CASH: (2, Decimal("7.75")),
+        PaymentMethod.CREDIT_CARD: (1, Decimal("10.00")),
+    }
+    assert (settlement.payment_count, settlement.total_amount) == (3, Decimal("17.75"))
+    db.expire_all()
+    assert {payment.payment_status for payment in settled} == {PaymentStatus.COMPLETED}
+    assert [payment.payment_status for payment in untouched] == [
+        PaymentStatus.PENDING, PaymentStatus.FAILED, PaymentStatus.PENDING
+    ]
+
+
+def test_closing_the_same_day_twice_only_settles_new_payments(db):
+    add_payment(db, PaymentMethod.CASH, "5.00")
+    first = settle(db)
+
+    again = settle(db)
+    assert (again.payment_count, again.total_amount, again.lines) == (0, Decimal("0.00"), [])
+
+    add_payment(db, PaymentMethod.CASH, "6.00")
+    late = settle(db)
+
+    assert lines(first) == {PaymentMethod.CASH: (1, Decimal("5.00"))}
+    assert lines(late) == {PaymentMethod.CASH: (1, Decimal("6.00"))}
+    assert sorted(s.id for s in controller.read_all(db, business_date=date.today())) == [first.id, again.id, late.id]
+
+
+def test_payments_taken_through_the_api_are_settled_on_their_day(db, mocker):
+    mocker.patch.object(payments, "uses_gateway", return_value=False)
+    started = datetime.now()
+    taken = []
+    for amount in ("4.00", "6.50"):
+        order = Order(order_date=datetime.now(), order_type=OrderType.TAKEOUT, order_status=OrderStatus.COMPLETED,
+                      total_price=Decimal(amount))
+        db.add(order)
+        db.commit()
+        request = type("PaymentCreate", (), dict(order_id=order.id, amount=Decimal(amount), payment_method="cash",
+                                                 payment_status="pending"))()
+        taken.append(payments.create(db, request))
+
+    # Stamped when taken, not when the process started
+    assert all(payment.payment_date >= started for payment in taken)
+    settlement = settle(db)
+
+    assert lines(settlement) == {PaymentMethod.CASH: (2, Decimal("10.50"))}
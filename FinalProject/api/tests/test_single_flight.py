@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from ..dependencies.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_run():
+    group = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return 42
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(group.do("popular", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(group.do("popular", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while group.stats()["coalesced"] < 3:
+        pass
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(runs) == 1
+    assert sorted(results) == [(42, False), (42, True), (42, True), (42, True)]
+
+
+def test_errors_reach_every_waiter_and_are_not_remembered():
+    group = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise ValueError("database unavailable")
+
+    async def ok():
+        return "fresh"
+
+    async def main():
+        outcomes = await asyncio.gather(*[group.do_async("complaints", fail) for _ in range(4)], return_exceptions=True)
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+        assert await group.do_async("complaints", ok) == ("fresh", False)
+
+    asyncio.run(main())
+    stats = group.stats()
+    assert (stats["executions"], stats["coalesced"], stats["errors"], stats["in_flight"]) == (2, 3, 1, 0)
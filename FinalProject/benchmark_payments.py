@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Load test the payment client against the in-process stand-in gateway.
+
+No server or database is needed: this drives GatewayClient directly, the
+same way the payment dispatcher does, and reports throughput, latency and
+how many charges completed, were declined or failed.
+
+Usage:
+    python benchmark_payments.py --payments 2000 --latency-ms 200 --failure-rate 0.05
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from api.dependencies.payment_gateway import (
+    LocalGateway, GatewayClient, CircuitBreaker, GatewayError, CircuitOpenError, PaymentDeclined
+)
+
+
+async def run(args):
+    gateway = LocalGateway(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.latency_ms / 4,
+        failure_rate=args.failure_rate,
+        decline_rate=args.decline_rate,
+        seed=1
+    )
+    client = GatewayClient(
+        gateway,
+        max_concurrency=args.concurrency,
+        timeout=args.timeout,
+        retries=args.retries,
+        breaker=CircuitBreaker(failure_threshold=args.breaker_threshold)
+    )
+    outcomes = {"completed": 0, "declined": 0, "failed": 0, "circuit_open": 0}
+    latencies = []
+
+    async def one(i):
+        start = time.perf_counter()
+        try:
+            await client.charge(f"bench-{i}", 10, "credit_card")
+            outcomes["completed"] += 1
+        except PaymentDeclined:
+            outcomes["declined"] += 1
+        except CircuitOpenError:
+            outcomes["circuit_open"] += 1
+        except GatewayError:
+            outcomes["failed"] += 1
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.payments)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"payments:     {args.payments} in {elapsed:.2f}s ({args.payments / elapsed:.0f}/s)")
+    print(f"latency p50:  {statistics.median(latencies) * 1000:.0f} ms")
+    print(f"latency p99:  {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f} ms")
+    for outcome, count in outcomes.items():
+        print(f"{outcome + ':':<13} {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--decline-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--breaker-threshold", type=int, default=5)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Measure how fast the promo code Bloom filter rejects unknown codes.
+
+Builds a filter the size configured in api/dependencies/config.py, fills it
+with random codes, then checks codes that do not exist. No server or
+database is needed.
+
+Usage:
+    python benchmark_promo_filter.py [number_of_codes] [lookups]
+"""
+import random
+import string
+import sys
+import time
+from api.dependencies.bloom import BloomFilter
+from api.dependencies.config import conf
+from api.controllers.promo_filter import normalize
+
+
+def random_code(rng):
+    return "".join(rng.choices(string.ascii_uppercase + string.digits, k=10))
+
+
+def main():
+    codes = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    rng = random.Random(1)
+
+    bloom = BloomFilter(conf.promo_filter_bits, conf.promo_filter_hashes)
+    known = set()
+    start = time.perf_counter()
+    while len(known) < codes:
+        code = random_code(rng)
+        known.add(code)
+        bloom.add(normalize(code))
+    build = time.perf_counter() - start
+
+    unknown = [code for code in (random_code(rng) for _ in range(lookups)) if code not in known]
+    start = time.perf_counter()
+    false_positives = sum(1 for code in unknown if normalize(code) in bloom)
+    elapsed = time.perf_counter() - start
+
+    print(f"filter size:         {bloom.memory_bytes / 1024:.0f} KiB, {conf.promo_filter_hashes} hashes")
+    print(f"codes loaded:        {codes} in {build:.2f}s")
+    print(f"unknown lookups:     {len(unknown)} in {elapsed:.2f}s ({len(unknown) / elapsed:,.0f}/s per worker)")
+    print(f"false positive rate: {false_positives / len(unknown):.4%} (these still go to the database)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Measure worker cold-start time for each startup mode.
+
+Every run imports api.main in a fresh interpreter, the same thing a new
+uvicorn worker does, and reports how long the import took.
+
+Usage:
+    python benchmark_startup.py [runs]
+"""
+import statistics
+import subprocess
+import sys
+
+
+MODES = ["create", "check", "skip"]
+
+IMPORT_SNIPPET = """
+import time
+from api.dependencies.config import conf
+conf.startup_mode = {mode!r}
+start = time.perf_counter()
+import api.main
+print(time.perf_counter() - start)
+"""
+
+
+def measure(mode, runs):
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(mode=mode)],
+            capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(result.stderr)
+            raise SystemExit(f"Import failed in mode {mode!r}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"{'mode':<8} {'median (ms)':>12} {'min (ms)':>10} {'max (ms)':>10}")
+    for mode in MODES:
+        timings = measure(mode, runs)
+        print(f"{mode:<8} {statistics.median(timings) * 1000:>12.1f} "
+              f"{min(timings) * 1000:>10.1f} {max(timings) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Generate a campaign of unique promotional codes and write them as CSV.
+
+Every # in the pattern becomes a random letter or digit. Codes are inserted
+in chunks with multi-row INSERTs; codes that already exist are skipped and
+replaced with new ones.
+
+Usage:
+    python generate_promo_codes.py --pattern "SUMMER-####-####" --count 100000 --discount 15 \\
+        [--expires 2026-09-01] [--max-uses 1 | --unlimited] [--out codes.csv]
+
+--max-uses means what max_uses means in the API: 0 makes a code unusable
+until its limit is raised, --unlimited leaves the codes without a limit.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+from fastapi import HTTPException
+from api.dependencies.database import SessionLocal
+from api.controllers import promo_batches
+from api.schemas.promotional_codes import PromotionalCodeBatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate unique promotional codes")
+    parser.add_argument("--pattern", required=True, help='Code pattern, e.g. "SUMMER-####-####"')
+    parser.add_argument("--count", type=int, required=True, help="Number of codes")
+    parser.add_argument("--discount", type=float, required=True, help="Discount percent")
+    parser.add_argument("--expires", type=datetime.fromisoformat, default=None, help="Expiration date (ISO format)")
+    uses = parser.add_mutually_exclusive_group()
+    uses.add_argument("--max-uses", type=int, default=None, help="Uses per code (default 1, 0 = unusable until raised)")
+    uses.add_argument("--unlimited", action="store_true", help="No limit on uses per code")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Codes per INSERT")
+    parser.add_argument("--out", default=None, help="CSV file (default: stdout)")
+    args = parser.parse_args()
+    if args.unlimited:
+        max_uses = None
+    else:
+        max_uses = 1 if args.max_uses is None else args.max_uses
+
+    request = PromotionalCodeBatch(
+        pattern=args.pattern, count=args.count, discount_percent=args.discount,
+        expiration_date=args.expires, max_uses=max_uses
+    )
+    out = open(args.out, "w", newline="") if args.out else sys.stdout
+    db = SessionLocal()
+    start = time.perf_counter()
+    lines = 0
+    try:
+        promo_batches.validate(request)
+        for piece in promo_batches.generate_csv(db, request, args.chunk_size):
+            out.write(piece)
+            lines += piece.count("\n")
+    except HTTPException as e:
+        sys.exit(f"Error: {e.detail}")
+    finally:
+        db.close()
+        if args.out:
+            out.close()
+
+    print(f"Generated {lines - 1} codes in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Check every order against its payment and record amount mismatches and
+completed orders without a completed payment.
+
+Progress is saved after every chunk. If the script is interrupted, run it
+again and it continues the unfinished run (pass --restart to begin anew).
+
+Usage:
+    python reconcile_payments.py [--chunk-size 1000] [--restart]
+"""
+import argparse
+from api.dependencies.database import SessionLocal
+from api.controllers import reconciliation as controller
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconcile payments against orders")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Orders per chunk")
+    parser.add_argument("--restart", action="store_true", help="Start a new run instead of resuming")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        unfinished = None if args.restart else controller.read_latest_unfinished(db)
+        if unfinished:
+            print(f"Resuming run {unfinished.id} after order {unfinished.last_order_id}")
+        run = unfinished
+        # One chunk per call so progress can be printed as it goes
+        while True:
+            run = controller.run(db, run_id=run.id if run else None, chunk_size=args.chunk_size, max_chunks=1)
+            print(f"Run {run.id}: {run.orders_checked} orders checked, up to order {run.last_order_id}")
+            if run.finished_at is not None:
+                break
+    finally:
+        db.close()
+
+    print()
+    print(f"Amount mismatches: {run.amount_mismatches}")
+    print(f"Missing payments:  {run.missing_payments}")
+    print(f"Details: GET /reconciliation/runs/{run.id}/issues")
+
+
+if __name__ == "__main__":
+    main()